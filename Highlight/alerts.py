@@ -0,0 +1,91 @@
+import asyncio
+import discord
+import logging
+import time
+
+from typing import Dict, List, Tuple
+from redbot.core import commands
+
+log = logging.getLogger('red.cogs.Highlight')
+
+class DigestEntry:
+    __slots__ = ('category', 'started_at', 'messages', 'members')
+
+    def __init__(self, category: str):
+        self.category = category
+        self.started_at = time.time()
+        self.messages: List[str] = []
+        self.members: Dict[int, int] = {}
+
+class AlertDigest:
+    """Collects private channel highlights per category and sends one embed for each every ``window`` seconds.
+
+    Embeds are sent by a single task that waits ``interval`` seconds between sends, so busy
+    categories can't use up the alert channel's rate limit.
+    """
+
+    def __init__(self, bot: commands.Bot, window: float = 60, interval: float = 2):
+        self.bot = bot
+        self.window = window
+        self.interval = interval
+        self._pending: Dict[Tuple[int, int], DigestEntry] = {} # (alert channel id, category id) -> entry
+        self._timers: Dict[Tuple[int, int], asyncio.TimerHandle] = {}
+        self._outgoing: asyncio.Queue = asyncio.Queue()
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def add(self, channel_id: int, message: discord.Message, members: List[discord.Member]):
+        key = (channel_id, message.channel.category_id)
+        if (entry := self._pending.get(key)) is None:
+            entry = self._pending[key] = DigestEntry(message.channel.category.name)
+            self._timers[key] = asyncio.get_event_loop().call_later(self.window, self._flush, key)
+
+        entry.messages.append(f'[#{message.channel.name}]({message.jump_url}) {message.author} -> {len(members)} highlighted')
+        for member in members:
+            entry.members[member.id] = entry.members.get(member.id, 0) + 1
+
+    def _flush(self, key: Tuple[int, int]):
+        self._timers.pop(key, None)
+        if not (entry := self._pending.pop(key, None)):
+            return
+
+        shown = entry.messages[-15:]
+        description = '\n'.join(shown)
+        if len(entry.messages) > len(shown):
+            description = f'*...and {len(entry.messages) - len(shown)} earlier messages*\n' + description
+        embed = discord.Embed(
+            title = 'Private Channel Highlights',
+            description = description[:4096],
+            timestamp = discord.utils.utcnow(),
+            colour = discord.Colour.red()
+        ).add_field(
+            name = 'Highlighted',
+            value = '\n'.join(
+                f'> <@{member_id}>' + (f' x{count}' if count > 1 else '')
+                for member_id, count in sorted(entry.members.items(), key = lambda item: item[1], reverse = True)
+            )[:1024]
+        ).set_footer(text = f'{entry.category} | {len(entry.messages)} messages in {int(time.time() - entry.started_at)}s')
+        self._outgoing.put_nowait((key[0], embed))
+
+    async def _send(self, channel_id: int, embed: discord.Embed):
+        if channel := self.bot.get_channel(channel_id):
+            try:
+                await channel.send(embed = embed)
+            except discord.HTTPException as e:
+                log.warning(f'Failed to send a highlight alert digest to {channel_id}.', exc_info = e)
+
+    async def _send_loop(self):
+        while True:
+            await self._send(*(await self._outgoing.get()))
+            await asyncio.sleep(self.interval)
+
+    async def _drain(self):
+        while not self._outgoing.empty():
+            await self._send(*self._outgoing.get_nowait())
+
+    def close(self):
+        """Stops the timers and sends every digest that's still waiting, without the interval between them."""
+        for key, timer in list(self._timers.items()):
+            timer.cancel()
+            self._flush(key)
+        self._sender.cancel()
+        asyncio.create_task(self._drain())
@@ -3,7 +3,24 @@ import argparse
 import re
 
 from redbot.core import commands
-        
+from typing import List
+from .records import SETTINGS, TYPES
+
+def validate_highlight(text: str, _type: str, settings: List[str]):
+    """The checks every highlight has to pass, raises ``commands.BadArgument`` when one fails."""
+    if _type not in TYPES:
+       raise commands.BadArgument(f'Invalid Type \"{_type}\".')
+
+    for setting in settings:
+        if not setting in SETTINGS:
+           raise commands.BadArgument(f'Invalid Setting \"{setting}\", read the help embed again ^^')
+
+    if _type == 'regex':
+        try:
+            re.compile(text)
+        except Exception as e:
+            raise commands.BadArgument('Invalid regex, Error Message: ' + str(e))
+
 class NoExitParser(argparse.ArgumentParser):
     def error(self, message):
         raise commands.BadArgument(message)
@@ -28,7 +45,7 @@ class HighlightFlagResolver(commands.Converter, NoExitParser):
 
         if args['settings']:
            for setting in args['settings']:
-               if not setting in ['bots', 'embeds']:
+               if not setting in SETTINGS:
                   await ctx.send_help()
                   raise commands.BadArgument(f'Invalid Setting \"{setting}\", read the help embed again ^^')
 
@@ -36,10 +53,6 @@ class HighlightFlagResolver(commands.Converter, NoExitParser):
         
         args['type'] = 'regex' if args['regex'] else 'wildcard' if args['wildcard'] else 'default'
         
-        if args['type'] == 'regex':
-            for word in args['words']:
-                try:
-                    re.compile(word)
-                except Exception as e:
-                    raise commands.BadArgument('Invalid regex, Error Message: ' + str(e))
+        for word in args['words']:
+            validate_highlight(word, args['type'], args['settings'])
         return args
\ No newline at end of file
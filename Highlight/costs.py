@@ -0,0 +1,84 @@
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+OK, SAMPLED, SUSPENDED = 'ok', 'sampled', 'suspended'
+
+CostKey = Tuple[int, int, str, int] # guild_id, member_id, text, kind
+
+class CostEntry:
+    __slots__ = ('calls', 'cpu', 'window_start', 'window_cpu', 'state', 'skipped')
+
+    def __init__(self):
+        self.calls = 0
+        self.cpu = 0.0
+        self.window_start = time.monotonic()
+        self.window_cpu = 0.0
+        self.state = OK
+        self.skipped = 0
+
+class CostTracker:
+    """Cumulative CPU time and invocation counts per highlight.
+
+    A highlight using more than ``budget`` seconds of CPU time within ``window`` seconds is
+    sampled, only running on one of every ``sample_rate`` messages. If it's still over budget
+    while sampled, it is suspended until it is edited or the costs are reset.
+    """
+
+    def __init__(self, budget: float = 2.0, window: float = 3600, sample_rate: int = 10):
+        self.budget = budget
+        self.window = window
+        self.sample_rate = sample_rate
+        self.entries: Dict[CostKey, CostEntry] = {}
+
+    def should_run(self, key: CostKey) -> bool:
+        entry = self.entries.get(key)
+        if entry is None or entry.state == OK:
+            return True
+        if entry.state == SUSPENDED:
+            return False
+        entry.skipped += 1
+        return entry.skipped % self.sample_rate == 0
+
+    def charge(self, key: CostKey, cpu: float) -> Optional[str]:
+        """Records a run of a highlight, returns its new state if it was throttled by this run."""
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = CostEntry()
+
+        now = time.monotonic()
+        if now - entry.window_start > self.window:
+            if entry.state == SAMPLED and entry.window_cpu < self.budget / self.sample_rate:
+                entry.state = OK
+            entry.window_start, entry.window_cpu = now, 0.0
+
+        entry.calls += 1
+        entry.cpu += cpu
+        entry.window_cpu += cpu
+        if entry.state == OK and entry.window_cpu > self.budget:
+            entry.state = SAMPLED
+            entry.window_start, entry.window_cpu = now, 0.0
+            return SAMPLED
+        if entry.state == SAMPLED and entry.window_cpu > self.budget / self.sample_rate:
+            entry.state = SUSPENDED
+            return SUSPENDED
+        return None
+
+    def suspend(self, key: CostKey) -> bool:
+        """Suspends a highlight straight away, returns whether it wasn't already."""
+        entry = self.entries.setdefault(key, CostEntry())
+        if entry.state == SUSPENDED:
+            return False
+        entry.state = SUSPENDED
+        return True
+
+    def forget(self, guild_id: int, member_id: int, text: Optional[str] = None):
+        for key in [key for key in self.entries if key[:2] == (guild_id, member_id) and text in (None, key[2])]:
+            del self.entries[key]
+
+    def top(self, guild_id: int, limit: int = 10) -> List[Tuple[CostKey, CostEntry]]:
+        return sorted(
+            ((key, entry) for key, entry in self.entries.items() if key[0] == guild_id),
+            key = lambda item: item[1].cpu,
+            reverse = True
+        )[:limit]
@@ -0,0 +1,400 @@
+"""Linear time matching for the subset of regex syntax highlights use.
+
+Patterns are parsed with ``re``'s own parser and compiled into an NFA program. ``search`` first runs
+a lazily built DFA over the text to find out whether there is a match at all, and only if there is,
+runs a Pike VM to get the leftmost match's span. Both only ever look at each character once, so
+there's no catastrophic backtracking. Work is still proportional to the program size times the text
+length, so only small programs over short texts (see :meth:`LinearPattern.inline`) should be run
+on the event loop. Whether a pattern matches is always the same as with ``re``, the span can differ
+for repeats whose body can match nothing.
+
+Literals, classes, ``.``, alternation, groups, greedy / lazy repeats and the ``^ $ \\A \\Z \\b \\B``
+anchors are supported. Anything else (backreferences, lookarounds, conditionals, possessive repeats,
+atomic groups, locale flags) raises :class:`Unsupported` and should use ``re`` instead.
+"""
+
+import re
+import threading
+import time
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError: # python < 3.11
+    import sre_parse, sre_constants
+
+C = sre_constants
+
+MAX_PROGRAM = 2000 # instructions
+MAX_STATES = 4000 # cached dfa states, searches stop caching past this and the cache is flushed after
+INLINE_PROGRAM = 200 # instructions, larger programs are run in an executor
+INLINE_TEXT = 1000 # characters, longer texts are run in an executor
+
+CHAR, SPLIT, JMP, ASSERT, MATCH = range(5)
+_MATCHED = -1
+
+_CATEGORIES = {
+    C.CATEGORY_DIGIT: r'\d', C.CATEGORY_NOT_DIGIT: r'\D',
+    C.CATEGORY_SPACE: r'\s', C.CATEGORY_NOT_SPACE: r'\S',
+    C.CATEGORY_WORD: r'\w', C.CATEGORY_NOT_WORD: r'\W'
+}
+_ANCHORS = {C.AT_BEGINNING, C.AT_BEGINNING_STRING, C.AT_END, C.AT_END_STRING, C.AT_BOUNDARY, C.AT_NON_BOUNDARY}
+_CHAR_FLAGS = re.IGNORECASE | re.DOTALL | re.ASCII
+
+class Unsupported(Exception):
+    """The pattern uses syntax outside of the linear subset."""
+
+def _escape(char: str) -> str:
+    return '\\U%08x' % ord(char)
+
+def _is_word(char: str, ascii: bool) -> bool:
+    if ascii:
+        return char.isascii() and (char.isalnum() or char == '_')
+    return char.isalnum() or char == '_'
+
+class _CharPredicate:
+    """A single character regex, with its results cached per character."""
+
+    __slots__ = ('_fullmatch', '_cache')
+
+    def __init__(self, source: str, flags: int):
+        self._fullmatch = re.compile(source, flags & _CHAR_FLAGS).fullmatch
+        self._cache: Dict[str, bool] = {}
+
+    def __call__(self, char: str) -> bool:
+        try:
+            return self._cache[char]
+        except KeyError:
+            if len(self._cache) > 4096:
+                self._cache.clear()
+            result = self._cache[char] = self._fullmatch(char) is not None
+            return result
+
+class _Compiler:
+    def __init__(self):
+        self.program: List[list] = []
+        self._predicates: Dict[Tuple[str, int], _CharPredicate] = {}
+
+    def emit(self, *inst) -> int:
+        self.program.append(list(inst))
+        if len(self.program) > MAX_PROGRAM:
+            raise Unsupported('pattern is too large')
+        return len(self.program) - 1
+
+    def char(self, source: str, flags: int):
+        key = (source, flags & _CHAR_FLAGS)
+        if key not in self._predicates:
+            self._predicates[key] = _CharPredicate(source, flags)
+        self.emit(CHAR, self._predicates[key])
+
+    def compile(self, parsed, flags: int):
+        for op, av in parsed:
+            self.node(op, av, flags)
+
+    def node(self, op, av, flags: int):
+        if op is C.LITERAL:
+            self.char(_escape(chr(av)), flags)
+        elif op is C.NOT_LITERAL:
+            self.char(f'[^{_escape(chr(av))}]', flags)
+        elif op is C.ANY:
+            self.char('.', flags)
+        elif op is C.IN:
+            self.char(self._class(av), flags)
+        elif op is C.BRANCH:
+            jumps, alternatives = [], av[1]
+            for i, alternative in enumerate(alternatives):
+                if i < len(alternatives) - 1:
+                    split = self.emit(SPLIT, len(self.program) + 1, None)
+                    self.compile(alternative, flags)
+                    jumps.append(self.emit(JMP, None))
+                    self.program[split][2] = len(self.program)
+                else:
+                    self.compile(alternative, flags)
+            for jump in jumps:
+                self.program[jump][1] = len(self.program)
+        elif op is C.SUBPATTERN:
+            _, add_flags, del_flags, parsed = av
+            self.compile(parsed, (flags | add_flags) & ~del_flags)
+        elif op is C.MAX_REPEAT or op is C.MIN_REPEAT:
+            self.repeat(*av, flags, greedy = op is C.MAX_REPEAT)
+        elif op is C.AT:
+            if av not in _ANCHORS:
+                raise Unsupported(f'unsupported anchor {av}')
+            self.emit(ASSERT, av, flags)
+        else:
+            raise Unsupported(f'unsupported syntax {op}')
+
+    def _class(self, items) -> str:
+        parts = []
+        for op, av in items:
+            if op is C.NEGATE:
+                parts.insert(0, '^')
+            elif op is C.LITERAL:
+                parts.append(_escape(chr(av)))
+            elif op is C.RANGE:
+                parts.append(f'{_escape(chr(av[0]))}-{_escape(chr(av[1]))}')
+            elif op is C.CATEGORY and av in _CATEGORIES:
+                parts.append(_CATEGORIES[av])
+            else:
+                raise Unsupported(f'unsupported class item {op}')
+        return '[' + ''.join(parts) + ']'
+
+    def _split(self, greedy: bool) -> int:
+        # the preferred branch is always the next instruction when greedy, the exit when lazy.
+        return self.emit(SPLIT, len(self.program) + 1, None) if greedy else self.emit(SPLIT, None, len(self.program) + 1)
+
+    def repeat(self, low: int, high: int, parsed, flags: int, greedy: bool):
+        for _ in range(low):
+            self.compile(parsed, flags)
+
+        exit_slot = 2 if greedy else 1
+        if high is C.MAXREPEAT:
+            split = self._split(greedy)
+            self.compile(parsed, flags)
+            self.emit(JMP, split)
+            self.program[split][exit_slot] = len(self.program)
+            return
+
+        splits = []
+        for _ in range(high - low):
+            splits.append(self._split(greedy))
+            self.compile(parsed, flags)
+        for split in splits:
+            self.program[split][exit_slot] = len(self.program)
+
+def _assert(kind, flags: int, prev: Optional[str], nxt: Optional[str], last: bool) -> bool:
+    if kind is C.AT_BEGINNING:
+        return prev is None or (bool(flags & re.MULTILINE) and prev == '\n')
+    if kind is C.AT_BEGINNING_STRING:
+        return prev is None
+    if kind is C.AT_END:
+        return nxt is None or (nxt == '\n' and (last or bool(flags & re.MULTILINE)))
+    if kind is C.AT_END_STRING:
+        return nxt is None
+    if prev is None and nxt is None: # \b and \B never match an empty string
+        return False
+    ascii = bool(flags & re.ASCII)
+    boundary = (prev is not None and _is_word(prev, ascii)) != (nxt is not None and _is_word(nxt, ascii))
+    return boundary if kind is C.AT_BOUNDARY else not boundary
+
+class LinearMatch:
+    """The part of ``re.Match`` that highlights use."""
+
+    __slots__ = ('string', '_span')
+
+    def __init__(self, string: str, span: Tuple[int, int]):
+        self.string = string
+        self._span = span
+
+    def group(self, index: int = 0) -> str:
+        if index != 0:
+            raise IndexError('only the whole match is available')
+        return self.string[self._span[0]:self._span[1]]
+
+    def span(self) -> Tuple[int, int]:
+        return self._span
+
+    def start(self) -> int:
+        return self._span[0]
+
+    def end(self) -> int:
+        return self._span[1]
+
+    def __repr__(self) -> str:
+        return f'<LinearMatch span={self._span} match={self.group(0)!r}>'
+
+class _DFA:
+    """The lazily built dfa of a pattern, state id -> (kernel, prev char), transitions and end of text results."""
+
+    __slots__ = ('states', 'info', 'trans', 'end')
+
+    def __init__(self):
+        self.states: Dict[tuple, int] = {}
+        self.info: List[tuple] = []
+        self.trans: List[dict] = []
+        self.end: Dict[int, bool] = {}
+
+class LinearPattern:
+    """A compiled pattern that searches in time linear to the length of the text."""
+
+    def __init__(self, pattern: str, flags: int = 0):
+        try:
+            parsed = sre_parse.parse(pattern, flags)
+        except re.error:
+            raise
+        except Exception as e:
+            raise Unsupported(str(e))
+        flags = getattr(parsed, 'state', getattr(parsed, 'pattern', None)).flags
+        if flags & re.LOCALE:
+            raise Unsupported('locale dependent patterns are not supported')
+
+        compiler = _Compiler()
+        compiler.compile(parsed, flags)
+        compiler.emit(MATCH)
+
+        self.pattern = pattern
+        self.flags = flags
+        self.program = compiler.program
+        # building the dfa isn't thread safe, so each thread (the loop or an executor's) has its own.
+        self._local = threading.local()
+
+    def __repr__(self) -> str:
+        return f'<LinearPattern {self.pattern!r} program={len(self.program)} states={len(self._dfa().info)}>'
+
+    def inline(self, text: str) -> bool:
+        """Whether searching ``text`` is cheap enough to do on the event loop."""
+        return len(self.program) <= INLINE_PROGRAM and len(text) <= INLINE_TEXT
+
+    def _dfa(self) -> _DFA:
+        dfa = getattr(self._local, 'dfa', None)
+        if dfa is None or len(dfa.info) > MAX_STATES:
+            dfa = self._local.dfa = _DFA()
+        return dfa
+
+    def _closure(self, pcs: Iterable[int], prev: Optional[str], nxt: Optional[str], last: bool, seen: Optional[set] = None) -> List[int]:
+        """The CHAR and MATCH instructions reachable from ``pcs`` and not in ``seen``, in priority order."""
+        program, closed = self.program, []
+        seen = set() if seen is None else seen
+        stack = list(reversed(list(pcs)))
+        while stack:
+            pc = stack.pop()
+            if pc in seen:
+                continue
+            seen.add(pc)
+            inst = program[pc]
+            op = inst[0]
+            if op is JMP:
+                stack.append(inst[1])
+            elif op is SPLIT:
+                stack.append(inst[2])
+                stack.append(inst[1])
+            elif op is ASSERT:
+                if _assert(inst[1], inst[2], prev, nxt, last):
+                    stack.append(pc + 1)
+            else:
+                closed.append(pc)
+        return closed
+
+    # lazy dfa
+
+    def _intern(self, dfa: _DFA, kernel: frozenset, prev: Optional[str]) -> int:
+        # only what the anchors can see of the previous character matters.
+        context = None if prev is None else (prev == '\n', _is_word(prev, False), _is_word(prev, True))
+        key = (kernel, context)
+        sid = dfa.states.get(key)
+        if sid is None:
+            sid = dfa.states[key] = len(dfa.info)
+            dfa.info.append((kernel, prev))
+            dfa.trans.append({})
+        return sid
+
+    def _next(self, kernel: frozenset, prev: Optional[str], char: str, last: bool) -> Optional[frozenset]:
+        """The kernel after ``char``, ``None`` if there's a match before it."""
+        program, nxt = self.program, set()
+        for pc in self._closure(sorted(kernel) + [0], prev, char, last):
+            if program[pc][0] is MATCH:
+                return None
+            if program[pc][1](char):
+                nxt.add(pc + 1)
+        return frozenset(nxt)
+
+    def _step(self, dfa: _DFA, sid: int, char: str, last: bool) -> int:
+        kernel = self._next(*dfa.info[sid], char, last)
+        return _MATCHED if kernel is None else self._intern(dfa, kernel, char)
+
+    def _at_end(self, kernel: frozenset, prev: Optional[str]) -> bool:
+        return any(self.program[pc][0] is MATCH for pc in self._closure(sorted(kernel) + [0], prev, None, False))
+
+    def matches(self, text: str) -> bool:
+        """Whether the pattern matches anywhere in ``text``."""
+        dfa = self._dfa()
+        sid = self._intern(dfa, frozenset(), None)
+        last_index = len(text) - 1
+        for i, char in enumerate(text):
+            if len(dfa.info) > MAX_STATES:
+                # the cache is full, carry on without it rather than letting it grow.
+                return self._simulate(*dfa.info[sid], text, i)
+            key = (char, True) if i == last_index and char == '\n' else char
+            trans = dfa.trans[sid]
+            nxt = trans.get(key)
+            if nxt is None:
+                nxt = trans[key] = self._step(dfa, sid, char, i == last_index)
+            if nxt == _MATCHED:
+                return True
+            sid = nxt
+        if sid not in dfa.end:
+            dfa.end[sid] = self._at_end(*dfa.info[sid])
+        return dfa.end[sid]
+
+    def _simulate(self, kernel: frozenset, prev: Optional[str], text: str, start: int) -> bool:
+        """``matches`` from ``start`` on, without caching any states."""
+        last_index = len(text) - 1
+        for i in range(start, len(text)):
+            kernel = self._next(kernel, prev, text[i], i == last_index)
+            if kernel is None:
+                return True
+            prev = text[i]
+        return self._at_end(kernel, prev)
+
+    # pike vm
+
+    def _span(self, text: str) -> Optional[Tuple[int, int]]:
+        """Leftmost match span, preferring branches the same way ``re`` does."""
+        program, length = self.program, len(text)
+        threads: List[Tuple[int, int]] = []
+        matched = None
+        for i in range(length + 1):
+            prev = text[i - 1] if i else None
+            nxt = text[i] if i < length else None
+            if matched is None:
+                threads.append((0, i))
+
+            stepped, seen = [], set()
+            for pc, start in threads:
+                for closed in self._closure([pc], prev, nxt, i == length - 1, seen):
+                    if program[closed][0] is MATCH:
+                        matched = (start, i)
+                        break
+                    if nxt is not None and program[closed][1](nxt):
+                        stepped.append((closed + 1, start))
+                else:
+                    continue
+                break # lower priority threads lose to the match
+            threads = stepped
+            if not threads and matched is not None:
+                break
+        return matched
+
+    def search(self, text: str) -> Optional[LinearMatch]:
+        if not self.matches(text):
+            return None
+        span = self._span(text)
+        return LinearMatch(text, span) if span else None
+
+def compile_linear(pattern: str, flags: int = 0) -> LinearPattern:
+    return LinearPattern(pattern, flags)
+
+def benchmark(patterns: Iterable[Tuple[str, int]], texts: List[str]) -> Dict[str, float]:
+    """Times ``re`` and the linear engine over the same texts, also counting any disagreements."""
+    results = {'patterns': 0, 'unsupported': 0, 're': 0.0, 'linear': 0.0, 'matches': 0, 'mismatches': 0}
+    for source, flags in patterns:
+        results['patterns'] += 1
+        try:
+            linear = LinearPattern(source, flags)
+        except Unsupported:
+            results['unsupported'] += 1
+            continue
+        compiled = re.compile(source, flags)
+
+        start = time.perf_counter()
+        expected = [compiled.search(text) is not None for text in texts]
+        results['re'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = [linear.search(text) is not None for text in texts]
+        results['linear'] += time.perf_counter() - start
+
+        results['matches'] += sum(expected)
+        results['mismatches'] += sum(a != b for a, b in zip(expected, actual))
+    return results
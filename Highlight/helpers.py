@@ -2,15 +2,28 @@ import asyncio
 import logging
 import discord
 import functools
+import json
 import re
+import time
 
+from collections import OrderedDict
+from io import BytesIO
 from typing import Any, Dict, List, Literal, Optional
 from redbot.core import commands, Config
 from redbot.core.utils.chat_formatting import humanize_list, inline, italics
 from stemming.porter2 import stem
+from .converters import validate_highlight
+from .costs import SAMPLED, SUSPENDED, CostTracker
+from .engine import LinearPattern
+from .menus import ChannelShowIndex
+from .records import HighlightRecord, MatchResult
+from .snapshot import LARGE_GUILD, GuildSnapshot, compile_highlight
+from .stats import HighlightStats, merge_stats
 
 log = logging.getLogger('red.cogs.Highlight')
 
+ALERT_CHANNEL = 897450721493012500
+
 def _message(message: discord.Message):
         message_raw = {
             'content': message.content,
@@ -37,11 +50,46 @@ def _message(message: discord.Message):
             message_raw['embeds'] = ' '.join(texts)
         return message_raw
 
+def _message_check(message: discord.Message):
+        return {
+            'content': message.content,
+            'clean': message.clean_content,
+            'stem': ' '.join(stem(word) for word in message.content.split())
+        }
+
+def _timed_search(pattern: re.Pattern, content: str):
+        start = time.thread_time()
+        result = pattern.search(content)
+        return result, time.thread_time() - start
+
+def replay(highlights: List[HighlightRecord], messages: List[Dict[str, str]]) -> Dict[HighlightRecord, Dict[str, Any]]:
+        """Runs highlights over a batch of message checks, without touching cooldowns or costs.
+
+        Returns the number of messages each highlight matched, the CPU time it took and its first match.
+        This runs in an executor, so it compiles its own patterns rather than sharing the snapshot's.
+        """
+        results = {}
+        for highlight in highlights:
+            pattern = compile_highlight(highlight.text, highlight.type)
+            hits, cpu, example = 0, 0.0, None
+            for message_check in messages:
+                for content in message_check.values():
+                    result, elapsed = _timed_search(pattern, content)
+                    cpu += elapsed
+                    if result:
+                       hits += 1
+                       example = example or result.group(0)
+                       break
+            results[highlight] = {'hits': hits, 'cpu': cpu, 'example': example}
+        return results
+
 class Matches:
-    def __init__(self, cog: commands.Cog, member: discord.Member):
+    def __init__(self, cog: commands.Cog, member: discord.Member, snapshot: Optional[GuildSnapshot] = None):
         self.cog = cog
         self.member = member
-        self._matches = []
+        self.snapshot = snapshot
+        self.member_config = snapshot.member_config(member.id) if snapshot else cog.get_member_config(member)
+        self._matches: List[MatchResult] = []
         self.matched_types = set()
 
     def __len__(self):
@@ -49,65 +97,86 @@ class Matches:
 
     def __contains__(self, con: str):
         for item in self._matches:
-            if item['highlight'].strip() == con.strip():
+            if item.highlight.text.strip() == con.strip():
                return True
         return False
 
-    def add_match(self, match: re.Match, highlight):
-        if not any(h['highlight'] == highlight for h in self._matches):
-           self._matches.append({'match': match.group(0), 'highlight': highlight['highlight'], 'type': highlight['type']})
+    def add_match(self, match: re.Match, highlight: HighlightRecord):
+        if not any(item.highlight.text == highlight.text for item in self._matches):
+           self._matches.append(MatchResult(match.group(0), highlight))
 
     def remove_match(self, match: str):
-        for item in self._matches:
-            if item['match'] == match:
+        for item in self._matches.copy():
+            if item.match == match:
                self._matches.remove(item)
 
+    def to_dicts(self) -> List[Dict[str, str]]:
+        return [item.to_dict() for item in self._matches]
+
     @classmethod
-    async def _resolve(cls, cog, member, *args, **kwargs):
-        return await cls(cog, member).resolve(*args, **kwargs)
+    async def _resolve(cls, cog, member, *args, snapshot: Optional[GuildSnapshot] = None, **kwargs):
+        return await cls(cog, member, snapshot).resolve(*args, **kwargs)
 
-    async def resolve(self, highlights, message: discord.Message):
-        member_config = self.cog.get_member_config(self.member)
-        
-        if not member_config['bots'] and message.author.bot:
+    async def resolve(self, highlights, message: discord.Message, message_check: Optional[Dict[str, str]] = None, match_cache: Optional[Dict[tuple, tuple]] = None):
+        """Finds the highlights that match a message.
+
+        ``match_cache`` is shared between the members checked against the same message, so a
+        pattern several members have is only searched for once.
+        """
+        if not self.member_config['bots'] and message.author.bot:
             return self
 
-        message_check = {
-            'content': message.content,
-            'clean': message.clean_content,
-            'stem': ' '.join(stem(word) for word in message.content.split())
-        }
+        message_check = message_check or _message_check(message)
+        match_cache = {} if match_cache is None else match_cache
+        costs: CostTracker = self.cog.costs
         for highlight in highlights:
-            highlight_text = highlight['highlight']
-            pattern = {
-                'default': re.compile(rf'\b{re.escape(highlight_text)}\b', re.IGNORECASE),
-                'regex': re.compile(highlight_text),
-                'wildcard': re.compile(''.join([f'{re.escape(char)}[ _.{re.escape(char)}-]*' for char in highlight_text]), re.IGNORECASE)
-            }[highlight['type']]
-
+            highlight_text = highlight.text
+            cost_key = (self.member.guild.id, self.member.id, highlight_text, highlight.kind)
+            if not costs.should_run(cost_key):
+                continue
+            if (cached := match_cache.get((highlight_text, highlight.kind))) is not None:
+                result, content_type = cached
+                if result:
+                   self.add_match(result, highlight)
+                   self.matched_types.add(content_type)
+                continue
+            if self.snapshot:
+                pattern = self.snapshot.pattern(highlight)
+            else:
+                pattern = compile_highlight(highlight_text, highlight.type)
+
+            cpu, found = 0.0, (None, None)
             for content_type, content in message_check.items():
-                if highlight['type'] == 'default':
-                    result = pattern.search(content)
+                if highlight.type == 'default' or isinstance(pattern, LinearPattern) and pattern.inline(content):
+                    result, elapsed = _timed_search(pattern, content)
                 else:
                     task = asyncio.get_event_loop().run_in_executor(
-                        None, functools.partial(pattern.search, content)
+                        None, functools.partial(_timed_search, pattern, content)
                     )
                     try:
-                        result = await asyncio.wait_for(task, timeout = 6)
+                        result, elapsed = await asyncio.wait_for(task, timeout = 6)
                     except asyncio.TimeoutError:
                         await self.cog.send_alert(content = f'Highlight `{highlight_text}` took too long to fetch matches.\n> Belongs To : {self.member.mention}')
-                        return self
+                        if costs.suspend(cost_key):
+                           self.cog.notify_throttled(self.member, highlight, SUSPENDED)
+                        break
+                cpu += elapsed
                 if result:
                     self.add_match(result, highlight)
                     self.matched_types.add(content_type)
+                    found = (result, content_type)
                     break
+            match_cache[(highlight_text, highlight.kind)] = found
+
+            if state := costs.charge(cost_key, cpu):
+                self.cog.notify_throttled(self.member, highlight, state)
         return self
 
     def create_embed(self, history: List[str], message: discord.Message):
         return discord.Embed(
             title = self.format_title(),
             description = '\n'.join(history),
-            colour = self.cog.get_member_config(self.member)['colour'],
+            colour = self.member_config['colour'],
             timestamp = message.created_at
         ).add_field(
             name = 'Source Message',
@@ -118,12 +187,13 @@ class Matches:
     def format_response(self):
         response = []
         for item in self._matches:
+            match, highlight = item.match, item.highlight.text
             conversions = {
-                'default': f'\"{item["match"]}\"',
-                'wildcard': f'\"{item["match" if len(item["match"]) < 100 else "[EXCEEDED 100 CHAR LIMIT]"]}\"' if item['match'].strip().lower() == item['highlight'].strip().lower() else f'\"{item["match"]}\" from wildcard `({item["highlight"]})`',
-                'regex': f'\"{item["match"] if len(item["match"]) < 100 else "[EXCEEDED 100 CHAR LIMIT]"}\" from regex `({item["highlight"]})`'
+                'default': f'\"{match}\"',
+                'wildcard': f'\"{match if len(match) < 100 else "[EXCEEDED 100 CHAR LIMIT]"}\"' if match.strip().lower() == highlight.strip().lower() else f'\"{match}\" from wildcard `({highlight})`',
+                'regex': f'\"{match if len(match) < 100 else "[EXCEEDED 100 CHAR LIMIT]"}\" from regex `({highlight})`'
             }
-            response.append(conversions.get(item['type']))
+            response.append(conversions.get(item.type))
         return humanize_list(response[:10])
 
     def format_footer(self):
@@ -134,7 +204,7 @@ class Matches:
         return ' | '.join(_)
 
     def format_title(self):
-        matches = [item['match'].strip() for item in self._matches]
+        matches = [item.match.strip() for item in self._matches]
 
         if len(matches) < 3:
            title = ', '.join(matches)
@@ -150,24 +220,17 @@ class HighlightHandler:
 
     bot: commands.Bot
     config: Config
+    snapshots: Dict[int, GuildSnapshot]
+    guild_locks: Dict[int, asyncio.Lock]
+    costs: CostTracker
+    stats: HighlightStats
 
     def __init_sublass__(cls) -> None:
         pass
 
-    async def get_highlights_for_message(self, message: discord.Message) -> Dict:
-        highlights = {}
-        
-        guild_highlights, channel_highlights = (
-            await self.config.guild(message.guild).all(),
-            await self.config.channel(message.channel).all()
-        )
-        for member_id, data in guild_highlights.get('highlights', {}).items():
-            highlights.setdefault(int(member_id), []).extend(data)
-
-        for member_id, data in channel_highlights.get('highlights', {}).items():
-            highlights.setdefault(int(member_id), []).extend(data)
-        
-        return highlights
+    def guild_lock(self, guild_id: int) -> asyncio.Lock:
+        """Held while writing a guild's highlights and rebuilding its snapshot, so concurrent writes don't overwrite each other."""
+        return self.guild_locks.setdefault(guild_id, asyncio.Lock())
 
     async def get_all_member_highlights(self, member: discord.Member):
 
@@ -180,8 +243,103 @@ class HighlightHandler:
 
         return data
 
-    async def process_message(self, message: discord.Message):
-        ...
+    async def get_show_index(self, member: discord.Member) -> ChannelShowIndex:
+        """The member's ``highlight show`` pages, reused until their highlights, ignores or settings change."""
+        key = (member.guild.id, member.id)
+        version = self.index_versions.get(key, 0)
+        if (index := self.show_indexes.get(key)) and index.version == version:
+            return index
+
+        member_config = self.get_member_config(member)
+        index = ChannelShowIndex(member.guild, await self.get_all_member_highlights(member), member_config['blocks'], member_config['colour'], version)
+        self.show_indexes.pop(key, None)
+        self.show_indexes[key] = index
+        while len(self.show_indexes) > 500:
+            del self.show_indexes[next(iter(self.show_indexes))]
+        return index
+
+    def invalidate_member_index(self, member: discord.Member):
+        key = (member.guild.id, member.id)
+        self.index_versions[key] = self.index_versions.get(key, 0) + 1
+        self.show_indexes.pop(key, None)
+
+    async def get_snapshot(self, guild: discord.Guild) -> GuildSnapshot:
+        """The current snapshot of a guild, built on demand if it hasn't been yet."""
+        if snapshot := self.snapshots.get(guild.id):
+            return snapshot
+
+        if not (task := self._snapshot_builds.get(guild.id)):
+            task = self._snapshot_builds[guild.id] = asyncio.create_task(self.rebuild_snapshot(guild))
+            task.add_done_callback(lambda _: self._snapshot_builds.pop(guild.id, None))
+        return await asyncio.shield(task)
+
+    async def rebuild_snapshot(self, guild: discord.Guild) -> GuildSnapshot:
+        guild_highlights = await self.config.guild(guild).highlights()
+        scopes = {
+            channel_id: config['highlights']
+            for channel_id, config in (await self.config.all_channels()).items()
+            if config.get('highlights')
+        }
+        member_configs = await self.config.all_members(guild)
+        return await self._swap_snapshot(guild, guild_highlights, scopes, member_configs)
+
+    async def generate_snapshots(self):
+        await self.bot.wait_until_red_ready()
+        all_guilds, all_channels, all_members = (
+            await self.config.all_guilds(),
+            await self.config.all_channels(),
+            await self.config.all_members()
+        )
+        scopes = {}
+        for channel_id, config in all_channels.items():
+            if config.get('highlights') and (channel := self.bot.get_channel(channel_id)):
+                scopes.setdefault(channel.guild.id, {})[channel_id] = config['highlights']
+
+        for guild in self.bot.guilds:
+            await self._swap_snapshot(
+                guild,
+                all_guilds.get(guild.id, {}).get('highlights', {}),
+                scopes.get(guild.id, {}),
+                all_members.get(guild.id, {})
+            )
+
+    async def _swap_snapshot(self, guild: discord.Guild, guild_highlights, scopes, member_configs) -> GuildSnapshot:
+        """Splits the guild's channel scope highlights into categories and channels, then builds and swaps in a snapshot."""
+        channel_highlights, category_highlights, parents = {}, {}, {}
+        for channel_id, data in scopes.items():
+            channel = guild.get_channel_or_thread(channel_id)
+            if isinstance(channel, discord.CategoryChannel):
+                category_highlights[channel_id] = data
+            elif channel is not None:
+                channel_highlights[channel_id] = data
+                if channel.category_id:
+                   parents[channel_id] = channel.category_id
+
+        # versions are taken once the data is read, so a slower build of older data never replaces a newer one.
+        self._snapshot_version += 1
+        build = functools.partial(
+            GuildSnapshot.build, guild.id, self._snapshot_version, guild_highlights, channel_highlights, member_configs, self.default_member,
+            category_highlights = category_highlights, parents = parents
+        )
+        highlight_count = sum(len(data) for highlights in [guild_highlights, *scopes.values()] for data in highlights.values())
+        if highlight_count > LARGE_GUILD:
+            snapshot = await asyncio.get_event_loop().run_in_executor(None, build)
+        else:
+            snapshot = build()
+
+        current = self.snapshots.get(guild.id)
+        if current is None or current.version < snapshot.version:
+            self.snapshots[guild.id] = current = snapshot
+        return current
+
+    def prefilter_message(self, message: discord.Message, message_check: Dict[str, str], snapshot: GuildSnapshot) -> bool:
+        """Whether a message could match any highlight in its guild, records the skip rate."""
+        stats = self.prefilter_stats.setdefault(message.guild.id, {'checked': 0, 'skipped': 0})
+        stats['checked'] += 1
+        if snapshot.prefilter.might_match(message_check):
+            return True
+        stats['skipped'] += 1
+        return False
 
     async def handle_highlight_update(self, ctx: commands.Context, data, **kwargs):
         ret = await self.update_member_highlights(ctx.author, data, **kwargs)
@@ -216,46 +374,204 @@ class HighlightHandler:
            config_method, limit = self.config.guild(member.guild), 25
         ret = dict(added = [], removed = [], error = {})
 
-        # {'words': ['hm', 'aaaa'], 'multiple': True, 'regex': False, 'wildcard': False, 'settings': [], 'type': 'default'}
-        async with config_method.highlights() as config:
-            user_config: List[str, Any] = config.setdefault(str(member.id), [])
-
-            for word in data['words'].copy():
-                if any(_highlight['highlight'] == word for _highlight in user_config) and action == "add":
-                    ret['error'].setdefault('The following words were already highlighted for you ->', []).append(word)
-                    data['words'].remove(word)
-
-                if not any(_highlight['highlight'] == word for _highlight in user_config) and action == "remove":
-                    ret['error'].setdefault('The following words were not highlighted for you ->', []).append(word)
-                    data['words'].remove(word)
-
-            for i, highlight in enumerate(data['words']):
-                hl = {
-                    'highlight': highlight,
-                    'type': data['type'],
-                    'settings': data['settings']
-                }
-                if channel and len([channel_ for channel_, highlights_ in (await self.get_all_member_highlights(member)).items() if highlights_ and channel_ not in [member.guild.id, channel.id]]) >= 20:
-                    ret['error'].setdefault('Limit of `20` channels exceeded, Failed to add the following -> ', []).extend(data['words'][i:])
-                    break
-
-                if action in ('add', None):
-                    if len(user_config) > limit:
-                        ret['error'].setdefault(f'Limit of {limit} highlights reached. Failed to add the following ->', []).extend(data['words'][i:])
+        async with self.guild_lock(member.guild.id):
+            # {'words': ['hm', 'aaaa'], 'multiple': True, 'regex': False, 'wildcard': False, 'settings': [], 'type': 'default'}
+            async with config_method.highlights() as config:
+                user_config: List[str, Any] = config.setdefault(str(member.id), [])
+
+                for word in data['words'].copy():
+                    if any(_highlight['highlight'] == word for _highlight in user_config) and action == "add":
+                        ret['error'].setdefault('The following words were already highlighted for you ->', []).append(word)
+                        data['words'].remove(word)
+
+                    if not any(_highlight['highlight'] == word for _highlight in user_config) and action == "remove":
+                        ret['error'].setdefault('The following words were not highlighted for you ->', []).append(word)
+                        data['words'].remove(word)
+
+                for i, highlight in enumerate(data['words']):
+                    hl = {
+                        'highlight': highlight,
+                        'type': data['type'],
+                        'settings': data['settings']
+                    }
+                    if channel and len([channel_ for channel_, highlights_ in (await self.get_all_member_highlights(member)).items() if highlights_ and channel_ not in [member.guild.id, channel.id]]) >= 20:
+                        ret['error'].setdefault('Limit of `20` channels exceeded, Failed to add the following -> ', []).extend(data['words'][i:])
                         break
-                    if not any(_highlight['highlight'] == highlight for _highlight in user_config):
-                        user_config.append(hl)
-                        ret['added'].append(hl['highlight'])
-                        continue
 
-                if action in ('remove', None):
-                    if to_remove := [_highlight for _highlight in user_config if _highlight['highlight'] == highlight]:
-                        for _data in to_remove:
-                            user_config.remove(_data)
-                            ret['removed'].append(_data['highlight'])                    
-                        continue
+                    if action in ('add', None):
+                        if len(user_config) > limit:
+                            ret['error'].setdefault(f'Limit of {limit} highlights reached. Failed to add the following ->', []).extend(data['words'][i:])
+                            break
+                        if not any(_highlight['highlight'] == highlight for _highlight in user_config):
+                            user_config.append(hl)
+                            ret['added'].append(hl['highlight'])
+                            continue
+
+                    if action in ('remove', None):
+                        if to_remove := [_highlight for _highlight in user_config if _highlight['highlight'] == highlight]:
+                            for _data in to_remove:
+                                user_config.remove(_data)
+                                ret['removed'].append(_data['highlight'])
+                                self.costs.forget(member.guild.id, member.id, _data['highlight'])                    
+                            continue
+
+            if ret['added'] or ret['removed']:
+                self.invalidate_member_index(member)
+                await self.rebuild_snapshot(member.guild)
         return ret
 
+    async def set_member_highlights(self, member: discord.Member, highlights: Dict[int, List[Dict[str, Any]]]):
+        """Replaces the member's highlights in several scopes, keyed by the guild or channel id.
+
+        Only the given scopes are written, limits aren't checked here.
+        """
+        highlights = dict(highlights)
+        async with self.guild_lock(member.guild.id):
+            if (guild_data := highlights.pop(member.guild.id, None)) is not None:
+                async with self.config.guild(member.guild).highlights() as config:
+                    if guild_data:
+                       config[str(member.id)] = [dict(hl) for hl in guild_data]
+                    else:
+                       config.pop(str(member.id), None)
+
+            for channel_id, data in highlights.items():
+                async with self.config.channel_from_id(channel_id).highlights() as config:
+                    if data:
+                       config[str(member.id)] = [dict(hl) for hl in data]
+                    else:
+                       config.pop(str(member.id), None)
+
+            self.invalidate_member_index(member)
+            await self.rebuild_snapshot(member.guild)
+
+    async def export_member_highlights(self, member: discord.Member) -> Dict[int, List[Dict[str, Any]]]:
+        snapshot = await self.get_snapshot(member.guild)
+        return {
+            scope_id: [hl.to_dict() for hl in records]
+            for scope_id, records in snapshot.member_scopes.get(member.id, {}).items()
+        }
+
+    async def import_member_highlights(self, member: discord.Member, data: Any) -> Dict[int, int]:
+        """Merges an export into the member's highlights, returns how many were added per scope.
+
+        Nothing is written unless every highlight is valid and no limit is exceeded, ``commands.BadArgument`` is raised otherwise.
+        """
+        if not isinstance(data, dict):
+            raise commands.BadArgument('Expected a JSON object of guild or channel ids to highlights.')
+
+        current = await self.export_member_highlights(member)
+        merged = {}
+        for scope_id, highlights in data.items():
+            try:
+                scope_id = int(scope_id)
+            except ValueError:
+                raise commands.BadArgument(f'Invalid channel id \"{scope_id}\".')
+            if scope_id != member.guild.id and not member.guild.get_channel(scope_id):
+                raise commands.BadArgument(f'`{scope_id}` is not a channel in this guild.')
+            if not isinstance(highlights, list):
+                raise commands.BadArgument(f'Expected a list of highlights for `{scope_id}`.')
+
+            scope = merged.setdefault(scope_id, list(current.get(scope_id, [])))
+            for hl in highlights:
+                if not isinstance(hl, dict) or not isinstance(hl.get('highlight'), str) or not hl['highlight'].strip():
+                    raise commands.BadArgument('Every highlight needs a `highlight` string.')
+                hl = {'highlight': hl['highlight'], 'type': hl.get('type', 'default'), 'settings': list(hl.get('settings', []))}
+                validate_highlight(hl['highlight'], hl['type'], hl['settings'])
+                if not any(existing['highlight'] == hl['highlight'] for existing in scope):
+                    scope.append(hl)
+
+            limit = 25 if scope_id == member.guild.id else 10
+            if len(scope) > limit:
+                where = 'guild highlights' if scope_id == member.guild.id else f'highlights for <#{scope_id}>'
+                raise commands.BadArgument(f'This would give you {len(scope)} {where}, the limit is `{limit}`.')
+
+        channels = {scope_id for scope_id, scope in {**current, **merged}.items() if scope and scope_id != member.guild.id}
+        if len(channels) > 20:
+            raise commands.BadArgument(f'This would give you highlights in {len(channels)} channels, the limit is `20`.')
+
+        added = {scope_id: len(scope) - len(current.get(scope_id, [])) for scope_id, scope in merged.items()}
+        if any(added.values()):
+            await self.set_member_highlights(member, {scope_id: merged[scope_id] for scope_id, count in added.items() if count})
+        return added
+
+    async def dump_guild(self, guild: discord.Guild, fp):
+        """Writes all of a guild's highlights and member settings to ``fp`` as newline delimited JSON, a line at a time."""
+        for member_id, highlights in (await self.config.guild(guild).highlights()).items():
+            fp.write(json.dumps({'scope': 'guild', 'member': int(member_id), 'highlights': highlights}).encode() + b'\n')
+
+        for channel_id, config in (await self.config.all_channels()).items():
+            if not guild.get_channel_or_thread(channel_id):
+                continue
+            for member_id, highlights in config.get('highlights', {}).items():
+                fp.write(json.dumps({'scope': 'channel', 'channel': channel_id, 'member': int(member_id), 'highlights': highlights}).encode() + b'\n')
+
+        for member_id, config in (await self.config.all_members(guild)).items():
+            fp.write(json.dumps({'scope': 'member', 'member': member_id, 'config': config}).encode() + b'\n')
+
+    async def restore_guild(self, guild: discord.Guild, fp) -> Dict[str, int]:
+        """Replaces a guild's highlights and member settings with a dump read line by line from ``fp``.
+
+        Invalid highlights and channels that aren't in the guild are skipped. Only the guild's own scopes
+        are written, under its lock, followed by a single snapshot rebuild.
+        """
+        guild_highlights, channel_highlights, member_configs = {}, {}, {}
+        counts = dict(highlights = 0, members = 0, skipped = 0)
+        for number, line in enumerate(fp, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if (
+                not isinstance(entry, dict)
+                or not isinstance(entry.get('highlights', []), list)
+                or not isinstance(entry.get('config', {}), dict)
+                or not isinstance(entry.get('member'), int)
+            ):
+                raise ValueError(f'line {number} is malformed')
+            if entry['scope'] == 'member':
+                member_configs[entry['member']] = entry['config']
+                counts['members'] += 1
+                continue
+
+            if entry['scope'] == 'guild':
+                target = guild_highlights
+            elif entry['scope'] == 'channel' and guild.get_channel(entry['channel']):
+                target = channel_highlights.setdefault(str(entry['channel']), {})
+            else:
+                counts['skipped'] += len(entry.get('highlights', []))
+                continue
+
+            valid = []
+            for hl in entry['highlights']:
+                try:
+                    validate_highlight(hl['highlight'], hl['type'], hl.get('settings', []))
+                except (commands.BadArgument, KeyError, TypeError):
+                    counts['skipped'] += 1
+                    continue
+                valid.append(hl)
+            if valid:
+                target[str(entry['member'])] = valid
+                counts['highlights'] += len(valid)
+
+        async with self.guild_lock(guild.id):
+            # the snapshot was rebuilt by the last write under the lock, so it knows every scope that has highlights.
+            snapshot = await self.get_snapshot(guild)
+            old_channels = {scope_id for scopes in snapshot.member_scopes.values() for scope_id in scopes} - {guild.id}
+            await self.config.guild(guild).highlights.set(guild_highlights)
+            for channel_id in old_channels - set(map(int, channel_highlights)):
+                await self.config.channel_from_id(channel_id).highlights.clear()
+            for channel_id, highlights in channel_highlights.items():
+                await self.config.channel_from_id(int(channel_id)).highlights.set(highlights)
+            await self.config.clear_all_members(guild)
+            for member_id, config in member_configs.items():
+                await self.config.member_from_ids(guild.id, member_id).set(config)
+
+            await self.generate_cache()
+            for key in [key for key in {*self.index_versions, *self.show_indexes} if key[0] == guild.id]:
+                self.index_versions[key] = self.index_versions.get(key, 0) + 1
+                self.show_indexes.pop(key, None)
+            await self.rebuild_snapshot(guild)
+        return counts
+
     async def handle_block_update(self, ctx: commands.Context, objects: List[discord.Object], action):
         current = await self.edit_member_blocks(ctx.author, objects, action)
 
@@ -275,29 +591,207 @@ class HighlightHandler:
         await ctx.send(embed = embed)
 
     async def edit_member_blocks(self, member: discord.Member, objects: List[discord.Object], action: Literal['add', 'remove']):
-        async with self.config.member(member).blocks() as current:
-            for obj in objects:
-                if not obj.id in current and action == 'add':
-                   current.append(obj.id)
-                elif obj.id in current and action == 'remove':
-                   current.remove(obj.id)
-
-        await self.generate_cache()
+        async with self.guild_lock(member.guild.id):
+            async with self.config.member(member).blocks() as current:
+                for obj in objects:
+                    if not obj.id in current and action == 'add':
+                       current.append(obj.id)
+                    elif obj.id in current and action == 'remove':
+                       current.remove(obj.id)
+
+            await self.generate_cache()
+            self.invalidate_member_index(member)
+            await self.rebuild_snapshot(member.guild)
         return current
 
+    async def flush_stats(self):
+        """Merges the in-memory stats counters into config, one write per guild."""
+        for guild_id, members in self.stats.drain().items():
+            async with self.config.guild_from_id(guild_id).stats() as stored:
+                for member_id, delta in members.items():
+                    merge_stats(stored.setdefault(member_id, {}), delta)
+
+    async def flush_stats_loop(self, interval: int = 300):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_stats()
+            except Exception as e:
+                log.error('Failed to flush highlight stats.', exc_info = e)
+
+    async def get_member_stats(self, member: discord.Member) -> Dict[str, Any]:
+        """The member's stored stats with the ones that haven't been flushed yet added."""
+        stored = (await self.config.guild(member.guild).stats()).get(str(member.id), {})
+        return merge_stats(merge_stats({}, stored), self.stats.pending(member.guild.id, member.id))
+
+    async def delete_user_data(self, user_id: int, references: bool = False, authored: bool = False) -> Dict[str, Any]:
+        """Deletes a user's highlights, settings, logs and stats from every guild.
+
+        ``authored`` also removes other members' logs of messages the user sent and ``references``
+        removes the user from other members' ignores. Each guild's snapshot is used as a reverse index,
+        so only the scopes holding the user's data are written, a guild at a time under its lock. Logs
+        aren't indexed, so ``authored`` reads the guild's members but only writes the logs that change.
+        Deleted channels and guilds the bot has left have no snapshot, they're found with one pass over
+        config instead.
+        """
+        start = time.perf_counter()
+        uid = str(user_id)
+        counts = dict(highlights = 0, blocks = 0, logs = 0)
+        affected = set()
+        for guild in self.bot.guilds:
+            async with self.guild_lock(guild.id):
+                snapshot = await self.get_snapshot(guild)
+                touched = False
+                for scope_id in snapshot.member_scopes.get(user_id, {}):
+                    scope = self.config.guild_from_id(scope_id) if scope_id == guild.id else self.config.channel_from_id(scope_id)
+                    async with scope.highlights() as highlights:
+                        counts['highlights'] += len(highlights.pop(uid, None) or [])
+                    touched = True
+
+                if user_id in snapshot.member_configs:
+                    await self.config.member_from_ids(guild.id, user_id).clear()
+                    touched = True
+
+                if references:
+                    for member_id in snapshot.blocked_by.get(user_id, ()):
+                        async with self.config.member_from_ids(guild.id, member_id).blocks() as blocks:
+                            if user_id in blocks:
+                               blocks.remove(user_id)
+                               counts['blocks'] += 1
+                               touched = True
+
+                if authored:
+                    for member_id, data in (await self.config.all_members(guild)).items():
+                        logs = data.get('logs') or []
+                        kept = [entry for entry in logs if entry.get('highlighted_by') != user_id]
+                        if len(kept) != len(logs):
+                            await self.config.member_from_ids(guild.id, member_id).logs.set(kept)
+                            counts['logs'] += len(logs) - len(kept)
+                            touched = True
+
+                if uid in (stats := await self.config.guild_from_id(guild.id).stats()):
+                    del stats[uid]
+                    await self.config.guild_from_id(guild.id).stats.set(stats)
+                    touched = True
+
+                if touched:
+                    affected.add(guild.id)
+                    await self.rebuild_snapshot(guild)
+
+        # deleted channels and guilds the bot has left aren't in any snapshot, so config is swept once for those.
+        live = {guild.id for guild in self.bot.guilds}
+        for channel_id, data in (await self.config.all_channels()).items():
+            if uid in data.get('highlights', {}) and self.bot.get_channel(channel_id) is None:
+                async with self.config.channel_from_id(channel_id).highlights() as highlights:
+                    counts['highlights'] += len(highlights.pop(uid, None) or [])
+
+        for guild_id, data in (await self.config.all_guilds()).items():
+            if guild_id in live:
+                continue
+            if uid in data.get('highlights', {}):
+                async with self.config.guild_from_id(guild_id).highlights() as highlights:
+                    counts['highlights'] += len(highlights.pop(uid, None) or [])
+                affected.add(guild_id)
+            if uid in data.get('stats', {}):
+                async with self.config.guild_from_id(guild_id).stats() as stats:
+                    stats.pop(uid, None)
+                affected.add(guild_id)
+
+        for guild_id, members in (await self.config.all_members()).items():
+            if guild_id in live:
+                continue
+            if user_id in members:
+                await self.config.member_from_ids(guild_id, user_id).clear()
+                affected.add(guild_id)
+            for member_id, data in members.items():
+                if member_id == user_id:
+                    continue
+                if references and user_id in (blocks := data.get('blocks') or []):
+                    await self.config.member_from_ids(guild_id, member_id).blocks.set([_id for _id in blocks if _id != user_id])
+                    counts['blocks'] += 1
+                    affected.add(guild_id)
+                if authored:
+                    logs = data.get('logs') or []
+                    kept = [entry for entry in logs if entry.get('highlighted_by') != user_id]
+                    if len(kept) != len(logs):
+                        await self.config.member_from_ids(guild_id, member_id).logs.set(kept)
+                        counts['logs'] += len(logs) - len(kept)
+                        affected.add(guild_id)
+
+        for guild_id in affected:
+            self.costs.forget(guild_id, user_id)
+            self.stats.forget(guild_id, user_id)
+            self.cooldowns.get(guild_id, {}).pop(user_id, None)
+            self.last_seen.get(guild_id, {}).pop(user_id, None)
+            self.index_versions[(guild_id, user_id)] = self.index_versions.get((guild_id, user_id), 0) + 1
+            self.show_indexes.pop((guild_id, user_id), None)
+        self.blacklist.pop(user_id, None)
+        if affected:
+            await self.generate_cache()
+
+        counts['guilds'] = len(affected)
+        counts['time'] = time.perf_counter() - start
+        log.info(f'Deleted data of {user_id} from {len(affected)} guilds in {counts["time"]:.3f}s: {counts}')
+        return counts
+
     async def send_alert(self, *args, **kwargs):
-        return await self.bot.get_channel(897450721493012500).send(*args, **kwargs)
+        return await self.bot.get_channel(ALERT_CHANNEL).send(*args, **kwargs)
 
     async def generate_cache(self):
         self.global_cache = await self.config.all()
         self.member_config = await self.config.all_members()
 
+    def notify_throttled(self, member: discord.Member, highlight: HighlightRecord, state: str):
+        if state == SAMPLED:
+            content = f'Your highlight {inline(highlight.text)} in **{member.guild.name}** is taking too long to match, so it will only be checked on some messages for now.'
+        else:
+            content = f'Your highlight {inline(highlight.text)} in **{member.guild.name}** is taking too long to match and has been suspended. Remove and add it again once you\'ve made it cheaper.'
+
+        async def notify():
+            try:
+                await member.send(content)
+            except discord.HTTPException:
+                pass
+            if state == SUSPENDED:
+                await self.send_alert(content = f'Suspended highlight `{highlight.text}`.\n> Belongs To : {member.mention}')
+        asyncio.create_task(notify())
+
     def _check_cooldown(self, seconds: int):
         return min(max(seconds, self.global_cache['cooldown']['min']), self.global_cache['cooldown']['max'])
 
     def get_member_config(self, member: discord.Member):
         return self.member_config.get(member.guild.id, {}).get(member.id, self.default_member)
     
+class AttachmentCache:
+    """Attachment bytes shared by every highlight view, least recently used ones are evicted past ``max_size`` bytes."""
+
+    def __init__(self, max_size: int = 32 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self._data: 'OrderedDict[int, bytes]' = OrderedDict()
+
+    async def get(self, attachment: discord.Attachment) -> bytes:
+        if (data := self._data.get(attachment.id)) is not None:
+            self._data.move_to_end(attachment.id)
+            return data
+
+        data = await attachment.read()
+        if len(data) <= self.max_size // 4: # don't let one big file flush everything
+            self._data[attachment.id] = data
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, evicted = self._data.popitem(last = False)
+                self.size -= len(evicted)
+        return data
+
+    async def files(self, attachments: List[discord.Attachment]) -> List[discord.File]:
+        return [
+            discord.File(BytesIO(await self.get(attach)), filename = attach.filename, spoiler = attach.is_spoiler())
+            for attach in attachments
+        ]
+
+attachment_cache = AttachmentCache()
+
 class HighlightView(discord.ui.View):
    def __init__(self, message: discord.Message, highlights: list):
        super().__init__(timeout = None)
@@ -307,6 +801,7 @@ class HighlightView(discord.ui.View):
        self.embeds = message.embeds
        self.highlights = highlights
        self.data = {}
+       self._rendered = None
 
        if len(self.content) > 500 or self.attachments or self.embeds:
 
@@ -318,44 +813,55 @@ class HighlightView(discord.ui.View):
           self.add_item(button)
 
        else:
-          button = discord.ui.Button(
-             label = 'Jump To Source',
-             style = discord.ButtonStyle.link,
-             url = self.message.jump_url
-          )
-          self.add_item(button)
+          self.add_item(self.jump_button())
+
+   def jump_button(self) -> discord.ui.Button:
+       return discord.ui.Button(
+          label = 'Jump To Source',
+          style = discord.ButtonStyle.link,
+          url = self.message.jump_url
+       )
+
+   def render(self):
+       """Highlights every match in the content and embeds with one combined pattern, done once per view."""
+       if self._rendered is not None:
+          return self._rendered
+
+       words = sorted({h for h in self.highlights if h.strip()}, key = len, reverse = True)
+       if words:
+          regex = re.compile('|'.join(
+             ('\\b' if re.match(r'\w', w) else '') + re.escape(w) + ('\\b' if re.search(r'\w$', w) else '')
+             for w in words
+          ), flags = re.IGNORECASE)
+          sub = functools.partial(regex.sub, r'**__\g<0>__**')
+       else:
+          sub = lambda text: text
+
+       embeds = []
+       for original in self.embeds:
+           embed = discord.Embed.from_dict(original.to_dict()) # don't edit the cached message's embeds
+           embed.description = sub(embed.description)[:4096] if embed.description else None
+           fields = [{'name': field.name, 'value': sub(field.value or '')[:1024], 'inline': field.inline} for field in embed.fields]
+           embed.clear_fields()
+           for field in fields:
+               embed.add_field(**field)
+           embeds.append(embed)
+
+       self._rendered = (sub(self.content)[:2000], embeds)
+       return self._rendered
 
    async def execute(self, interaction: discord.Interaction):
-       
-       for highlight in self.highlights:
-           regex = re.compile(rf'\b{re.escape(highlight)}\b', flags = re.IGNORECASE)
-           replace_re = r'**__\g<0>__**'
-           content = regex.sub(replace_re, self.content)
-
-           for embed in self.embeds:
-               embed.description = regex.sub(replace_re, embed.description)[:2000] if embed.description else None
-               fields = []
-               for field in embed.fields:
-                   value = field.value = regex.sub(replace_re, field.value) if field.value else None
-                   fields.append({'name': field.name, 'value': value})
-               embed.clear_fields()
-               [embed.add_field(**field) for field in fields]
-            
+       content, embeds = self.render()
        data = {
              'content': content,
-             'embeds': self.embeds,
-             'files': [await attach.to_file() for attach in self.attachments],
+             'embeds': embeds,
+             'files': await attachment_cache.files(self.attachments),
              'view': discord.ui.View.from_message(self.message),
              'ephemeral': True
        }
 
        await interaction.response.send_message(**data)
 
-       self.clear_items()
-       button = discord.ui.Button(
-            label = 'Jump To Source',
-            style = discord.ButtonStyle.link,
-            url = self.message.jump_url
-       )
-       self.add_item(button)
-       await interaction.message.edit(view = self)
\ No newline at end of file
+       if not any(getattr(item, 'url', None) for item in self.children):
+          self.add_item(self.jump_button())
+          await interaction.message.edit(view = self)
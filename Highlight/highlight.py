@@ -4,6 +4,8 @@ import asyncio
 import time
 import logging
 import datetime
+import functools
+import tempfile
 
 from io import BytesIO
 from discord.ext import commands as dpy_commands
@@ -13,16 +15,26 @@ from redbot.core.utils.chat_formatting import humanize_list, humanize_timedelta
 from redbot.core.utils.menus import start_adding_reactions, menu
 from redbot.core.utils.predicates import ReactionPredicate
 from .helpers import (
+      ALERT_CHANNEL,
       HighlightView, 
       HighlightHandler,
-      Matches
+      Matches,
+      _message_check,
+      replay
 )
 from .converters import (
       HighlightFlagResolver
 )
+from .alerts import AlertDigest
+from .costs import CostTracker
+from .ingest import IngestQueue
+from .stats import REASONS, HighlightStats
 from .menus import ChannelShowMenu
+from .records import TYPES, MatchResult, deep_sizeof, to_records
+from .engine import LinearPattern, benchmark
+from .snapshot import GuildSnapshot, highlight_source
 
-from typing import Union, Optional, Literal
+from typing import Dict, Union, Optional, Literal
 
 log = logging.getLogger('red.cogs.Highlight')
 
@@ -51,22 +63,58 @@ class Highlight(HighlightHandler, commands.Cog):
               cooldown__min = 30,
               cooldown__max = 600,
               len__min = 2,
-              len__max = 50
+              len__max = 50,
+              queue__size = 100,
+              queue__workers = 4,
+              queue__policy = 'drop_oldest',
+              cost__budget = 2.0,
+              cost__window = 3600,
+              cost__sample_rate = 10
+          )
+          self.config.register_guild(
+              highlights = {},
+              allowed_roles = [],
+              # the categories that were hard-coded before this was configurable.
+              alerts__categories = [975215943506624532, 722753720248565770, 719202787904323635, 817270098427117588, 753339882641817600, 738129181967253584],
+              alerts__channel = None,
+              stats = {} # member_id -> {'highlights': {text: {'matches', 'notified'}}, 'suppressed': {reason: count}}
           )
-          self.config.register_guild(highlights = {}, allowed_roles = [])
           self.config.register_channel(highlights = {}, synced_with = {})
           self.last_seen = {}
           self.cooldowns = {}
           self.blacklist = {} # member_id -> Data
+          self.snapshots = {} # guild_id -> GuildSnapshot
+          self.guild_locks = {} # guild_id -> asyncio.Lock
+          self._snapshot_builds = {} # guild_id -> asyncio.Task
+          self._snapshot_version = 0
+          self.prefilter_stats = {} # guild_id -> {'checked': int, 'skipped': int}
+          self.index_versions = {} # (guild_id, member_id) -> int
+          self.show_indexes = {} # (guild_id, member_id) -> ChannelShowIndex
+          self.stats = HighlightStats()
 
           # self.re_pool = mp.Pool()
 
       async def red_delete_data_for_user(self, *, requester: Literal["discord_deleted_user", "owner", "user", "user_strict"], user_id: int):
-         ...
+         await self.delete_user_data(
+            user_id,
+            references = requester == 'discord_deleted_user',
+            authored = requester in ('discord_deleted_user', 'user_strict')
+         )
 
       async def cog_load(self):
          asyncio.create_task(self.generate_cache())
-         
+         asyncio.create_task(self.generate_snapshots())
+         self.ingest = IngestQueue(self.process_message, **(await self.config.queue()))
+         self.costs = CostTracker(**(await self.config.cost()))
+         self.alert_digest = AlertDigest(self.bot)
+         self._stats_task = asyncio.create_task(self.flush_stats_loop())
+
+      async def cog_unload(self):
+         self.ingest.close()
+         self.alert_digest.close()
+         self._stats_task.cancel()
+         asyncio.create_task(self.flush_stats())
+
       @commands.Cog.listener('on_message')
       async def on_message(self, message: discord.Message):
 
@@ -78,7 +126,16 @@ class Highlight(HighlightHandler, commands.Cog):
 
          self.last_seen.setdefault(message.guild.id, {}).setdefault(getattr(message.interaction, 'user', message.author).id, {})[(message.channel.category or message.channel).id] = time.time()
 
-         highlights = await self.get_highlights_for_message(message=message)
+         snapshot = await self.get_snapshot(message.guild)
+         message_check = _message_check(message)
+         if not self.prefilter_message(message, message_check, snapshot):
+            return
+
+         self.ingest.put(message.guild.id, message, snapshot, message_check)
+
+      async def process_message(self, message: discord.Message, snapshot: GuildSnapshot, message_check: Dict[str, str], degraded: bool = False):
+         highlights = snapshot.highlights_for(message.channel.id, getattr(message.channel, 'category_id', None))
+         match_cache = {} # (text, kind) -> (match, content type), shared by every member
 
          history = [
                '**[<t:{timestamp}:T>] {author}:** {content} {attachments} {embeds}'.format(
@@ -103,30 +160,42 @@ class Highlight(HighlightHandler, commands.Cog):
             member = message.guild.get_member(member_id)
             if not member or self.blacklist.get(member.id):
                continue
-            data = self.get_member_config(member)
+            data = snapshot.member_config(member.id)
             cooldown = self._check_cooldown(seconds = data['cooldown'])
+            suppressed = None
             if (
                (cd := self.cooldowns.get(message.guild.id, {}).get(member.id))
                and cd >= (time.time() - cooldown)
             ): 
-               continue
-            last_seen = self.last_seen.get(message.guild.id, {}).get(member.id)
-            if last_seen:   
+               suppressed = 'cooldown'
+            elif last_seen := self.last_seen.get(message.guild.id, {}).get(member.id):
                lsc, filtered = (
                   last_seen.get((message.channel.category or message.channel).id, 0),
                   list(filter(lambda t: t > (time.time() - 300), last_seen.values()))
                )
                if lsc > (time.time() - 300) or len(filtered) > 2:
-                  continue
-            matches = await Matches._resolve(self, member, highlights = highlight, message = message)
+                  suppressed = 'last_seen'
+            if suppressed:
+               # not worth matching for someone who won't be notified, only counted when the same highlight
+               # already matched this message for another member.
+               if any((match_cache.get((hl.text, hl.kind)) or (None,))[0] for hl in highlight):
+                  self.stats.suppressed(message.guild.id, member.id, suppressed)
+               continue
+            if degraded and not (highlight := tuple(hl for hl in highlight if hl.type == 'default')):
+               continue
+            matches = await Matches._resolve(self, member, highlights = highlight, message = message, message_check = message_check, snapshot = snapshot, match_cache = match_cache)
             if not matches:
                continue
+            matched = [result.highlight.text for result in matches._matches]
+            self.stats.matched(message.guild.id, member.id, matched)
             if (
                not message.channel.permissions_for(member).read_message_history
                or not message.channel.permissions_for(member).read_messages
             ):
+               self.stats.suppressed(message.guild.id, member.id, 'permissions')
                continue
-            if any(x.id in data['blocks'] for x in [message.author, message.channel]):
+            if any(x.id in snapshot.member_blocks(member.id) for x in [message.author, message.channel]):
+               self.stats.suppressed(message.guild.id, member.id, 'blocked')
                continue
             self.cooldowns.setdefault(message.guild.id, {})[member.id] = time.time()
 
@@ -135,36 +204,28 @@ class Highlight(HighlightHandler, commands.Cog):
                await member.send(
                      content = f'In **{message.guild.name}** {message.channel.mention}, you were mentioned with the highlighted word{"s" if len(matches) > 1 else ""} {matches.format_response()}.',
                      embed = embed,
-                     view =  HighlightView(message, [hl['highlight'] for hl in highlight])
+                     view =  HighlightView(message, [result.match for result in matches._matches])
                )
                members_highlighted.append(member)
+               self.stats.notified(message.guild.id, member.id, matched)
                async with self.config.member(member).logs() as logs:
                   logs.append(
                      {
                         'channel_id': message.channel.id,
                         'highlighted_by': message.author.id,
-                        'matches': matches._matches,
+                        'matches': matches.to_dicts(),
                         'embed': embed.to_dict(),
                         'highlighted_at': int(message.created_at.timestamp())
                      }
                   )
             except discord.HTTPException:
-               pass
+               self.stats.suppressed(message.guild.id, member.id, 'dm_failed')
             except Exception as e:
                log.error(f'Failed to Highlight {member} [GUILD]: {message.guild.name}.', exc_info = e)
-         if members_highlighted and message.channel.category_id in [975215943506624532, 722753720248565770, 719202787904323635, 817270098427117588, 753339882641817600, 738129181967253584]:
-            embed = discord.Embed(
-               title = 'Private Channel Highlight',
-               description = '\n'.join([f'> {m.mention} - {m}' for m in members_highlighted]),
-               timestamp = datetime.datetime.utcnow(),
-               colour = discord.Colour.red()
-            )
-            embed.add_field(
-               name = 'Message',
-               value = history[len(history)-1]
-            )
-            embed.set_footer(text = message.channel.name, icon_url = (message.guild.icon or message.author.avatar).url)
-            await self.send_alert(embed = embed)
+         if members_highlighted and message.channel.category_id:
+            alerts = await self.config.guild(message.guild).alerts()
+            if message.channel.category_id in alerts['categories']:
+               self.alert_digest.add(alerts['channel'] or ALERT_CHANNEL, message, members_highlighted)
 
       @commands.Cog.listener('on_user_activity')
       async def on_user_activity(self, user: Union[discord.Member, discord.User], channel: discord.abc.Messageable):
@@ -231,17 +292,23 @@ class Highlight(HighlightHandler, commands.Cog):
             - `<channels_and_categories>`: The channels to sync highlights to, if a category is passed, highlights are synced with all the channels in that category. Including voice channels.
             
          """
-         return await ctx.send(
-            'This command has been temporarily disabled.'
-         )
-         channels = [channel for channel in channels_and_categories if not isinstance(channel, discord.CategoryChannel)]
+         channels = {}
          for channel in channels_and_categories:
-             if isinstance(channel, discord.CategoryChannel):
-                channels.extend(c for c in channel.channels)
-         
-         base_config = (await self.config.channel(base_channel).highlights()).get(str(ctx.author.id), [])
+             for c in (channel.channels if isinstance(channel, discord.CategoryChannel) else [channel]):
+                 if isinstance(c, (discord.TextChannel, discord.VoiceChannel)) and c != base_channel:
+                    channels[c.id] = c
+         if not channels:
+            return await ctx.send('There are no channels to sync to.')
+
+         current = await self.get_all_member_highlights(ctx.author)
+         base_config = current.get(base_channel.id, [])
          if not base_config:
             return await ctx.send(f'You have no highlights for {base_channel.mention}.')
+         if len(base_config) > 10:
+            return await ctx.send(f'{base_channel.mention} has more than 10 highlights, remove some before syncing it.')
+         in_use = {channel_id for channel_id, highlights in current.items() if highlights and channel_id != ctx.guild.id}
+         if len(in_use | channels.keys()) > 20:
+            return await ctx.send(f'This would give you highlights in **{len(in_use | channels.keys())}** channels, the limit is `20`.')
 
          msg = await ctx.send(f'Are you sure you want to sync **{len(base_config)}** highlight{"s" if len(base_config) > 1 else ""} from {base_channel.mention} to **{len(channels)}** other channel{"s" if len(channels) > 1 else ""}?\n\n**Note:** This will **replace** the highlights of all the channels passed with those of the base channel.')
          start_adding_reactions(msg, ReactionPredicate.YES_OR_NO_EMOJIS)
@@ -253,13 +320,44 @@ class Highlight(HighlightHandler, commands.Cog):
 
          await msg.delete()
          if pred.result is True:
-            for channel in channels:
-               async with self.config.channel(channel).highlights() as highlight:
-                     highlight[str(ctx.author.id)] = base_config
-            await ctx.send('done.')
+            await self.set_member_highlights(ctx.author, {channel_id: base_config for channel_id in channels})
+            await ctx.send(f'Synced your highlights to {len(channels)} channel{"s" if len(channels) > 1 else ""}.')
          else:
             return await ctx.send('kden....')
 
+      @highlight.group(name = 'category', autohelp = True)
+      async def highlight_category(self, ctx: commands.Context):
+         """Manage category-wide highlights.
+
+         Category highlights apply to every channel in the category, on top of your guild highlights and the channel's own highlights.
+         """
+         pass
+
+      @highlight_category.command(name = 'add')
+      async def highlight_category_add(self, ctx: commands.Context, category: Optional[discord.CategoryChannel], *, word: HighlightFlagResolver):
+         """Add words to your highlights for a category.
+
+         You can add a maximum of 10 highlights per category, categories count towards the limit of **20** channels.
+         Defaults to the category of the current channel.
+
+         **Flags:**
+            > `--multiple`: Add multiple words to your highlights at once.
+            > `--wildcard`: Attempts to search for bypasses fetching matches.
+            > `--regex`: Add a Regular expression to your highlights. It is suggested you [learn regex](https://github.com/ziishaned/learn-regex) and [debug](https://regex101.com/) it first.
+            > `--set <types...>`: Additional config for the added highlights. Valid Types: `bots`, `embeds`.
+         """
+         if not (category := category or ctx.channel.category):
+            return await ctx.send('This channel isn\'t in a category, pass one explicitly.')
+         await self.handle_highlight_update(ctx, word, action = 'add', channel = category)
+
+      @highlight_category.command(name = 'remove')
+      async def highlight_category_remove(self, ctx: commands.Context, category: Optional[discord.CategoryChannel], *, word: HighlightFlagResolver):
+         """Removes word(s) from your highlights for a category."""
+
+         if not (category := category or ctx.channel.category):
+            return await ctx.send('This channel isn\'t in a category, pass one explicitly.')
+         await self.handle_highlight_update(ctx, word, action = 'remove', channel = category)
+
       @highlight.command(name = 'add', aliases = ['+'])
       async def highlight_add(self, ctx: commands.Context, *, word: HighlightFlagResolver):
          """Add words to your guild highlights.
@@ -296,8 +394,8 @@ class Highlight(HighlightHandler, commands.Cog):
       async def highlight_show(self, ctx: commands.Context, channel: Optional[Union[discord.TextChannel, discord.VoiceChannel]]):
          """Shows your current highlights."""
 
-         all_highlights = await self.get_all_member_highlights(ctx.author)
-         await ChannelShowMenu(ctx, all_highlights, self.get_member_config(ctx.author)['blocks']).send(start_value = getattr(channel, 'id', None))
+         index = await self.get_show_index(ctx.author)
+         await ChannelShowMenu(ctx, index).send(start_value = getattr(channel, 'id', None))
 
       @highlight.command(name = 'clear')
       async def highlight_clear(self, ctx: commands.Context):
@@ -319,20 +417,25 @@ class Highlight(HighlightHandler, commands.Cog):
             return await confirm_message.edit(content = 'Operation cancelled.')
 
          deleted_count = 0
-         async with self.config.guild(ctx.guild).highlights() as guild_highlights:
-            if h := guild_highlights.get(str(ctx.author.id)):
-               del guild_highlights[str(ctx.author.id)]
-               deleted_count += len(h)
-
-         channels = await self.config.all_channels()
-         for channel, data in channels.items():
-             if h := data.get('highlights', {}).get(str(ctx.author.id)):
+         async with self.guild_lock(ctx.guild.id):
+            async with self.config.guild(ctx.guild).highlights() as guild_highlights:
+               if h := guild_highlights.get(str(ctx.author.id)):
+                  del guild_highlights[str(ctx.author.id)]
+                  deleted_count += len(h)
+
+            snapshot = await self.get_snapshot(ctx.guild)
+            for channel in snapshot.member_scopes.get(ctx.author.id, {}):
+                if channel == ctx.guild.id:
+                   continue
                 async with self.config.channel_from_id(channel).highlights() as channel_highlights:
-                    del channel_highlights[str(ctx.author.id)]
-                    deleted_count += len(h)
+                    if h := channel_highlights.pop(str(ctx.author.id), None):
+                       deleted_count += len(h)
 
+            self.costs.forget(ctx.guild.id, ctx.author.id)
+            self.invalidate_member_index(ctx.author)
+            await self.generate_cache()
+            await self.rebuild_snapshot(ctx.guild)
          await confirm_message.edit(f'Removed **{deleted_count}** highlights from you.')
-         await self.generate_cache()
 
       @highlight.command(name = 'matches')
       async def highlight_matches(self, ctx: commands.Context, *, string: str):
@@ -342,7 +445,7 @@ class Highlight(HighlightHandler, commands.Cog):
 
          member_config, highlights = (
             self.get_member_config(ctx.author),
-            (await self.get_all_member_highlights(ctx.author)).get(ctx.guild.id, [])
+            to_records((await self.get_all_member_highlights(ctx.author)).get(ctx.guild.id, []))
          )
          if not highlights:
             return await ctx.send('You have no guild highlights, what do u want me to find matches for....')
@@ -350,10 +453,10 @@ class Highlight(HighlightHandler, commands.Cog):
          matches = await Matches._resolve(self, ctx.author, highlights, ctx.message)
          description = []
          for d in highlights:
-             if d['highlight'] in matches:
-                description.append('✅ ' + d['highlight'])
+             if d.text in matches:
+                description.append('✅ ' + d.text)
              else:
-                description.append('❌ ' + d['highlight'])
+                description.append('❌ ' + d.text)
 
          embed = discord.Embed(
              title = 'Matches',
@@ -364,15 +467,356 @@ class Highlight(HighlightHandler, commands.Cog):
 
          return await ctx.reply(embed = embed)
 
+      @highlight.command(name = 'replay')
+      async def highlight_replay(self, ctx: commands.Context, channel: Optional[Union[discord.TextChannel, discord.VoiceChannel]] = None, limit: int = 100):
+         """Shows how often your highlights would have matched the recent messages of a channel.
+
+         This uses both your guild highlights and your highlights for that channel, up to 500 messages are checked.
+         Cooldowns, ignores and your other settings are not taken into account.
+         """
+         channel = channel or ctx.channel
+         limit = max(1, min(limit, 500))
+         if not channel.permissions_for(ctx.author).read_message_history:
+            return await ctx.send('You can\'t read the message history of that channel.')
+
+         snapshot = await self.get_snapshot(ctx.guild)
+         highlights = snapshot.highlights_for(channel.id, channel.category_id).get(ctx.author.id)
+         if not highlights:
+            return await ctx.send(f'You have no highlights for {channel.mention}.')
+
+         async with ctx.typing():
+            messages = [m for m in self.bot.cached_messages if m.channel.id == channel.id and m.id != ctx.message.id][-limit:]
+            if len(messages) < limit:
+               messages = [m async for m in channel.history(limit = limit, before = ctx.message if channel == ctx.channel else None)]
+            if not messages:
+               return await ctx.send(f'There are no messages in {channel.mention} to check.')
+
+            checks = [_message_check(message) for message in messages]
+            task = asyncio.get_event_loop().run_in_executor(None, functools.partial(replay, highlights, checks))
+            try:
+               results = await asyncio.wait_for(task, timeout = 30)
+            except asyncio.TimeoutError:
+               return await ctx.send('Checking took too long, try fewer messages.')
+
+         lines = []
+         for hl, result in sorted(results.items(), key = lambda item: item[1]['hits'], reverse = True):
+            lines.append(
+               ('✅ ' if result['hits'] else '❌ ') + f'`{hl.text[:40]}` ({hl.type}) - '
+               + f'{result["hits"]} hit{"s" if result["hits"] != 1 else ""}, {result["cpu"] * 1000:.2f}ms'
+               + (f', e.g. "{result["example"][:30]}"' if result['example'] else '')
+            )
+         total = sum(result['cpu'] for result in results.values())
+         embed = discord.Embed(
+            title = f'Replay of #{channel.name}'[:50],
+            description = '\n'.join(lines)[:4096],
+            colour = self.get_member_config(ctx.author)['colour'],
+            timestamp = datetime.datetime.utcnow()
+         ).set_footer(text = f'{len(messages)} messages | {total * 1000:.2f}ms total, {total * 1e6 / len(messages):.0f}µs per message')
+         await ctx.reply(embed = embed)
+
+      @highlight.command(name = 'stats')
+      async def highlight_stats(self, ctx: commands.Context):
+         """Shows how often your highlights matched and why you weren't notified.
+
+         Cooldown and last seen aren't matched against, so they only count messages one of your highlights was already known to match through another member's.
+         """
+         stats = await self.get_member_stats(ctx.author)
+         if not stats.get('highlights') and not stats.get('suppressed'):
+            return await ctx.send('There are no stats for you yet.')
+
+         lines = [
+            f'`{text[:40]}` - {counts["matches"]} match{"es" if counts["matches"] != 1 else ""}, {counts["notified"]} notified'
+            for text, counts in sorted(stats.get('highlights', {}).items(), key = lambda item: item[1]['matches'], reverse = True)[:20]
+         ]
+         embed = discord.Embed(
+            title = 'Highlight stats',
+            description = '\n'.join(lines) or 'None of your highlights have matched yet.',
+            colour = self.get_member_config(ctx.author)['colour'],
+            timestamp = datetime.datetime.utcnow()
+         )
+         if suppressed := stats.get('suppressed'):
+            embed.add_field(
+               name = 'Not notified',
+               value = '\n'.join(f'{reason.replace("_", " ").title()}: {suppressed[reason]}' for reason in REASONS if suppressed.get(reason))
+            )
+         await ctx.reply(embed = embed)
+
       @highlight.command(name = 'export')
       async def highlight_export(self, ctx: commands.Context):
          """Export your highlights to a JSON file.
          """
-         highlights = await self.get_all_member_highlights(member = ctx.author)
+         highlights = await self.export_member_highlights(ctx.author)
+         if not highlights:
+            return await ctx.send('You have no highlights to export.')
 
          _file = BytesIO(json.dumps(highlights, indent = 3).encode())
          await ctx.send(file = discord.File(_file, 'highlights.json'))
 
+      @highlight.command(name = 'import')
+      async def highlight_import(self, ctx: commands.Context):
+         """Import highlights from a JSON file made with `highlight export`.
+
+         Attach the file to the command, its highlights are added to the ones you already have.
+         Nothing is imported if any highlight is invalid or a limit would be exceeded.
+         """
+         if not ctx.message.attachments:
+            return await ctx.send('Attach a file from `highlight export` to import it.')
+         attachment = ctx.message.attachments[0]
+         if attachment.size > 256 * 1024:
+            return await ctx.send('That file is way too big to be a highlight export.')
+
+         try:
+            data = json.loads(await attachment.read())
+         except (ValueError, discord.HTTPException):
+            return await ctx.send('That file isn\'t valid JSON.')
+
+         try:
+            added = await self.import_member_highlights(ctx.author, data)
+         except commands.BadArgument as e:
+            return await ctx.send(f'Nothing was imported. {e}')
+         if not any(added.values()):
+            return await ctx.send('You already have all of those highlights.')
+         await ctx.send('\n'.join(
+            f'Added **{count}** highlight{"s" if count != 1 else ""} to your '
+            + ('guild highlights.' if scope_id == ctx.guild.id else f'highlights for <#{scope_id}>.')
+            for scope_id, count in added.items() if count
+         ))
+
+      @highlight.group(name = 'migrate', hidden = True)
+      @commands.is_owner()
+      async def highlight_migrate(self, ctx: commands.Context):
+         """Dump and restore all of a guild's highlights."""
+
+      @highlight_migrate.command(name = 'dump')
+      async def highlight_migrate_dump(self, ctx: commands.Context):
+         """Dumps this guild's highlights and member settings as newline delimited JSON."""
+
+         async with ctx.typing():
+            with tempfile.TemporaryFile() as fp:
+               await self.dump_guild(ctx.guild, fp)
+               size = fp.tell()
+               fp.seek(0)
+               await ctx.send(f'Dumped {size} bytes.', file = discord.File(fp, f'highlight-{ctx.guild.id}.ndjson'))
+
+      @highlight_migrate.command(name = 'restore')
+      async def highlight_migrate_restore(self, ctx: commands.Context):
+         """Replaces this guild's highlights and member settings with an attached dump.
+
+         Everything currently stored for this guild is overwritten.
+         """
+         if not ctx.message.attachments:
+            return await ctx.send('Attach a file from `highlight migrate dump` to restore it.')
+
+         msg = await ctx.send(f'This will **replace** all highlights and highlight settings in **{ctx.guild.name}**, are you sure?')
+         start_adding_reactions(msg, ReactionPredicate.YES_OR_NO_EMOJIS)
+         pred = ReactionPredicate.yes_or_no(msg, ctx.author)
+         try:
+            await self.bot.wait_for('reaction_add', check = pred, timeout = 30.0)
+         except asyncio.TimeoutError:
+            return await msg.delete()
+         await msg.delete()
+         if not pred.result:
+            return await ctx.send('kden....')
+
+         async with ctx.typing():
+            with tempfile.TemporaryFile() as fp:
+               await ctx.message.attachments[0].save(fp)
+               fp.seek(0)
+               try:
+                  counts = await self.restore_guild(ctx.guild, fp)
+               except (ValueError, KeyError, TypeError) as e:
+                  return await ctx.send(f'That isn\'t a valid dump: {e}')
+         await ctx.send(f'Restored **{counts["highlights"]}** highlights and the settings of **{counts["members"]}** members, skipped **{counts["skipped"]}**.')
+
+      @highlight.group(name = 'debug', hidden = True)
+      @commands.is_owner()
+      async def highlight_debug(self, ctx: commands.Context):
+         """Internal metrics for Highlight."""
+
+      @highlight_debug.command(name = 'prefilter')
+      async def highlight_debug_prefilter(self, ctx: commands.Context):
+         """Shows the prefilter size and how many messages it skipped in this guild."""
+
+         prefilter = getattr(self.snapshots.get(ctx.guild.id), 'prefilter', None)
+         stats = self.prefilter_stats.get(ctx.guild.id, {'checked': 0, 'skipped': 0})
+         total_checked, total_skipped = (
+            sum(s['checked'] for s in self.prefilter_stats.values()),
+            sum(s['skipped'] for s in self.prefilter_stats.values())
+         )
+         embed = discord.Embed(
+            title = 'Prefilter',
+            description = '\n'.join([
+               f'Keys: {getattr(prefilter, "size", "not built")}',
+               f'Passthrough: {getattr(prefilter, "passthrough", None)}',
+               f'Skipped: {stats["skipped"]}/{stats["checked"]} ({stats["skipped"] / (stats["checked"] or 1):.1%})',
+               f'Skipped (all guilds): {total_skipped}/{total_checked} ({total_skipped / (total_checked or 1):.1%})'
+            ]),
+            colour = discord.Colour.green(),
+            timestamp = datetime.datetime.utcnow()
+         )
+         await ctx.send(embed = embed)
+
+      @highlight_debug.command(name = 'snapshot')
+      async def highlight_debug_snapshot(self, ctx: commands.Context):
+         """Shows the version, size and build time of this guild's matcher snapshot."""
+
+         snapshot = self.snapshots.get(ctx.guild.id)
+         if not snapshot:
+            return await ctx.send('No snapshot has been built for this guild yet.')
+
+         snapshots = list(self.snapshots.values())
+         embed = discord.Embed(
+            title = 'Snapshot',
+            description = '\n'.join([
+               f'Version: {snapshot.version}',
+               f'Built: <t:{int(snapshot.built_at)}:R> in {snapshot.build_time * 1000:.2f}ms',
+               f'Highlights: {snapshot.highlight_count} ({len(snapshot.patterns)} unique patterns)',
+               f'Members: {len(snapshot.member_configs)}',
+               f'Size: {snapshot.size / 1024:.1f} KiB',
+               '',
+               f'Guilds: {len(snapshots)}',
+               f'Total size: {sum(s.size for s in snapshots) / 1024:.1f} KiB',
+               f'Slowest build: {max(s.build_time for s in snapshots) * 1000:.2f}ms'
+            ]),
+            colour = discord.Colour.green(),
+            timestamp = datetime.datetime.utcnow()
+         )
+         await ctx.send(embed = embed)
+
+      @highlight_debug.command(name = 'memory')
+      async def highlight_debug_memory(self, ctx: commands.Context):
+         """Compares the memory used by highlight records with the equivalent dicts, across all guilds."""
+
+         scopes = [
+            scope for snapshot in self.snapshots.values()
+            for scope in [snapshot.guild_highlights, *snapshot.category_highlights.values(), *snapshot.channel_highlights.values()]
+         ]
+         records = {id(hl): hl for scope in scopes for highlights in scope.values() for hl in highlights}
+         compact = deep_sizeof([dict(scope) for scope in scopes])
+         lists = {} # scopes share tuples, so the dict version shares lists the same way
+         as_dicts = deep_sizeof([
+            {member_id: lists.setdefault(id(highlights), [hl.to_dict() for hl in highlights]) for member_id, highlights in scope.items()}
+            for scope in scopes
+         ])
+
+         sample = next(iter(records.values()), None)
+         match_sizes = (
+            (deep_sizeof(MatchResult(sample.text, sample)) - deep_sizeof(sample), deep_sizeof(MatchResult(sample.text, sample).to_dict()))
+            if sample else (0, 0)
+         )
+         embed = discord.Embed(
+            title = 'Memory',
+            description = '\n'.join([
+               f'Highlights: {sum(len(highlights) for scope in scopes for highlights in scope.values())} ({len(records)} unique records)',
+               f'Records: {compact / 1024:.1f} KiB',
+               f'Dicts: {as_dicts / 1024:.1f} KiB',
+               f'Saved: {1 - compact / (as_dicts or 1):.1%}',
+               f'Per match result: {match_sizes[0]}B vs {match_sizes[1]}B as a dict'
+            ]),
+            colour = discord.Colour.green(),
+            timestamp = datetime.datetime.utcnow()
+         )
+         await ctx.send(embed = embed)
+
+      @highlight_debug.command(name = 'queue')
+      async def highlight_debug_queue(self, ctx: commands.Context, policy: Optional[Literal['drop_oldest', 'degrade']] = None):
+         """Shows the message queue metrics, or sets the load shedding policy.
+
+         **Policies:**
+            > `drop_oldest`: Drop the oldest queued message of a guild once its queue is full.
+            > `degrade`: Same as `drop_oldest`, but only match default highlights while a guild's queue is at least half full.
+         """
+         if policy:
+            await self.config.queue.policy.set(policy)
+            self.ingest.policy = policy
+            return await ctx.send(f'Load shedding policy set to `{policy}`.')
+
+         stats = self.ingest.stats.get(ctx.guild.id, {})
+         totals = {key: sum(s[key] for s in self.ingest.stats.values()) for key in ('enqueued', 'processed', 'dropped', 'degraded')}
+         embed = discord.Embed(
+            title = 'Queue',
+            description = '\n'.join([
+               f'Policy: {self.ingest.policy} (size {self.ingest.size}, {len(self.ingest._tasks)} workers)',
+               f'Depth: {self.ingest.guild_depth(ctx.guild.id)} (max {stats.get("max_depth", 0)})',
+               f'Enqueued: {stats.get("enqueued", 0)}',
+               f'Processed: {stats.get("processed", 0)}',
+               f'Dropped: {stats.get("dropped", 0)}',
+               f'Degraded: {stats.get("degraded", 0)}',
+               '',
+               f'Depth (all guilds): {self.ingest.depth}',
+               *[f'{key.title()} (all guilds): {value}' for key, value in totals.items()]
+            ]),
+            colour = discord.Colour.green(),
+            timestamp = datetime.datetime.utcnow()
+         )
+         await ctx.send(embed = embed)
+
+      @highlight_debug.command(name = 'costs')
+      async def highlight_debug_costs(self, ctx: commands.Context, limit: int = 10):
+         """Lists the highlights that used the most CPU time in this guild."""
+
+         top = self.costs.top(ctx.guild.id, limit = limit)
+         if not top:
+            return await ctx.send('No highlights have been matched in this guild yet.')
+
+         lines = []
+         for (_, member_id, text, kind), entry in top:
+            member = ctx.guild.get_member(member_id)
+            lines.append(
+               f'`{text[:40]}` ({getattr(member, "mention", member_id)}) - {entry.cpu * 1000:.1f}ms over {entry.calls} runs'
+               + (f' **[{entry.state}]**' if entry.state != 'ok' else '')
+            )
+         embed = discord.Embed(
+            title = 'Most expensive highlights',
+            description = '\n'.join(lines),
+            colour = discord.Colour.green(),
+            timestamp = datetime.datetime.utcnow()
+         ).set_footer(text = f'Budget: {self.costs.budget}s per {humanize_timedelta(seconds = self.costs.window)}')
+         await ctx.send(embed = embed)
+
+      @highlight_debug.command(name = 'budget')
+      async def highlight_debug_budget(self, ctx: commands.Context, seconds: float):
+         """Sets how much CPU time a highlight may use per window before it gets throttled."""
+
+         await self.config.cost.budget.set(seconds)
+         self.costs.budget = seconds
+         await ctx.send(f'Highlights will now be throttled after using **{seconds}s** of CPU time per {humanize_timedelta(seconds = self.costs.window)}.')
+
+      @highlight_debug.command(name = 'engine')
+      async def highlight_debug_engine(self, ctx: commands.Context, messages: int = 500):
+         """Benchmarks the linear engine against `re` with this guild's regex and wildcard highlights.
+
+         The highlights are run against the bot's cached messages from this guild.
+         """
+
+         snapshot = await self.get_snapshot(ctx.guild)
+         patterns = [highlight_source(text, TYPES[kind]) for text, kind in snapshot.patterns if kind]
+         texts = [m.content for m in self.bot.cached_messages if m.guild == ctx.guild and m.content][-messages:]
+         if not patterns or not texts:
+            return await ctx.send('There are no regex or wildcard highlights, or no cached messages to run them against.')
+
+         linear = sum(isinstance(pattern, LinearPattern) for pattern in snapshot.patterns.values())
+         async with ctx.typing():
+            task = asyncio.get_event_loop().run_in_executor(None, functools.partial(benchmark, patterns, texts))
+            try:
+               results = await asyncio.wait_for(task, timeout = 120)
+            except asyncio.TimeoutError:
+               return await ctx.send('The benchmark took longer than 2 minutes, `re` is probably backtracking on one of the patterns.')
+
+         embed = discord.Embed(
+            title = 'Engine benchmark',
+            description = '\n'.join([
+               f'Patterns: {results["patterns"]} ({results["unsupported"]} need `re`, {linear} compiled as linear)',
+               f'Messages: {len(texts)}',
+               f'`re`: {results["re"] * 1000:.2f}ms',
+               f'Linear: {results["linear"] * 1000:.2f}ms',
+               f'Matches: {results["matches"]} ({results["mismatches"]} disagreements)'
+            ]),
+            colour = discord.Colour.green(),
+            timestamp = datetime.datetime.utcnow()
+         )
+         await ctx.send(embed = embed)
+
       @highlight.command(name = 'logs', enabled = False)
       async def highlight_logs(self, ctx: commands.Context):
          logs = self.get_member_config(ctx.author)['logs']
@@ -399,18 +843,22 @@ class Highlight(HighlightHandler, commands.Cog):
          if rate is None:
             return await ctx.reply(f'Your current cooldown is **{humanize_timedelta(seconds = current)}**.')
          rate = self._check_cooldown(seconds = rate.total_seconds())
-         await self.config.member(ctx.author).cooldown.set(rate)
+         async with self.guild_lock(ctx.guild.id):
+            await self.config.member(ctx.author).cooldown.set(rate)
+            await self.generate_cache()
+            await self.rebuild_snapshot(ctx.guild)
          await ctx.reply(f'Alright, your cooldown is now **{humanize_timedelta(seconds = rate)}**.')
-         await self.generate_cache()
 
       async def _toggle_settings(self, ctx: commands.Context, name: str, yes_or_no: bool):
 
-         async with self.config.member(ctx.author).all() as conf:
-            if yes_or_no == conf[name]:
-               return await ctx.reply(f'This is already {"enabled" if yes_or_no else "disabled"} for you....')
-            conf[name] = yes_or_no
-            await ctx.reply(f'{"Enabled, " + f"you can now recieve highlights from {name}." if yes_or_no else "Disabled."}')
-         await self.generate_cache()
+         async with self.guild_lock(ctx.guild.id):
+            async with self.config.member(ctx.author).all() as conf:
+               if yes_or_no == conf[name]:
+                  return await ctx.reply(f'This is already {"enabled" if yes_or_no else "disabled"} for you....')
+               conf[name] = yes_or_no
+            await self.generate_cache()
+            await self.rebuild_snapshot(ctx.guild)
+         await ctx.reply(f'{"Enabled, " + f"you can now recieve highlights from {name}." if yes_or_no else "Disabled."}')
             
       @highlight_set.command(name = 'bots')
       async def highlight_set_bots(self, ctx: commands.Context, yes_or_no: bool):
@@ -431,7 +879,11 @@ class Highlight(HighlightHandler, commands.Cog):
       async def highlight_set_colour(self, ctx: commands.Context, *, colour: commands.ColourConverter):
          """Sets the default embed colour."""
 
-         await self.config.member(ctx.author).colour.set(colour.value)
+         async with self.guild_lock(ctx.guild.id):
+            await self.config.member(ctx.author).colour.set(colour.value)
+            await self.generate_cache()
+            self.invalidate_member_index(ctx.author)
+            await self.rebuild_snapshot(ctx.guild)
          await ctx.reply('Updated your embed colour.')
 
       @highlight_set.command(name = 'show')
@@ -456,6 +908,35 @@ class Highlight(HighlightHandler, commands.Cog):
          )
          await ctx.reply(embed = embed)
 
+      @highlight_set.command(name = 'privatecategories', aliases = ['privatecategory'])
+      @commands.has_permissions(manage_guild = True)
+      async def highlightset_privatecategories(self, ctx: commands.Context, categories: commands.Greedy[discord.CategoryChannel]):
+           """Toggles categories whose highlights are reported to the alert channel."""
+           async with self.config.guild(ctx.guild).alerts.categories() as current:
+               for category in categories:
+                  if category.id in current:
+                     current.remove(category.id)
+                  else:
+                     current.append(category.id)
+           if not (shown := [category.mention for category in map(ctx.guild.get_channel, current) if category]):
+                return await ctx.reply('No categories are reported.')
+           embed = discord.Embed(
+                  description = '\n'.join(shown),
+                  colour = discord.Colour.green(),
+                  timestamp = datetime.datetime.utcnow()
+               ).set_author(
+                  name = f'{ctx.guild.name}\'s private categories',
+                  icon_url = getattr(ctx.guild.icon, 'url', None)
+               )
+           return await ctx.reply(embed = embed)
+
+      @highlight_set.command(name = 'alertchannel')
+      @commands.has_permissions(manage_guild = True)
+      async def highlightset_alertchannel(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None):
+           """Sets the channel private category highlights are reported to, leave empty to reset it."""
+           await self.config.guild(ctx.guild).alerts.channel.set(getattr(channel, 'id', None))
+           await ctx.reply(f'Private category highlights will be reported to {channel.mention}.' if channel else 'Reset the alert channel.')
+
       @highlight_set.command(name = 'roles')
       @commands.has_permissions(manage_guild = True)
       async def highlightset_roles(self, ctx: commands.Context, roles: commands.Greedy[discord.Role]):
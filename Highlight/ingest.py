@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Set, Tuple
+
+log = logging.getLogger('red.cogs.Highlight')
+
+class IngestQueue:
+    """Bounded per guild message queues, drained round-robin by a fixed number of workers.
+
+    When a guild's queue is full its oldest message is dropped. With the ``degrade`` policy, messages
+    taken while the queue is at least half full are only matched against default highlights.
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable[Any]], size: int = 100, workers: int = 4, policy: str = 'drop_oldest'):
+        self._handler = handler
+        self.size = size
+        self.policy = policy
+        self._queues: Dict[int, Deque[Tuple]] = {}
+        self._scheduled: Set[int] = set()
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        self.stats: Dict[int, Dict[str, int]] = {}
+
+    def __repr__(self) -> str:
+        return f'<IngestQueue size={self.size} workers={len(self._tasks)} policy={self.policy} depth={self.depth}>'
+
+    @property
+    def depth(self) -> int:
+        return sum(map(len, self._queues.values()))
+
+    def guild_depth(self, guild_id: int) -> int:
+        return len(self._queues.get(guild_id, ()))
+
+    def put(self, guild_id: int, *item) -> None:
+        queue = self._queues.setdefault(guild_id, deque())
+        stats = self.stats.setdefault(guild_id, {'enqueued': 0, 'processed': 0, 'dropped': 0, 'degraded': 0, 'max_depth': 0})
+        stats['enqueued'] += 1
+
+        if len(queue) >= self.size:
+            queue.popleft()
+            stats['dropped'] += 1
+        queue.append(item)
+        stats['max_depth'] = max(stats['max_depth'], len(queue))
+
+        if guild_id not in self._scheduled:
+            self._scheduled.add(guild_id)
+            self._ready.put_nowait(guild_id)
+
+    async def _worker(self):
+        while True:
+            guild_id = await self._ready.get()
+            queue, stats = self._queues[guild_id], self.stats[guild_id]
+            if not queue:
+                self._scheduled.discard(guild_id)
+                continue
+
+            item = queue.popleft()
+            degraded = self.policy == 'degrade' and len(queue) >= self.size // 2
+            # put the guild at the back, so one busy guild can't hold every worker.
+            if queue:
+                self._ready.put_nowait(guild_id)
+            else:
+                self._scheduled.discard(guild_id)
+
+            stats['degraded'] += degraded
+            try:
+                await self._handler(*item, degraded = degraded)
+            except Exception as e:
+                log.error('Failed to process a queued message.', exc_info = e)
+            stats['processed'] += 1
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
@@ -22,50 +22,74 @@ class ChannelShowSelect(discord.ui.Select):
             embed = embed
         )
 
-class ChannelShowMenu(discord.ui.View):
-    def __init__(self, ctx: commands.Context, highlight_data, blocks):
-        self._ctx = ctx
+class ChannelShowIndex:
+    """A member's highlights per guild and channel, each page's embed is only rendered the first time it's viewed."""
+
+    def __init__(self, guild: discord.Guild, highlight_data: Dict[int, List[Dict[str, Any]]], blocks: List[int], colour, version: int):
+        self.guild = guild
+        self.version = version
         self._data = highlight_data
         self._blocks = blocks
-        self._objects = {}
+        self._colour = colour
+        self._block_fields = None
+        self._pages: Dict[int, discord.Embed] = {}
+        self.objects: Dict[int, Union[discord.Guild, discord.abc.GuildChannel]] = {}
         for _id, _data in filter(lambda d: d[1], self._data.items()):
-            if guild := self._ctx.bot.get_guild(_id):
-                self._objects[_id] = guild
-            elif channel := self._ctx.bot.get_channel(_id):
-                self._objects[_id] = channel
-
-        super().__init__(timeout = None)
-        self.add_item(ChannelShowSelect(options = [discord.SelectOption(label = obj[1].name, value = obj[1].id) for obj in sorted(self._objects.items(), key = lambda k: getattr(k[1], 'position', 0))]))
-
-    def handle_request(self, selected_option) -> discord.Embed:
+            if _id == guild.id:
+                self.objects[_id] = guild
+            elif channel := guild.get_channel(_id):
+                self.objects[_id] = channel
+
+    def block_fields(self) -> List[Dict[str, Any]]:
+        if self._block_fields is None:
+            users, channels = [], []
+            for _id in self._blocks:
+                if member := self.guild.get_member(_id):
+                    users.append(member.mention)
+                elif channel := self.guild.get_channel(_id):
+                    channels.append(channel.mention)
+            self._block_fields = [
+                {'name': name, 'value': '\n'.join(mentions), 'inline': False}
+                for name, mentions in (('Ignored Users', users), ('Ignored Channels', channels)) if mentions
+            ]
+        return self._block_fields
+
+    def page(self, _id: int) -> discord.Embed:
+        if (embed := self._pages.get(_id)) is not None:
+            return embed
 
         table = tabulate.tabulate(
-            self._data[int(selected_option)], headers = 'keys', tablefmt = 'pretty'
+            self._data[_id], headers = 'keys', tablefmt = 'pretty'
         )
-        obj = self._objects[int(selected_option)]
+        obj = self.objects[_id]
         embed = discord.Embed(
             title = f"Your current highlights in {underline(obj.name)}"[:50],
             description = box(table, lang = "prolog"),
-            colour = self._ctx.cog.member_config.get(self._ctx.guild.id, {}).get(self._ctx.author.id, {}).get('colour', discord.Colour.green())
+            colour = self._colour
         )
-
         if isinstance(obj, discord.Guild):
-            if (user_blocks := [self._ctx.guild.get_member(user).mention for user in self._blocks if self._ctx.guild.get_member(user) != None]):
-                embed.add_field(name = 'Ignored Users', value = '\n'.join(user_blocks), inline = False)
-            
-            if (channel_blocks := [self._ctx.guild.get_channel(channel).mention for channel in self._blocks if self._ctx.guild.get_channel(channel) != None]):
-                embed.add_field(name = 'Ignored Channels', value = '\n'.join(channel_blocks), inline = False)
+            for field in self.block_fields():
+                embed.add_field(**field)
 
+        self._pages[_id] = embed
         return embed
 
+class ChannelShowMenu(discord.ui.View):
+    def __init__(self, ctx: commands.Context, index: ChannelShowIndex):
+        self._ctx = ctx
+        self._index = index
+
+        super().__init__(timeout = None)
+        self.add_item(ChannelShowSelect(options = [discord.SelectOption(label = obj[1].name, value = obj[1].id) for obj in sorted(self._index.objects.items(), key = lambda k: getattr(k[1], 'position', 0))]))
+
+    def handle_request(self, selected_option) -> discord.Embed:
+        return self._index.page(int(selected_option))
+
     async def send(self, start_value = None):
-        embed = self.handle_request(start_value or self._ctx.guild.id)
+        if start_value not in self._index.objects:
+            start_value = self._ctx.guild.id
+        embed = self.handle_request(start_value)
         await self._ctx.send(
             embed = embed,
             view = self
         )
-
-    
-
-
-
@@ -0,0 +1,139 @@
+import re
+
+from typing import Dict, Iterable, List, Optional, Set
+from .records import HighlightRecord
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError: # python < 3.11
+    import sre_parse, sre_constants
+
+LITERAL = sre_constants.LITERAL
+SUBPATTERN = sre_constants.SUBPATTERN
+BRANCH = sre_constants.BRANCH
+REPEATS = tuple(
+    op for op in (
+        sre_constants.MAX_REPEAT,
+        sre_constants.MIN_REPEAT,
+        getattr(sre_constants, 'POSSESSIVE_REPEAT', None)
+    ) if op is not None
+)
+ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+# re.IGNORECASE treats these as equal to ascii letters, casefold doesn't.
+_FOLD_FIXES = str.maketrans({'ı': 'i', '̇': None})
+_WILD_SEPARATORS = re.compile(r'[ _.-]+')
+_WILD_REPEATS = re.compile(r'(.)\1+', re.DOTALL)
+_COMMON = set('etaoinshrdlu ')
+
+def _fold(text: str) -> str:
+    return text.casefold().translate(_FOLD_FIXES)
+
+def _wild(text: str) -> str:
+    """Normalise folded text the same way a wildcard pattern sees it, separators are dropped and repeated characters collapsed."""
+    return _WILD_REPEATS.sub(r'\1', _WILD_SEPARATORS.sub('', text))
+
+def _key(literal: str) -> Optional[str]:
+    """Picks the rarest looking ascii n-gram (n <= 3) of a folded literal, every match of the literal contains it."""
+    for size in (3, 2, 1):
+        grams = [
+            literal[i:i + size] for i in range(len(literal) - size + 1)
+            if literal[i:i + size].isascii()
+        ]
+        if grams:
+            return min(grams, key = lambda g: sum(c in _COMMON for c in g))
+    return None
+
+def _required_keys(parsed) -> Optional[List[str]]:
+    """Walks a parsed regex and returns keys of which at least one is in every match, ``None`` if nothing is required."""
+    best, run = None, []
+
+    def consider(keys: Optional[List[str]]):
+        nonlocal best
+        if not keys or any(k is None for k in keys):
+            return
+        score = (min(map(len, keys)), -len(keys))
+        if best is None or score > (min(map(len, best)), -len(best)):
+            best = keys
+
+    def flush():
+        if run:
+            consider([_key(_fold(''.join(run)))])
+            run.clear()
+
+    for op, av in parsed:
+        if op is LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is SUBPATTERN:
+            consider(_required_keys(av[-1]))
+        elif op in REPEATS:
+            if av[0] >= 1:
+               consider(_required_keys(av[2]))
+        elif ATOMIC_GROUP is not None and op is ATOMIC_GROUP:
+            consider(_required_keys(av))
+        elif op is BRANCH:
+            alternatives = [_required_keys(branch) for branch in av[1]]
+            if all(alternatives):
+               consider([key for keys in alternatives for key in keys])
+    flush()
+    return best
+
+def highlight_keys(text: str, _type: str) -> Optional[List[str]]:
+    """The prefilter keys of a highlight, ``None`` if it can't be prefiltered."""
+    if _type == 'regex':
+        try:
+            return _required_keys(sre_parse.parse(text))
+        except Exception:
+            return None
+    if _type == 'wildcard':
+        text = _wild(_fold(text))
+    else:
+        text = _fold(text)
+    key = _key(text)
+    return [key] if key else None
+
+def _scan(text: str, keys: Dict[int, Set[str]]) -> bool:
+    for size, grams in keys.items():
+        if not grams.isdisjoint(text[i:i + size] for i in range(len(text) - size + 1)):
+            return True
+    return False
+
+class TokenPrefilter:
+    """Guild level set of hashed n-grams, one of which any message that can be highlighted has to contain.
+
+    Default and regex highlights are checked against the folded message, wildcards against the message with
+    separators and repeated characters removed. A highlight without any required literal disables the filter.
+    """
+
+    __slots__ = ('_keys', '_wild_keys', 'passthrough', 'size')
+
+    def __init__(self, highlights: Iterable[HighlightRecord]):
+        self._keys: Dict[int, Set[str]] = {}
+        self._wild_keys: Dict[int, Set[str]] = {}
+        self.passthrough = False
+        self.size = 0
+
+        for highlight in highlights:
+            keys = highlight_keys(highlight.text, highlight.type)
+            if not keys:
+               self.passthrough = True
+               continue
+            target = self._wild_keys if highlight.type == 'wildcard' else self._keys
+            for key in keys:
+                target.setdefault(len(key), set()).add(key)
+        self.size = sum(map(len, self._keys.values())) + sum(map(len, self._wild_keys.values()))
+
+    def __repr__(self) -> str:
+        return f'<TokenPrefilter size={self.size} passthrough={self.passthrough}>'
+
+    def might_match(self, message_check: Dict[str, str]) -> bool:
+        if self.passthrough:
+           return True
+        text = _fold('\n'.join(message_check.values()))
+        if self._keys and _scan(text, self._keys):
+           return True
+        if self._wild_keys and _scan(_wild(text), self._wild_keys):
+           return True
+        return False
@@ -0,0 +1,98 @@
+import sys
+
+from typing import Any, Dict, Iterable, List, Optional
+
+TYPES = ('default', 'regex', 'wildcard')
+SETTINGS = ('bots', 'embeds')
+
+_TYPE_FLAGS = {_type: i for i, _type in enumerate(TYPES)}
+_SETTING_FLAGS = {setting: 1 << i for i, setting in enumerate(SETTINGS)}
+
+class HighlightRecord:
+    """A single highlight, what's stored in config as ``{'highlight', 'type', 'settings'}``.
+
+    The type and settings are kept as small int flags and the text is interned, so
+    identical highlights across members share their string.
+    """
+
+    __slots__ = ('text', 'kind', 'flags')
+
+    def __init__(self, text: str, kind: int = 0, flags: int = 0):
+        self.text = sys.intern(text)
+        self.kind = kind
+        self.flags = flags
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HighlightRecord':
+        flags = 0
+        for setting in data.get('settings', ()):
+            flags |= _SETTING_FLAGS.get(setting, 0)
+        return cls(data['highlight'], _TYPE_FLAGS[data['type']], flags)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'highlight': self.text, 'type': self.type, 'settings': self.settings}
+
+    @property
+    def type(self) -> str:
+        return TYPES[self.kind]
+
+    @property
+    def settings(self) -> List[str]:
+        return [setting for setting, flag in _SETTING_FLAGS.items() if self.flags & flag]
+
+    @property
+    def key(self):
+        return (self.text, self.kind, self.flags)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, HighlightRecord) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f'<HighlightRecord text={self.text!r} type={self.type} settings={self.settings}>'
+
+class MatchResult:
+    """What a highlight matched in a message."""
+
+    __slots__ = ('match', 'highlight')
+
+    def __init__(self, match: str, highlight: HighlightRecord):
+        self.match = match
+        self.highlight = highlight
+
+    @property
+    def type(self) -> str:
+        return self.highlight.type
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'match': self.match, 'highlight': self.highlight.text, 'type': self.highlight.type}
+
+    def __repr__(self) -> str:
+        return f'<MatchResult match={self.match!r} highlight={self.highlight.text!r}>'
+
+def to_records(highlights: Iterable[Dict[str, Any]], pool: Optional[Dict[tuple, HighlightRecord]] = None) -> tuple:
+    """Converts config highlights to records, reusing records from ``pool`` when given."""
+    records = []
+    for data in highlights:
+        record = HighlightRecord.from_dict(data)
+        if pool is not None:
+           record = pool.setdefault(record.key, record)
+        records.append(record)
+    return tuple(records)
+
+def deep_sizeof(obj, seen = None) -> int:
+    """Deep ``sys.getsizeof``, objects referenced more than once are counted once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if hasattr(obj, 'items'):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(type(obj), '__slots__'):
+        size += sum(deep_sizeof(getattr(obj, slot), seen) for slot in type(obj).__slots__ if hasattr(obj, slot))
+    return size
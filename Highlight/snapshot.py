@@ -0,0 +1,164 @@
+import re
+import time
+
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union
+from .engine import LinearPattern, Unsupported
+from .prefilter import TokenPrefilter
+from .records import HighlightRecord, deep_sizeof, to_records
+
+# guilds with more highlights than this are compiled in a thread.
+LARGE_GUILD = 2000
+
+def highlight_source(text: str, _type: str) -> Tuple[str, int]:
+    if _type == 'regex':
+        return text, 0
+    if _type == 'wildcard':
+        return ''.join([f'{re.escape(char)}[ _.{re.escape(char)}-]*' for char in text]), re.IGNORECASE
+    return rf'\b{re.escape(text)}\b', re.IGNORECASE
+
+def compile_highlight(text: str, _type: str) -> Union[re.Pattern, LinearPattern]:
+    """Regexes and wildcards use the linear engine when they can, only the rest need to run in an executor."""
+    source, flags = highlight_source(text, _type)
+    if _type != 'default':
+        try:
+            return LinearPattern(source, flags)
+        except Unsupported:
+            pass
+    return re.compile(source, flags)
+
+def _merge(base: Mapping[int, Tuple[HighlightRecord, ...]], data: Dict[str, List[dict]], pool: Dict[tuple, HighlightRecord]) -> Dict[int, Tuple[HighlightRecord, ...]]:
+    """Adds a scope's highlights to ``base``, skipping any a member already has with the same text and type."""
+    merged = dict(base)
+    for member_id, highlights in data.items():
+        if not highlights:
+            continue
+        current = merged.get(int(member_id), ())
+        seen = {(record.text, record.kind) for record in current}
+        added = []
+        for record in to_records(highlights, pool):
+            if (record.text, record.kind) not in seen:
+                seen.add((record.text, record.kind))
+                added.append(record)
+        merged[int(member_id)] = current + tuple(added)
+    return merged
+
+class GuildSnapshot:
+    """Compiled, read-only matching state of a guild.
+
+    A new snapshot is built whenever highlights or member settings change and swapped in
+    by replacing the guild's entry, so a message keeps the snapshot it started with.
+    """
+
+    __slots__ = (
+        'guild_id', 'version', 'guild_highlights', 'category_highlights', 'channel_highlights', 'member_scopes', 'patterns',
+        'prefilter', 'member_configs', 'blocks', 'blocked_by', 'default_member', 'highlight_count', 'size',
+        'built_at', 'build_time'
+    )
+
+    def __init__(self, **kwargs):
+        for key in self.__slots__:
+            object.__setattr__(self, key, kwargs[key])
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f'<GuildSnapshot guild_id={self.guild_id} version={self.version} highlights={self.highlight_count} patterns={len(self.patterns)}>'
+
+    @classmethod
+    def build(
+        cls,
+        guild_id: int,
+        version: int,
+        guild_highlights: Dict[str, List[dict]],
+        channel_highlights: Dict[int, Dict[str, List[dict]]],
+        member_configs: Dict[int, dict],
+        default_member: dict,
+        category_highlights: Optional[Dict[int, Dict[str, List[dict]]]] = None,
+        parents: Optional[Dict[int, int]] = None
+    ) -> 'GuildSnapshot':
+        """Builds a snapshot from raw config data. Does no IO, so it can be run in a thread.
+
+        ``parents`` maps channels to their category, a channel's highlights are merged on top of
+        its category's, which are merged on top of the guild's.
+        """
+        start = time.perf_counter()
+        category_highlights, parents = category_highlights or {}, parents or {}
+
+        pool: Dict[tuple, HighlightRecord] = {}
+        guild_frozen = {int(member_id): to_records(data, pool) for member_id, data in guild_highlights.items() if data}
+        # reverse index, what each member has in every scope (the guild's id being guild highlights), unmerged.
+        member_scopes: Dict[int, Dict[int, Tuple[HighlightRecord, ...]]] = {}
+        for scope_id, data in [(guild_id, guild_highlights), *category_highlights.items(), *channel_highlights.items()]:
+            for member_id, highlights in data.items():
+                if highlights:
+                   member_scopes.setdefault(int(member_id), {})[scope_id] = to_records(highlights, pool)
+
+        categories = {
+            category_id: MappingProxyType(_merge(guild_frozen, data, pool))
+            for category_id, data in category_highlights.items()
+        }
+        channels = {
+            channel_id: MappingProxyType(_merge(categories.get(parents.get(channel_id), guild_frozen), data, pool))
+            for channel_id, data in channel_highlights.items()
+        }
+
+        patterns, every_highlight = {}, []
+        for record in pool.values():
+            key = (record.text, record.kind)
+            if key in patterns:
+               continue
+            try:
+                patterns[key] = compile_highlight(record.text, record.type)
+            except re.error:
+                continue
+            every_highlight.append(record)
+
+        member_configs = {member_id: MappingProxyType(dict(config)) for member_id, config in member_configs.items()}
+        blocks = {member_id: frozenset(config.get('blocks', [])) for member_id, config in member_configs.items()}
+        blocked_by: Dict[int, set] = {}
+        for member_id, blocked in blocks.items():
+            for _id in blocked:
+                blocked_by.setdefault(_id, set()).add(member_id)
+        return cls(
+            guild_id = guild_id,
+            version = version,
+            guild_highlights = MappingProxyType(guild_frozen),
+            category_highlights = MappingProxyType(categories),
+            channel_highlights = MappingProxyType(channels),
+            member_scopes = MappingProxyType({member_id: MappingProxyType(scopes) for member_id, scopes in member_scopes.items()}),
+            patterns = MappingProxyType(patterns),
+            prefilter = TokenPrefilter(every_highlight),
+            member_configs = MappingProxyType(member_configs),
+            blocks = MappingProxyType(blocks),
+            blocked_by = MappingProxyType({_id: frozenset(members) for _id, members in blocked_by.items()}),
+            default_member = MappingProxyType(dict(default_member)),
+            highlight_count = sum(
+                len(data) for highlights in [guild_highlights, *category_highlights.values(), *channel_highlights.values()]
+                for data in highlights.values()
+            ),
+            size = deep_sizeof([guild_frozen, categories, channels, member_scopes, member_configs]),
+            built_at = time.time(),
+            build_time = time.perf_counter() - start
+        )
+
+    def highlights_for(self, channel_id: int, category_id: Optional[int] = None) -> Mapping[int, Tuple[HighlightRecord, ...]]:
+        if (highlights := self.channel_highlights.get(channel_id)) is not None:
+            return highlights
+        return self.category_highlights.get(category_id, self.guild_highlights)
+
+    def pattern(self, highlight: HighlightRecord) -> Union[re.Pattern, LinearPattern]:
+        try:
+            return self.patterns[(highlight.text, highlight.kind)]
+        except KeyError:
+            return compile_highlight(highlight.text, highlight.type)
+
+    def member_config(self, member_id: int) -> Mapping[str, Any]:
+        return self.member_configs.get(member_id, self.default_member)
+
+    def member_blocks(self, member_id: int) -> FrozenSet[int]:
+        return self.blocks.get(member_id, frozenset())
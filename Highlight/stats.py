@@ -0,0 +1,68 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+REASONS = ('cooldown', 'last_seen', 'permissions', 'blocked', 'dm_failed')
+
+class HighlightStats:
+    """In-memory counters of what highlights match, notify and why members weren't notified.
+
+    Counting is a couple of dict updates per member, the counters are drained into config
+    periodically and merged with what's already stored there.
+    """
+
+    def __init__(self):
+        self._highlights: Dict[Tuple[int, int, str], List[int]] = {} # (guild_id, member_id, text) -> [matches, notified]
+        self._suppressed: Dict[Tuple[int, int, str], int] = {} # (guild_id, member_id, reason) -> count
+
+    def __len__(self) -> int:
+        return len(self._highlights) + len(self._suppressed)
+
+    def matched(self, guild_id: int, member_id: int, texts: Iterable[str]):
+        for text in texts:
+            self._highlights.setdefault((guild_id, member_id, text), [0, 0])[0] += 1
+
+    def notified(self, guild_id: int, member_id: int, texts: Iterable[str]):
+        for text in texts:
+            self._highlights.setdefault((guild_id, member_id, text), [0, 0])[1] += 1
+
+    def suppressed(self, guild_id: int, member_id: int, reason: str):
+        key = (guild_id, member_id, reason)
+        self._suppressed[key] = self._suppressed.get(key, 0) + 1
+
+    def forget(self, guild_id: int, member_id: int):
+        for counters in (self._highlights, self._suppressed):
+            for key in [key for key in counters if key[:2] == (guild_id, member_id)]:
+                del counters[key]
+
+    def pending(self, guild_id: int, member_id: int) -> Dict[str, Any]:
+        """The counters of a member that haven't been drained yet, in the stored format."""
+        return self._aggregate(guild_id, member_id).get(guild_id, {}).get(str(member_id), {})
+
+    def drain(self) -> Dict[int, Dict[str, Dict[str, Any]]]:
+        """Empties the counters, returning them as ``{guild_id: {member_id: stats}}``."""
+        data = self._aggregate()
+        self._highlights, self._suppressed = {}, {}
+        return data
+
+    def _aggregate(self, guild_id: int = None, member_id: int = None) -> Dict[int, Dict[str, Dict[str, Any]]]:
+        data = {}
+        for (g, m, text), (matches, notified) in self._highlights.items():
+            if guild_id in (None, g) and member_id in (None, m):
+                data.setdefault(g, {}).setdefault(str(m), _empty())['highlights'][text] = {'matches': matches, 'notified': notified}
+        for (g, m, reason), count in self._suppressed.items():
+            if guild_id in (None, g) and member_id in (None, m):
+                data.setdefault(g, {}).setdefault(str(m), _empty())['suppressed'][reason] = count
+        return data
+
+def _empty() -> Dict[str, Any]:
+    return {'highlights': {}, 'suppressed': {}}
+
+def merge_stats(stored: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the counters of ``delta`` to ``stored`` in place, both being a single member's stats."""
+    for text, counts in delta.get('highlights', {}).items():
+        current = stored.setdefault('highlights', {}).setdefault(text, {'matches': 0, 'notified': 0})
+        for key, value in counts.items():
+            current[key] = current.get(key, 0) + value
+    for reason, count in delta.get('suppressed', {}).items():
+        suppressed = stored.setdefault('suppressed', {})
+        suppressed[reason] = suppressed.get(reason, 0) + count
+    return stored
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import operator
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+import psutil
+from redbot.core import Config
+from redbot.core.utils.chat_formatting import humanize_timedelta
+
+from .probes import ProbeRunner, ProbeTimeout
+from .sampler import Sample
+from .vexutils import get_vex_logger
+from .vexutils.chat import humanize_bytes
+
+if TYPE_CHECKING:
+    from redbot.core.bot import Red
+
+log = get_vex_logger(__name__)
+
+# metric: (description, how to get it from a sample)
+ALERT_METRICS: dict[str, tuple[str, Callable[[Sample], float]]] = {
+    "cpu": ("CPU usage (%)", lambda s: sum(s.cpu_percent) / len(s.cpu_percent)),
+    "mem": ("Physical memory used (%)", lambda s: s.mem.percent),
+    "swap": ("SWAP memory used (%)", lambda s: s.swap.percent),
+    "red_cpu": ("Red's CPU usage (%)", lambda s: s.red_cpu),
+    "red_mem": ("Red's physical memory (bytes)", lambda s: s.red_mem),
+}
+BYTES_METRICS = ("red_mem",)
+OPERATORS = {">": operator.gt, "<": operator.lt}
+UNITS = {"B": 1, "KB": 10**3, "MB": 10**6, "GB": 10**9, "TB": 10**12}
+HYSTERESIS = 0.05  # a rule clears once the value is this fraction of the threshold back
+DISK_TTL = 60.0
+
+_THRESHOLD = re.compile(r"^([\d.]+)\s*(%|[KMGT]?B)?$", re.IGNORECASE)
+
+
+def parse_metric(metric: str) -> str:
+    """Normalise a metric name, ``disk`` or ``disk:<mount point>`` for disks.
+
+    Raises
+    ------
+    ValueError
+        If it's not a metric.
+    """
+    lowered = metric.lower()
+    if lowered in ALERT_METRICS:
+        return lowered
+    if lowered == "disk":
+        return "disk:" + os.path.abspath(os.sep)
+    if lowered.startswith("disk:") and len(metric) > 5:  # mount points are case sensitive
+        return "disk:" + metric[5:]
+    raise ValueError(metric)
+
+
+def parse_threshold(text: str) -> float:
+    """Parse a threshold like ``90``, ``90%`` or ``2GB`` (1GB = 1000MB, like everywhere else).
+
+    Raises
+    ------
+    ValueError
+        If it's not a number, optionally with a unit.
+    """
+    match = _THRESHOLD.match(text.strip())
+    if match is None:
+        raise ValueError(text)
+    unit = (match.group(2) or "").upper()
+    return float(match.group(1)) * UNITS.get(unit, 1)
+
+
+def format_value(metric: str, value: float) -> str:
+    if metric in BYTES_METRICS:
+        return humanize_bytes(value, 1)
+    return f"{round(value, 1)} %"
+
+
+def describe(rule: dict[str, Any]) -> str:
+    text = f"{rule['metric']} {rule['op']} {format_value(rule['metric'], rule['threshold'])}"
+    if rule["duration"]:
+        text += f" for {humanize_timedelta(seconds=rule['duration'])}"
+    return text
+
+
+class RuleState:
+    __slots__ = ("breached_since", "firing", "last_alert")
+
+    def __init__(self) -> None:
+        self.breached_since: Optional[float] = None
+        self.firing = False
+        self.last_alert: Optional[float] = None
+
+
+class AlertManager:
+    """Evaluate alert rules against each new sample.
+
+    A rule fires once its threshold has been crossed for its whole duration, and clears once
+    the value is back past the threshold by ``HYSTERESIS``. It can't fire again within
+    ``cooldown`` seconds of last firing. Disk usage isn't part of a sample, so it's read for the
+    mount points rules use at most every ``DISK_TTL`` seconds.
+    """
+
+    def __init__(self, bot: Red, config: Config, probes: ProbeRunner) -> None:
+        self.bot = bot
+        self.config = config
+        self.probes = probes
+        self.rules: dict[str, dict[str, Any]] = {}
+        self.states: dict[str, RuleState] = {}
+
+        self._disks: dict[str, tuple[float, float]] = {}  # mount: (monotonic time, percent)
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self) -> None:
+        self.set_rules(await self.config.alert_rules())
+
+    def set_rules(self, rules: dict[str, dict[str, Any]]) -> None:
+        """Replace the rules, keeping the state of rules that are still there."""
+        self.rules = rules
+        self.states = {rule_id: self.states.get(rule_id) or RuleState() for rule_id in rules}
+
+    def add(self, sample: Sample) -> None:
+        """Sampler listener. Skipped if the last evaluation is still waiting on a disk."""
+        if self.rules and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.evaluate(sample))
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def _value(self, metric: str, sample: Sample) -> Optional[float]:
+        if metric in ALERT_METRICS:
+            return ALERT_METRICS[metric][1](sample)
+
+        mount = metric[5:]
+        cached = self._disks.get(mount)
+        if cached is not None and time.monotonic() - cached[0] < DISK_TTL:
+            return cached[1]
+        try:
+            usage = await self.probes.run(psutil.disk_usage, mount, key=mount, pool="disk")
+        except (ProbeTimeout, OSError):
+            return None
+        self._disks[mount] = (time.monotonic(), usage.percent)
+        return usage.percent
+
+    async def evaluate(self, sample: Sample) -> None:
+        now = time.monotonic()
+        cooldown = await self.config.alert_cooldown()
+        for rule_id, rule in list(self.rules.items()):
+            state = self.states.get(rule_id)
+            value = await self._value(rule["metric"], sample)
+            if state is None or value is None:
+                continue
+
+            breached = OPERATORS[rule["op"]]
+            threshold = rule["threshold"]
+            if state.firing:
+                # must go back past the threshold by a margin to clear, so it doesn't flap
+                margin = threshold * HYSTERESIS
+                clear = threshold - margin if rule["op"] == ">" else threshold + margin
+                if value < clear if rule["op"] == ">" else value > clear:
+                    state.firing = False
+                    state.breached_since = None
+                    await self.send("\N{WHITE HEAVY CHECK MARK} Resolved", rule, value)
+                continue
+
+            if not breached(value, threshold):
+                state.breached_since = None
+                continue
+            if state.breached_since is None:
+                state.breached_since = now
+            if now - state.breached_since < rule["duration"]:
+                continue
+            # still over once the cooldown's up, it fires then
+            if state.last_alert is not None and now - state.last_alert < cooldown:
+                continue
+
+            state.firing = True
+            state.last_alert = now
+            await self.send("\N{WARNING SIGN}\N{VARIATION SELECTOR-16} Alert", rule, value)
+
+    async def send(self, title: str, rule: dict[str, Any], value: float) -> None:
+        content = f"{title}: `{describe(rule)}`\nIt's now {format_value(rule['metric'], value)}."
+        channel_id = await self.config.alert_channel()
+        channel = self.bot.get_channel(channel_id) if channel_id else None
+        try:
+            if channel is not None:
+                await channel.send(content)
+            else:
+                await self.bot.send_to_owners(content)
+        except Exception as e:
+            log.warning("Unable to send a system alert.", exc_info=e)
@@ -2,14 +2,21 @@ from __future__ import annotations
 
 import asyncio
 import datetime
-from typing import TypedDict
+import heapq
+import os
+import time
+from collections import Counter
+from typing import NamedTuple, TypedDict
 
 import psutil
-from redbot.core.utils import AsyncIter
 from redbot.core.utils.chat_formatting import box as cf_box
 from redbot.core.utils.chat_formatting import humanize_number, humanize_timedelta, pagify
 from tabulate import tabulate
 
+from .loopmon import BUCKETS, LoopMonitor
+from .probes import ProbeRunner, ProbeTimeout
+from .rates import RateTracker
+from .sampler import Sample
 from .vexutils.chat import humanize_bytes
 
 
@@ -31,17 +38,12 @@ def _hum(num: int | float) -> str:
     return humanize_number(round(num))
 
 
-async def get_cpu() -> dict[str, str]:
-    """Get CPU metrics"""
-    psutil.cpu_percent()
-    await asyncio.sleep(1)
-    percent = psutil.cpu_percent(percpu=True)
-    time = psutil.cpu_times()
-    try:
-        freq = psutil.cpu_freq(percpu=True)
-    except NotImplementedError:  # happens on WSL
-        freq = []
-    cores = psutil.cpu_count()
+def get_cpu(sample: Sample) -> dict[str, str]:
+    """Get CPU metrics from a sample"""
+    percent = sample.cpu_percent
+    time = sample.cpu_times
+    freq = sample.cpu_freq
+    cores = len(percent)
 
     # freq could be [] because of WSL totally failing, and some other systems seem to give no
     # frequency data at all.
@@ -69,6 +71,11 @@ async def get_cpu() -> dict[str, str]:
     if not do_frequ:
         data["freq"] = "Not available"
 
+    limits = sample.limits
+    if limits is not None and limits.cpus is not None:
+        used = "..." if limits.cpu_percent is None else f"{limits.cpu_percent} %"
+        data["percent"] += f"[Limit]  {used} of {limits.cpus:g} cores\n"
+
     data["time"] += f"[Idle]   {_hum(time.idle)} seconds\n"
     data["time"] += f"[User]   {_hum(time.user)} seconds\n"
     data["time"] += f"[System] {_hum(time.system)} seconds\n"
@@ -77,10 +84,10 @@ async def get_cpu() -> dict[str, str]:
     return data
 
 
-def get_mem() -> dict[str, str]:
-    """Get memory metrics"""
-    physical = psutil.virtual_memory()
-    swap = psutil.swap_memory()
+def get_mem(sample: Sample) -> dict[str, str]:
+    """Get memory metrics from a sample, physical memory is against the cgroup limit if any"""
+    physical = sample.mem
+    swap = sample.swap
 
     data = {"physical": "", "swap": ""}
 
@@ -144,24 +151,34 @@ class PartitionData(TypedDict):
     usage: psutil._common.sdiskusage
 
 
-def get_disk() -> dict[str, str]:
-    """Get disk info"""
-    partitions = psutil.disk_partitions()
+async def get_disk(probes: ProbeRunner) -> dict[str, str]:
+    """Get disk info. Partitions that don't respond in time are shown as unresponsive."""
+    partitions: list[psutil._common.sdiskpart] = await probes.run(psutil.disk_partitions)
     partition_data: dict[str, PartitionData] = {}
+    unresponsive: list[psutil._common.sdiskpart] = []
     # that type hint was a waste of time...
 
-    for partition in partitions:
+    async def usage(partition: psutil._common.sdiskpart) -> None:
         try:
             partition_data[partition.device] = {
                 "part": partition,
-                "usage": psutil.disk_usage(partition.mountpoint),
+                "usage": await probes.run(
+                    psutil.disk_usage, partition.mountpoint, key=partition.mountpoint, pool="disk"
+                ),
             }
+        except ProbeTimeout:
+            unresponsive.append(partition)
         except Exception:
-            continue
+            pass
+
+    await asyncio.gather(*(usage(partition) for partition in partitions))
 
     data = {}
 
-    for k, v in partition_data.items():
+    for partition in partitions:
+        if not (v := partition_data.get(partition.device)):
+            continue
+        k = partition.device
         total_avaliable = (
             f"{humanize_bytes(v['usage'].total)}"
             if v["usage"].total > 1073741824
@@ -172,19 +189,48 @@ def get_disk() -> dict[str, str]:
         data[f"`{k}`"] += f"[Filesystem]  {v['part'].fstype}\n"
         data[f"`{k}`"] += f"[Mount point] {v['part'].mountpoint}\n"
 
+    for partition in unresponsive:
+        data[f"`{partition.device}`"] = "[Usage]       Unresponsive, skipped\n"
+        data[f"`{partition.device}`"] += f"[Filesystem]  {partition.fstype}\n"
+        data[f"`{partition.device}`"] += f"[Mount point] {partition.mountpoint}\n"
+
     return data
 
 
-async def get_proc() -> dict[str, str]:
-    """Get process info"""
-    processes = psutil.process_iter(["status", "username"])
+class ProcessCensus(NamedTuple):
+    time: float
+    status: dict[str, int]
+    top_cpu: list[tuple[str, float, int]]  # name, cpu %, rss
+    top_mem: list[tuple[str, float, int]]
+
+
+def scan_processes(top: int = 5) -> ProcessCensus:
+    """Count process statuses and find the top processes by CPU and RSS in a single pass.
+
+    This is blocking and can take a while (v slow on windows), so run it in a thread.
+    CPU usage is since the last scan, so it's 0 for processes not seen by a previous one.
+    """
     status = {"sleeping": 0, "idle": 0, "running": 0, "stopped": 0}
+    usage: list[tuple[str, float, int]] = []
+
+    for process in psutil.process_iter(["status", "name", "cpu_percent", "memory_info"]):
+        info = process.info
+        if info["status"] in status:
+            status[info["status"]] += 1
+        rss = info["memory_info"].rss if info["memory_info"] else 0
+        usage.append((info["name"] or str(process.pid), info["cpu_percent"] or 0.0, rss))
+
+    return ProcessCensus(
+        time=time.time(),
+        status=status,
+        top_cpu=heapq.nlargest(top, usage, key=lambda p: p[1]),
+        top_mem=heapq.nlargest(top, usage, key=lambda p: p[2]),
+    )
 
-    async for process in AsyncIter(processes):  # v slow on windows
-        try:
-            status[process.info["status"]] += 1
-        except KeyError:
-            continue
+
+def get_proc(census: ProcessCensus) -> dict[str, str]:
+    """Get process info from a census"""
+    status = census.status
 
     sleeping = status["sleeping"]
     idle = status["idle"]
@@ -204,12 +250,20 @@ async def get_proc() -> dict[str, str]:
         else:
             data["statuses"] += f"[Total]    {total}\n"
 
+    data["top_cpu"] = tabulate(
+        [[f"[{name[:16]}]", f"{cpu} %"] for name, cpu, _ in census.top_cpu], tablefmt="plain"
+    )
+    data["top_mem"] = tabulate(
+        [[f"[{name[:16]}]", humanize_bytes(rss, 1)] for name, _, rss in census.top_mem],
+        tablefmt="plain",
+    )
+
     return data
 
 
-def get_net() -> dict[str, str]:
-    """Get network stats. May have reset from zero at some point."""
-    net = psutil.net_io_counters()
+def get_net(sample: Sample) -> dict[str, str]:
+    """Get network stats from a sample. May have reset from zero at some point."""
+    net = sample.net
 
     data = {"counters": ""}
     data["counters"] += f"[Bytes sent]   {humanize_bytes(net.bytes_sent)}\n"
@@ -220,6 +274,43 @@ def get_net() -> dict[str, str]:
     return data
 
 
+def _rate_table(tracker: RateTracker, device: str, labels: dict[str, str], avg: str) -> str:
+    current, average = tracker.current[device], tracker.average(device)
+
+    def fmt(field: str, value: float) -> str:
+        if field.endswith("_bytes") or field.startswith("bytes_"):
+            return humanize_bytes(value, 1) + "/s"
+        return f"{round(value, 1)}/s"
+
+    rows = [
+        [f"[{label}]", fmt(field, current[field]), fmt(field, average[field])]
+        for field, label in labels.items()
+    ]
+    return tabulate(rows, headers=["", "Now", avg], tablefmt="plain")
+
+
+def get_net_rates(tracker: RateTracker, avg: str, count: int = 6) -> dict[str, str]:
+    """Get the current and average throughput of the busiest network interfaces"""
+    labels = {
+        "bytes_sent": "Sent",
+        "bytes_recv": "Recv",
+        "packets_sent": "Packets out",
+        "packets_recv": "Packets in",
+    }
+    return {nic: _rate_table(tracker, nic, labels, avg) for nic in tracker.busiest(count)}
+
+
+def get_disk_io(tracker: RateTracker, avg: str, count: int = 6) -> dict[str, str]:
+    """Get the current and average throughput and IOPS of the busiest disks"""
+    labels = {
+        "read_bytes": "Read",
+        "write_bytes": "Write",
+        "read_count": "Read IOPS",
+        "write_count": "Write IOPS",
+    }
+    return {disk: _rate_table(tracker, disk, labels, avg) for disk in tracker.busiest(count)}
+
+
 def get_uptime() -> dict[str, str]:
     """Get uptime info"""
     boot_time = datetime.datetime.fromtimestamp(psutil.boot_time())
@@ -237,33 +328,57 @@ def get_uptime() -> dict[str, str]:
     return data
 
 
-async def get_red() -> dict[str, str]:
-    """Get info for Red's process."""
-    p = psutil.Process()
+def get_red(sample: Sample) -> dict[str, str]:
+    """Get info for Red's process from a sample."""
+    data = {"red": ""}
 
-    p.cpu_percent()
-    await asyncio.sleep(1)
+    data["red"] += f"[Process ID]   {os.getpid()}\n"
+    data["red"] += f"[CPU Usage]    {sample.red_cpu} %\n"
+    data["red"] += f"[Physical mem] {round(sample.red_mem_pc, 2)} %\n"
+    data["red"] += f"               {humanize_bytes(sample.red_mem, 1)}\n"
+    if psutil.LINUX:
+        data["red"] += f"[SWAP mem]     {round(sample.red_swap_pc, 2)} %\n"
+        data["red"] += f"               {humanize_bytes(sample.red_swap, 1)}\n"
 
-    with p.oneshot():
-        cpu = p.cpu_percent()
-        phys_mem_pc = p.memory_percent("rss")
-        phys_mem = p.memory_info().rss
+    return data
 
-        if psutil.LINUX:
-            swap_mem_pc = p.memory_percent("swap")
-            swap_mem = p.memory_full_info().swap
-        else:
-            swap_mem_pc = 0
-            swap_mem = 0
 
-    data = {"red": ""}
+def get_loop(monitor: LoopMonitor) -> dict[str, str]:
+    """Get event loop lag and task metrics"""
 
-    data["red"] += f"[Process ID]   {p.pid}\n"
-    data["red"] += f"[CPU Usage]    {cpu} %\n"
-    data["red"] += f"[Physical mem] {round(phys_mem_pc, 2)} %\n"
-    data["red"] += f"               {humanize_bytes(phys_mem, 1)}\n"
-    if psutil.LINUX:
-        data["red"] += f"[SWAP mem]     {round(swap_mem_pc, 2)} %\n"
-        data["red"] += f"               {humanize_bytes(swap_mem, 1)}\n"
+    def ms(seconds: float) -> str:
+        return f"{round(seconds * 1000, 1)} ms"
+
+    data = {"lag": "", "histogram": "", "tasks": "", "blocking": ""}
+
+    recent = monitor.recent
+    if recent:
+        data["lag"] += f"[Latest]  {ms(recent[-1])}\n"
+        data["lag"] += f"[Average] {ms(sum(recent) / len(recent))}\n"
+        data["lag"] += f"[p50]     {ms(monitor.percentile(50))}\n"
+        data["lag"] += f"[p95]     {ms(monitor.percentile(95))}\n"
+        data["lag"] += f"[Maximum] {ms(max(recent))}\n"
+    else:
+        data["lag"] = "No readings yet"
+
+    total = sum(monitor.histogram) or 1
+    h_data = []
+    for i, count in enumerate(monitor.histogram):
+        bound = f"<= {BUCKETS[i]} ms" if i < len(BUCKETS) else f"> {BUCKETS[-1]} ms"
+        h_data.append([f"[{bound}]", count, "#" * round(count / total * 20)])
+    data["histogram"] = tabulate(h_data, tablefmt="plain")
+
+    if monitor.task_total:
+        t_data = [
+            [f"[{owner or 'Other'}]", name[:30], round(count / monitor.task_total, 1)]
+            for (name, owner), count in monitor.tasks.most_common(15)
+        ]
+        data["tasks"] = tabulate(t_data, headers=["Cog", "Coroutine", "Avg"], tablefmt="plain")
+    else:
+        data["tasks"] = "No samples yet"
+
+    blocking = Counter(dict(monitor.blocking))  # the watchdog thread could add to it meanwhile
+    b_data = [[f"[{cog}]", func[:30], count] for (cog, func), count in blocking.most_common(10)]
+    data["blocking"] = tabulate(b_data, tablefmt="plain") or "Nothing has blocked the loop"
 
     return data
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
+
+import discord
+
+from ..vexutils import get_vex_logger
+
+if TYPE_CHECKING:
+    from ..sampler import Sample
+    from ..system import System
+
+log = get_vex_logger(__name__)
+
+MAX_INTERVAL = 120.0
+SLOW_EDIT = 1.0  # an edit taking longer than this probably waited on a rate limit
+
+
+class LiveView(discord.ui.View):
+    """Keep editing one dashboard message with the latest sample.
+
+    The message is only edited when the rendered fields change. The interval doubles when an edit
+    is rate limited, then eases back down to the one asked for.
+    """
+
+    def __init__(
+        self,
+        author: discord.User | discord.Member,
+        cog: System,
+        interval: float,
+        timeout: float = 600,
+    ):
+        super().__init__(timeout=timeout)
+
+        self.author = author
+        self.cog = cog
+        self.base_interval = interval
+        self.interval = interval
+        self.message: Optional[discord.Message] = None
+
+        self._last_hash: Optional[int] = None
+        self._tick = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, message: discord.Message) -> None:
+        self.message = message
+        self.cog.live_views.add(self)
+        self.cog.sampler.listeners.append(self._on_sample)
+        self._task = asyncio.create_task(self._run())
+
+    def close(self) -> None:
+        """Stop updating, without touching the message."""
+        if self._task:
+            self._task.cancel()
+        if self._on_sample in self.cog.sampler.listeners:
+            self.cog.sampler.listeners.remove(self._on_sample)
+        self.cog.live_views.discard(self)
+        self.stop()
+
+    def _on_sample(self, sample: Sample) -> None:
+        self._tick.set()
+
+    async def _run(self) -> None:
+        assert self.message is not None
+        next_edit = 0.0
+        while True:
+            await self._tick.wait()
+            self._tick.clear()
+            if time.monotonic() < next_edit:
+                continue
+
+            try:
+                embed = await self.cog.prep_live_msg(self.message.channel, self.interval)
+                # the footer has uptimes in, which change every time
+                key = hash(tuple((f.name, f.value) for f in embed.fields))
+                if key == self._last_hash:
+                    continue
+
+                start = time.monotonic()
+                await self.message.edit(embed=embed)
+                if time.monotonic() - start > SLOW_EDIT:
+                    self.interval = min(self.interval * 2, MAX_INTERVAL)
+                else:
+                    self.interval = max(self.interval * 0.75, self.base_interval)
+                self._last_hash = key
+            except discord.NotFound:  # message deleted
+                self.close()
+                return
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    log.warning("Failed to edit a live dashboard.", exc_info=e)
+                self.interval = min(self.interval * 2, MAX_INTERVAL)
+            except Exception as e:
+                log.exception("Something went wrong updating a live dashboard.", exc_info=e)
+                self.close()
+                return
+
+            next_edit = time.monotonic() + self.interval
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user != self.author:
+            await interaction.response.send_message(
+                "You are not authorized to interact with this.", ephemeral=True
+            )
+            return False
+        return True
+
+    async def on_timeout(self) -> None:
+        self.close()
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(label="Stop", style=discord.ButtonStyle.red)
+    async def stop_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.close()
+        await interaction.response.edit_message(view=None)
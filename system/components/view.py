@@ -14,10 +14,12 @@ FRIENDLY_NAMES = {
     "sensors": "Sensors",
     "users": "Users",
     "disk": "Disk",
+    "diskio": "Disk IO",
     "proc": "Processes",
     "net": "Network",
     "uptime": "Uptime",
     "red": "Red",
+    "loop": "Event loop",
     "all": "All",
 }
 
@@ -49,10 +51,12 @@ class SystemView(discord.ui.View):
             "sensors": cog.prep_sensors_msg,
             "users": cog.prep_users_msg,
             "disk": cog.prep_disk_msg,
+            "diskio": cog.prep_diskio_msg,
             "proc": cog.prep_proc_msg,
             "net": cog.prep_net_msg,
             "uptime": cog.prep_uptime_msg,
             "red": cog.prep_red_msg,
+            "loop": cog.prep_loop_msg,
             "all": cog.prep_all_msg,
         }
 
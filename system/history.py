@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import os
+from typing import Optional
+
+import pandas
+import psutil
+from redbot.core.bot import Red
+
+from .probes import ProbeRunner, ProbeTimeout
+from .sampler import Sample
+from .vexutils import get_vex_logger
+from .vexutils.loop import VexLoop
+from .vexutils.sqldriver import PandasSQLiteDriver
+
+log = get_vex_logger(__name__)
+
+METRICS = {
+    "cpu": "CPU usage (%)",
+    "mem": "Physical memory used (%)",
+    "swap": "SWAP memory used (%)",
+    "disk": "Disk space used on the root partition (%)",
+    "net_sent": "Network sent (bytes/s)",
+    "net_recv": "Network received (bytes/s)",
+    "red_cpu": "Red's CPU usage (%)",
+    "red_mem": "Red's physical memory (bytes)",
+}
+
+# level: (table, length of a row, how long rows are kept)
+LEVELS = {
+    "1m": ("rollup_1m", datetime.timedelta(minutes=1), datetime.timedelta(days=2)),
+    "1h": ("rollup_1h", datetime.timedelta(hours=1), datetime.timedelta(days=90)),
+    "1d": ("rollup_1d", datetime.timedelta(days=1), datetime.timedelta(days=365 * 5)),
+}
+
+
+def level_for(window: datetime.timedelta) -> str:
+    """The coarsest rollup level that still gives a useful number of rows over the window."""
+    if window <= datetime.timedelta(hours=12):
+        return "1m"
+    if window <= datetime.timedelta(days=30):
+        return "1h"
+    return "1d"
+
+
+class MetricsHistory:
+    """Store sampler readings in SQLite as 1 minute, 1 hour and 1 day averages.
+
+    Minute rows are built from the samples in memory, hour rows from the minute rows and day
+    rows from the hour rows, so nothing is read back from the database to roll up. Each level
+    is pruned to its retention once an hour.
+    """
+
+    def __init__(self, bot: Red, probes: ProbeRunner) -> None:
+        self.probes = probes
+        self.driver = PandasSQLiteDriver(bot, "System", "history.db")
+        self.loop_meta = VexLoop("System history loop", 60.0)
+
+        self._samples: list[Sample] = []
+        self._rows: dict[str, list[pandas.DataFrame]] = {"1m": [], "1h": []}
+        self._last_prune: Optional[datetime.datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    def add(self, sample: Sample) -> None:
+        """Sampler listener, keeps the sample until the next minute is written."""
+        self._samples.append(sample)
+
+    async def _loop(self) -> None:
+        while True:
+            await self.loop_meta.sleep_until_next()
+            try:
+                self.loop_meta.iter_start()
+                await self.flush()
+                self.loop_meta.iter_finish()
+            except Exception as e:
+                self.loop_meta.iter_error(e)
+                log.exception("Something went wrong in the history loop.", exc_info=e)
+
+    def _minute_row(self, samples: list[Sample], disk: float) -> pandas.DataFrame:
+        first, last = samples[0], samples[-1]
+        elapsed = last.time - first.time
+        sent = last.net.bytes_sent - first.net.bytes_sent
+        recv = last.net.bytes_recv - first.net.bytes_recv
+        row = {
+            "cpu": sum(sum(s.cpu_percent) / len(s.cpu_percent) for s in samples) / len(samples),
+            "mem": sum(s.mem.percent for s in samples) / len(samples),
+            "swap": sum(s.swap.percent for s in samples) / len(samples),
+            "disk": disk,
+            # counters can reset (or wrap), a minute with a reset is just left empty
+            "net_sent": sent / elapsed if elapsed and sent >= 0 else float("nan"),
+            "net_recv": recv / elapsed if elapsed and recv >= 0 else float("nan"),
+            "red_cpu": sum(s.red_cpu for s in samples) / len(samples),
+            "red_mem": sum(s.red_mem for s in samples) / len(samples),
+        }
+        when = datetime.datetime.utcfromtimestamp(last.time).replace(second=0, microsecond=0)
+        return pandas.DataFrame([row], index=pandas.DatetimeIndex([when], name="index"))
+
+    async def flush(self) -> None:
+        samples, self._samples = self._samples, []
+        if not samples:
+            return
+
+        root = os.path.abspath(os.sep)
+        try:
+            disk = (await self.probes.run(psutil.disk_usage, root, key=root, pool="disk")).percent
+        except ProbeTimeout:
+            disk = float("nan")
+        minute = self._minute_row(samples, disk)
+        await self.driver.append(minute, LEVELS["1m"][0])
+
+        # roll up into the coarser levels once their period has passed
+        if (hour := await self._roll("1m", "1h", minute)) is not None:
+            await self._roll("1h", "1d", hour)
+
+        now = datetime.datetime.utcnow()
+        if self._last_prune is None or now - self._last_prune > datetime.timedelta(hours=1):
+            self._last_prune = now
+            await self.prune(now)
+
+    async def _roll(
+        self, level: str, coarser: str, new: pandas.DataFrame
+    ) -> Optional[pandas.DataFrame]:
+        """Keep a row of ``level`` until its ``coarser`` period is over.
+
+        When ``new`` is in a later period, the kept rows are averaged into a row of ``coarser``,
+        which is written and returned.
+        """
+        rows = self._rows[level]
+        period = pandas.Timedelta(LEVELS[coarser][1])
+        rolled = None
+        if rows and rows[0].index[0].floor(period) != new.index[0].floor(period):
+            df = pandas.concat(rows)
+            rolled = df.mean().to_frame().T
+            rolled.index = pandas.DatetimeIndex([df.index[0].floor(period)], name="index")
+            await self.driver.append(rolled, LEVELS[coarser][0])
+            rows.clear()
+        rows.append(new)
+        return rolled
+
+    async def prune(self, now: datetime.datetime) -> None:
+        for table, _, retention in LEVELS.values():
+            try:
+                df = await self.driver.read(table)
+            except Exception:  # table doesn't exist yet
+                continue
+            kept = df[df.index >= now - retention]
+            if len(kept) != len(df):
+                await self.driver.write(kept, table)
+
+    async def read(self, metric: str, window: datetime.timedelta) -> tuple[str, pandas.Series]:
+        """Read a metric over the last ``window``, only from the rollup level that fits it."""
+        level = level_for(window)
+        try:
+            df = await self.driver.read(LEVELS[level][0])
+        except Exception:
+            return level, pandas.Series(dtype=float)
+        series = df[metric]
+        return level, series[series.index >= datetime.datetime.utcnow() - window].dropna()
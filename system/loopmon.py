@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import TYPE_CHECKING, Optional
+
+from .vexutils import get_vex_logger
+
+if TYPE_CHECKING:
+    from redbot.core.bot import Red
+
+log = get_vex_logger(__name__)
+
+# upper bounds of the histogram buckets, in ms. the last one catches the rest
+BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def cog_modules(bot: Red) -> dict[str, str]:
+    """Map the package of each loaded cog to its name, eg ``redbot.cogs.audio`` to Audio."""
+    modules = {}
+    for name, cog in bot.cogs.items():
+        module = type(cog).__module__
+        modules[module.rpartition(".")[0] or module] = name
+    return modules
+
+
+def cog_paths(bot: Red) -> dict[str, str]:
+    """Map the directory of each loaded cog's package to its name."""
+    paths = {}
+    for name, cog in bot.cogs.items():
+        module = sys.modules.get(type(cog).__module__)
+        if module is not None and getattr(module, "__file__", None):
+            paths[os.path.dirname(os.path.abspath(module.__file__)) + os.sep] = name
+    return paths
+
+
+class CogIndex:
+    """The cog each module and package directory belongs to, for the profiling threads.
+
+    ``bot.cogs`` can change size while another thread iterates it, so this is refreshed on the
+    event loop whenever a cog is added or removed, and threads only read the copies.
+    """
+
+    def __init__(self, bot: Red) -> None:
+        self.bot = bot
+        self.modules: dict[str, str] = {}
+        self.paths: dict[str, str] = {}
+
+    def refresh(self) -> None:
+        # swapped in whole, a thread still using the old maps isn't affected
+        self.modules = cog_modules(self.bot)
+        self.paths = cog_paths(self.bot)
+
+
+def owner_of(module: Optional[str], modules: dict[str, str]) -> Optional[str]:
+    """The cog a module belongs to, ``None`` if it's not in a cog (eg discord.py or asyncio)."""
+    while module:
+        if module in modules:
+            return modules[module]
+        module = module.rpartition(".")[0]
+    return None
+
+
+def frame_owner(frame: Optional[FrameType], modules: dict[str, str]) -> Optional[tuple[str, str]]:
+    """The innermost frame of a stack inside a cog, as ``(cog, function)``."""
+    while frame is not None:
+        owner = owner_of(frame.f_globals.get("__name__"), modules)
+        if owner is not None:
+            return owner, frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+def coro_owner(coro, modules: dict[str, str]) -> Optional[str]:
+    """Follow the chain of awaited coroutines and return the innermost cog in it."""
+    owner = None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            owner = owner_of(frame.f_globals.get("__name__"), modules) or owner
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return owner
+
+
+class LoopMonitor:
+    """Measure event loop lag and see what asyncio tasks are running.
+
+    Every ``interval`` seconds a task sleeps and records how late it woke up. Lag is kept as an
+    all-time histogram and the last ``window`` readings. A watchdog thread checks the loop is
+    still on time, and when it's more than ``block_threshold`` seconds late it charges the
+    function that is blocking it to its cog.
+
+    Tasks are sampled every ``task_interval`` seconds, grouped by coroutine name and the innermost
+    cog they're awaiting in.
+    """
+
+    def __init__(
+        self,
+        cogs: CogIndex,
+        interval: float = 0.25,
+        window: int = 240,
+        task_interval: float = 10.0,
+        block_threshold: float = 0.1,
+    ) -> None:
+        self.cogs = cogs
+        self.interval = interval
+        self.task_interval = task_interval
+        self.block_threshold = block_threshold
+
+        self.histogram = [0] * (len(BUCKETS) + 1)
+        self.recent: deque[float] = deque(maxlen=window)  # lag in seconds
+        self.tasks: Counter[tuple[str, Optional[str]]] = Counter()
+        self.task_total = 0
+        self.blocking: Counter[tuple[str, str]] = Counter()
+
+        self._expected = 0.0  # monotonic time the lag task should wake up at, 0 when not sleeping
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._tasks = [
+            asyncio.create_task(self._lag_loop()),
+            asyncio.create_task(self._task_loop()),
+        ]
+        threading.Thread(target=self._watchdog, name="system_loop_watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+
+    async def _lag_loop(self) -> None:
+        while True:
+            self._expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - self._expected, 0.0)
+            self._expected = 0.0
+
+            self.recent.append(lag)
+            self.histogram[bisect.bisect_left(BUCKETS, lag * 1000)] += 1
+
+    async def _task_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.task_interval)
+            try:
+                self.sample_tasks()
+            except Exception as e:
+                log.exception("Something went wrong sampling tasks.", exc_info=e)
+
+    def sample_tasks(self) -> Counter[tuple[str, Optional[str]]]:
+        """Count the running tasks by coroutine name and cog, and add them to the totals."""
+        modules = self.cogs.modules
+        current: Counter[tuple[str, Optional[str]]] = Counter()
+        for task in asyncio.all_tasks():
+            coro = task.get_coro()
+            name = getattr(coro, "__qualname__", None) or type(coro).__name__
+            current[(name, coro_owner(coro, modules))] += 1
+
+        self.tasks.update(current)
+        self.task_total += 1
+        return current
+
+    def _watchdog(self) -> None:
+        try:
+            self._watch()
+        except Exception as e:
+            log.exception("The loop watchdog stopped.", exc_info=e)
+
+    def _watch(self) -> None:
+        charged = 0.0
+        while not self._stop.wait(self.block_threshold / 2):
+            expected = self._expected
+            if not expected or expected == charged:
+                continue
+            if time.monotonic() - expected < self.block_threshold:
+                continue
+
+            # one charge per late wakeup, the loop's stuck on the same thing
+            charged = expected
+            frame = sys._current_frames().get(self._loop_thread)  # type:ignore
+            owner = frame_owner(frame, self.cogs.modules) if frame else None
+            if owner is not None:
+                self.blocking[owner] += 1
+            del frame
+
+    def percentile(self, percent: float) -> float:
+        """A percentile of the recent lag, in seconds."""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import time
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+from .vexutils import get_vex_logger
+
+log = get_vex_logger(__name__)
+
+T = TypeVar("T")
+
+
+class ProbeTimeout(Exception):
+    """A probe didn't finish in time, or is backing off after doing so before."""
+
+
+def _mark_started(started: asyncio.Future) -> None:
+    if not started.done():
+        started.set_result(None)
+
+
+class ProbeRunner:
+    """Run blocking psutil calls in small dedicated thread pools, with a timeout for each call.
+
+    Calls that time out are backed off by their ``key`` (the function's name by default, or eg a
+    mount point): later calls with that key fail straight away until the backoff expires, doubling
+    each time up to ``max_backoff``. A key is also never submitted again while its last call is
+    still stuck in a thread, so a hung mount can hold one thread at most.
+
+    Each call goes to a ``pool``: ``"disk"`` for calls on a mount point, which can hang for good,
+    ``"sampler"`` for the sampler so it never waits behind anything else, or ``"default"``. Hung
+    mounts can then only fill the disk pool. The timeout starts when the call does, a call still
+    queued after ``timeout`` is dropped without backing its key off.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        disk_workers: int = 2,
+        timeout: float = 3.0,
+        backoff: float = 60.0,
+        max_backoff: float = 3600.0,
+    ) -> None:
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.executors = {
+            "default": concurrent.futures.ThreadPoolExecutor(workers, "system_probe"),
+            "disk": concurrent.futures.ThreadPoolExecutor(disk_workers, "system_disk_probe"),
+            "sampler": concurrent.futures.ThreadPoolExecutor(1, "system_sampler"),
+        }
+        self.failures: dict[Hashable, int] = {}
+        self.retry_at: dict[Hashable, float] = {}
+        self._stuck: dict[Hashable, asyncio.Future] = {}
+
+    def backing_off(self, key: Hashable) -> bool:
+        if (stuck := self._stuck.get(key)) is not None:
+            if not stuck.done():
+                return True
+            del self._stuck[key]
+        return self.retry_at.get(key, 0) > time.monotonic()
+
+    async def run(
+        self,
+        func: Callable[..., T],
+        *args: Any,
+        key: Optional[Hashable] = None,
+        timeout: Optional[float] = None,
+        pool: str = "default",
+    ) -> T:
+        """Run ``func(*args)`` in ``pool``, ``timeout`` overrides the default one.
+
+        Raises
+        ------
+        ProbeTimeout
+            If it took longer than the timeout, couldn't start within it, or ``key`` is
+            backing off.
+        """
+        key = key if key is not None else getattr(func, "__qualname__", repr(func))
+        if self.backing_off(key):
+            raise ProbeTimeout(key)
+
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def call() -> T:
+            loop.call_soon_threadsafe(_mark_started, started)
+            return func(*args)
+
+        timeout = timeout or self.timeout
+        submitted = self.executors[pool].submit(call)
+        future = asyncio.wrap_future(submitted, loop=loop)
+        try:
+            await asyncio.wait_for(asyncio.shield(started), timeout=timeout)
+        except asyncio.TimeoutError:
+            # only succeeds if it's still queued, which isn't this key's fault
+            if submitted.cancel():
+                log.warning(f"Probe {key} waited over {timeout}s for a free {pool} thread.")
+                raise ProbeTimeout(key)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            failures = self.failures[key] = self.failures.get(key, 0) + 1
+            delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+            self.retry_at[key] = time.monotonic() + delay
+            self._stuck[key] = future
+            log.warning(f"Probe {key} timed out, skipping it for {delay}s.")
+            raise ProbeTimeout(key)
+
+        self.failures.pop(key, None)
+        self.retry_at.pop(key, None)
+        return result
+
+    def close(self) -> None:
+        # threads stuck in a hung syscall can't be interrupted, so don't wait for them
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
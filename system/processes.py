@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Optional
+
+from .backend import ProcessCensus, scan_processes
+from .probes import ProbeRunner
+
+
+class ProcessCache:
+    """Cache process censuses for ``ttl`` seconds.
+
+    Walking every process is the slowest thing this cog does, so `system processes`,
+    `system all` and the dropdown share one census. Concurrent callers wait on the same scan
+    instead of starting their own.
+    """
+
+    def __init__(self, probes: ProbeRunner, ttl: float = 10.0, timeout: float = 15.0) -> None:
+        self.probes = probes
+        self.ttl = ttl
+        self.timeout = timeout
+        self.census: Optional[ProcessCensus] = None
+        self._scan: Optional[asyncio.Task] = None
+
+    async def get(self) -> ProcessCensus:
+        """Get a census no older than the TTL.
+
+        Raises
+        ------
+        ProbeTimeout
+            If the scan took too long.
+        """
+        if self.census is not None and time.time() - self.census.time < self.ttl:
+            return self.census
+
+        if self._scan is None or self._scan.done():
+            self._scan = asyncio.create_task(
+                self.probes.run(scan_processes, key="processes", timeout=self.timeout)
+            )
+        # shielded so one caller being cancelled doesn't cancel it for everyone
+        self.census = await asyncio.shield(self._scan)
+        return self.census
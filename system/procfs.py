@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import NamedTuple, Optional
+
+import psutil
+
+from .vexutils import get_vex_logger
+
+log = get_vex_logger(__name__)
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+CGROUP_ROOTS = ("/sys/fs/cgroup", "/sys/fs/cgroup/unified")
+
+
+class CpuTimes(NamedTuple):
+    user: float
+    nice: float
+    system: float
+    idle: float
+    iowait: float
+    irq: float
+    softirq: float
+    steal: float
+
+
+class CpuFreq(NamedTuple):
+    current: float  # MHz, same as psutil
+    min: float
+    max: float
+
+
+class Memory(NamedTuple):
+    total: int
+    available: int
+    percent: float
+    used: int
+    free: int
+
+
+class Swap(NamedTuple):
+    total: int
+    used: int
+    free: int
+    percent: float
+
+
+class NetIO(NamedTuple):
+    bytes_sent: int
+    bytes_recv: int
+    packets_sent: int
+    packets_recv: int
+    errin: int
+    errout: int
+    dropin: int
+    dropout: int
+
+
+class DiskIO(NamedTuple):
+    read_count: int
+    write_count: int
+    read_bytes: int
+    write_bytes: int
+
+
+class Limits(NamedTuple):
+    """Limits of the cgroup the bot is in, ``None`` if it has none."""
+
+    cpus: Optional[float]
+    mem: Optional[int]
+    cpu_percent: Optional[float]  # usage of the whole cgroup, as a percentage of ``cpus``
+
+
+def _percent(part: float, total: float) -> float:
+    return round(part / total * 100, 1) if total else 0.0
+
+
+def _kv(text: str) -> dict[str, int]:
+    """Parse ``key value [unit]`` lines, eg /proc/meminfo or cpu.stat."""
+    data = {}
+    for line in text.splitlines():
+        parts = line.replace(":", " ").split()
+        if len(parts) >= 2 and parts[1].isdigit():
+            data[parts[0]] = int(parts[1])
+    return data
+
+
+class ProcReader:
+    """Read Linux metrics straight from /proc and cgroup v2 files, for the sampler.
+
+    Every file is opened once and re-read with ``pread``, skipping psutil's open/parse per call,
+    and each file is read at most once per sample. When the bot runs in a cgroup with a memory or
+    CPU limit (eg a container), memory is reported against the limit instead of the host's RAM.
+    """
+
+    def __init__(self) -> None:
+        self._fds: dict[str, int] = {}
+        self._sizes: dict[str, int] = {}
+
+        self.cgroup = self._find_cgroup()
+        self.freq_limits = {}
+        for i in range(os.cpu_count() or 1):
+            base = f"/sys/devices/system/cpu/cpu{i}/cpufreq/"
+            try:
+                with open(base + "cpuinfo_min_freq") as f_min:
+                    with open(base + "cpuinfo_max_freq") as f_max:
+                        self.freq_limits[i] = (int(f_min.read()) / 1000, int(f_max.read()) / 1000)
+            except (OSError, ValueError):
+                break
+
+        self.cpus = self._cpu_limit()
+        self._last_stat: Optional[list[list[int]]] = None
+        self._last_self: Optional[tuple[float, int]] = None  # monotonic time, ticks
+        self._last_cgroup: Optional[tuple[float, int]] = None  # monotonic time, usec
+
+    @staticmethod
+    def available() -> bool:
+        return psutil.LINUX and os.access("/proc/stat", os.R_OK)
+
+    @staticmethod
+    def _find_cgroup() -> Optional[str]:
+        try:
+            with open("/proc/self/cgroup") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        path = next((line[3:] for line in lines if line.startswith("0::")), None)
+        if path is None:
+            return None
+        for root in CGROUP_ROOTS:
+            # in a cgroup namespace (most containers) our cgroup is mounted as the root
+            for candidate in (root + path, root):
+                if os.path.exists(os.path.join(candidate, "cgroup.controllers")):
+                    return candidate.rstrip("/")
+        return None
+
+    def _read(self, path: str) -> Optional[str]:
+        """Read a file through a cached fd, ``None`` if it doesn't exist."""
+        fd = self._fds.get(path)
+        if fd is None:
+            try:
+                fd = self._fds[path] = os.open(path, os.O_RDONLY)
+            except OSError:
+                return None
+
+        size = self._sizes.get(path, 4096)
+        data = os.pread(fd, size, 0)
+        while len(data) == size:  # might be truncated, seq files are regenerated on each read
+            size *= 2
+            data = os.pread(fd, size, 0)
+        self._sizes[path] = size
+        return data.decode()
+
+    def _require(self, path: str) -> str:
+        """Read a file the sampler can't do without, raising ``OSError`` if it doesn't exist."""
+        data = self._read(path)
+        if data is None:
+            raise FileNotFoundError(path)
+        return data
+
+    def _read_cgroup(self, name: str) -> Optional[str]:
+        return self._read(f"{self.cgroup}/{name}") if self.cgroup else None
+
+    def _cpu_limit(self) -> Optional[float]:
+        cpu_max = self._read_cgroup("cpu.max")
+        if not cpu_max:
+            return None
+        quota, period = cpu_max.split()
+        return None if quota == "max" else int(quota) / int(period)
+
+    def _mem_limit(self) -> Optional[int]:
+        mem_max = self._read_cgroup("memory.max")
+        if not mem_max or mem_max.strip() == "max":
+            return None
+        return int(mem_max)
+
+    def cpu(self) -> tuple[list[float], CpuTimes]:
+        lines = self._require("/proc/stat").splitlines()
+        stat = [[int(v) for v in line.split()[1:9]] for line in lines if line.startswith("cpu")]
+
+        # guest time is already counted in user and nice, so is left out
+        percent = []
+        if self._last_stat is not None and len(self._last_stat) == len(stat):
+            for new, old in zip(stat[1:], self._last_stat[1:]):
+                total = sum(new) - sum(old)
+                idle = (new[3] + new[4]) - (old[3] + old[4])
+                percent.append(_percent(total - idle, total))
+        else:
+            percent = [0.0] * (len(stat) - 1)
+        self._last_stat = stat
+
+        return percent, CpuTimes(*(v / CLOCK_TICKS for v in stat[0]))
+
+    def cpu_freq(self) -> list[CpuFreq]:
+        freq = []
+        for i, (min_, max_) in self.freq_limits.items():
+            current = self._read(f"/sys/devices/system/cpu/cpu{i}/cpufreq/scaling_cur_freq")
+            if current is None:
+                return []
+            freq.append(CpuFreq(int(current) / 1000, min_, max_))
+        return freq
+
+    def mem(self) -> tuple[Memory, Swap]:
+        info = {k: v * 1024 for k, v in _kv(self._require("/proc/meminfo")).items()}
+
+        total, free = info["MemTotal"], info["MemFree"]
+        cached = info.get("Cached", 0) + info.get("SReclaimable", 0)
+        available = info.get("MemAvailable", free + info.get("Buffers", 0) + cached)
+        used = total - available  # same as psutil
+
+        limit = self._mem_limit()
+        if limit is not None and limit < total:
+            current = int(self._read_cgroup("memory.current") or 0)
+            # page cache is counted in the cgroup but can be reclaimed, like on the host
+            inactive = _kv(self._read_cgroup("memory.stat") or "").get("inactive_file", 0)
+            total, used = limit, max(current - inactive, 0)
+            free = available = max(limit - used, 0)
+
+        swap_total, swap_free = info.get("SwapTotal", 0), info.get("SwapFree", 0)
+        swap_used = swap_total - swap_free
+        return (
+            Memory(total, available, _percent(total - available, total), used, free),
+            Swap(swap_total, swap_used, swap_free, _percent(swap_used, swap_total)),
+        )
+
+    def process(self, mem_total: int) -> tuple[float, float, int, float, int]:
+        """CPU %, memory % and bytes, swap % and bytes of this process."""
+        stat = self._require("/proc/self/stat")
+        fields = stat[stat.rindex(")") + 2 :].split()
+        ticks = int(fields[11]) + int(fields[12])  # utime, stime
+
+        now = time.monotonic()
+        cpu = 0.0
+        if self._last_self is not None:
+            elapsed = now - self._last_self[0]
+            cpu = _percent((ticks - self._last_self[1]) / CLOCK_TICKS, elapsed)
+        self._last_self = (now, ticks)
+
+        status = _kv(self._require("/proc/self/status"))
+        rss, swap = status.get("VmRSS", 0) * 1024, status.get("VmSwap", 0) * 1024
+        return cpu, _percent(rss, mem_total), rss, _percent(swap, mem_total), swap
+
+    def net(self) -> tuple[NetIO, dict[str, NetIO]]:
+        """Totals, and counters per interface."""
+        totals = [0] * 16
+        nics = {}
+        for line in self._require("/proc/net/dev").splitlines()[2:]:
+            name, _, values = line.partition(":")
+            counters = [int(v) for v in values.split()]
+            # rx bytes, packets, errs, drop, ... tx bytes, packets, errs, drop
+            nics[name.strip()] = NetIO(*(counters[i] for i in (8, 0, 9, 1, 2, 10, 3, 11)))
+            for i, value in enumerate(counters):
+                totals[i] += value
+        return NetIO(*(totals[i] for i in (8, 0, 9, 1, 2, 10, 3, 11))), nics
+
+    def disks(self) -> dict[str, DiskIO]:
+        disks = {}
+        for line in (self._read("/proc/diskstats") or "").splitlines():
+            fields = line.split()
+            name = fields[2]
+            if name.startswith(("loop", "ram")):
+                continue
+            # reads completed, merged, sectors read, ms, writes completed, merged, sectors written
+            reads, read_sectors = int(fields[3]), int(fields[5])
+            writes, write_sectors = int(fields[7]), int(fields[9])
+            if reads or writes:
+                disks[name] = DiskIO(reads, writes, read_sectors * 512, write_sectors * 512)
+        return disks
+
+    def limits(self) -> Optional[Limits]:
+        mem = self._mem_limit()
+        if self.cpus is None and mem is None:
+            return None
+
+        cpu_percent = None
+        usage = _kv(self._read_cgroup("cpu.stat") or "").get("usage_usec")
+        if self.cpus is not None and usage is not None:
+            now = time.monotonic()
+            if self._last_cgroup is not None:
+                elapsed = (now - self._last_cgroup[0]) * self.cpus
+                cpu_percent = _percent((usage - self._last_cgroup[1]) / 1_000_000, elapsed)
+            self._last_cgroup = (now, usage)
+        return Limits(self.cpus, mem, cpu_percent)
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import datetime
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+from tabulate import tabulate
+
+from .loopmon import CogIndex, frame_owner
+from .vexutils import get_vex_logger
+from .vexutils.chat import humanize_bytes
+
+log = get_vex_logger(__name__)
+
+IDLE = "(idle)"
+OTHER = "(not in a cog)"
+
+
+def path_owner(filename: str, paths: dict[str, str]) -> Optional[str]:
+    """The cog a file belongs to, the deepest matching package wins (for nested cogs)."""
+    best = None
+    for path, name in paths.items():
+        if filename.startswith(path) and (best is None or len(path) > len(best)):
+            best = path
+    return paths[best] if best else None
+
+
+class AllocationProfiler:
+    """Attribute memory allocated since it was started to cogs, with tracemalloc.
+
+    Each allocation is charged to the innermost frame of its traceback that's in a cog's
+    package. Only ``frames`` frames are kept per allocation, which bounds the overhead (roughly
+    ``frames`` pointers per live allocation) but means deep stacks can miss their cog.
+    """
+
+    def __init__(self, cogs: CogIndex, frames: int = 10) -> None:
+        self.cogs = cogs
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started: Optional[datetime.datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self.baseline is not None
+
+    def start(self) -> None:
+        if tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is already running, maybe from another cog.")
+        tracemalloc.start(self.frames)
+        self.baseline = tracemalloc.take_snapshot()
+        self.started = datetime.datetime.utcnow()
+
+    def stop(self) -> None:
+        if self.running:
+            tracemalloc.stop()
+        self.baseline = None
+
+    def diff(self) -> dict[str, list[int]]:
+        """Bytes and blocks allocated since start, by cog. Blocking, run it in an executor."""
+        if self.baseline is None:
+            return {}
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        paths = self.cogs.paths
+
+        usage: dict[str, list[int]] = {}
+        for stat in snapshot.compare_to(self.baseline, "traceback"):
+            owner = OTHER
+            for frame in reversed(stat.traceback):  # innermost first
+                if (cog := path_owner(frame.filename, paths)) is not None:
+                    owner = cog
+                    break
+            totals = usage.setdefault(owner, [0, 0])
+            totals[0] += stat.size_diff
+            totals[1] += stat.count_diff
+        return usage
+
+    def report(self) -> str:
+        usage = self.diff()
+        rows = [
+            [cog, humanize_bytes(size, 1) if size >= 0 else "-" + humanize_bytes(-size, 1), count]
+            for cog, (size, count) in sorted(usage.items(), key=lambda i: i[1][0], reverse=True)
+        ]
+        traced, peak = tracemalloc.get_traced_memory()
+        return (
+            f"Memory allocated since {self.started:%Y-%m-%d %H:%M:%S} UTC, by cog\n"
+            f"Traced now: {humanize_bytes(traced, 1)}, peak: {humanize_bytes(peak, 1)}\n\n"
+            + tabulate(rows, headers=["Cog", "Size change", "Blocks change"])
+        )
+
+
+class StackSampler:
+    """Sample the event loop thread's stack every ``interval`` seconds from another thread.
+
+    Each sample is charged to the innermost frame that's in a cog, so a cog's share of samples
+    is roughly its share of the loop's CPU time. The overhead is one stack walk per sample.
+    """
+
+    def __init__(self, cogs: CogIndex, interval: float = 0.05) -> None:
+        self.cogs = cogs
+        self.interval = interval
+        self.samples: Counter[tuple[str, str]] = Counter()
+        self.total = 0
+        self.started: Optional[datetime.datetime] = None
+
+        self._loop_thread: Optional[int] = None
+        self._stop: Optional[threading.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._stop is not None
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self.samples.clear()
+        self.total = 0
+        self.started = datetime.datetime.utcnow()
+        threading.Thread(
+            target=self._run, args=(self._stop,), name="system_stack_sampler", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+        self._stop = None
+
+    def _run(self, stop: threading.Event) -> None:
+        try:
+            self._sample(stop)
+        except Exception as e:
+            log.exception("The stack sampler stopped.", exc_info=e)
+
+    def _sample(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(self._loop_thread)  # type:ignore
+            if frame is None:
+                continue
+            if frame.f_code.co_name == "select":  # waiting on the selector, nothing to do
+                key = (IDLE, "")
+            else:
+                key = frame_owner(frame, self.cogs.modules) or (OTHER, frame.f_code.co_name)
+            del frame
+            self.samples[key] += 1
+            self.total += 1
+
+    def report(self) -> str:
+        # copied in one go, the sampler thread could add to it while this iterates
+        samples = Counter(dict(self.samples))
+        total = sum(samples.values()) or 1
+        by_cog: Counter[str] = Counter()
+        for (cog, _), count in samples.items():
+            by_cog[cog] += count
+
+        def share(count: int) -> str:
+            return f"{round(count / total * 100, 1)} %"
+
+        cogs = [[cog, count, share(count)] for cog, count in by_cog.most_common()]
+        funcs = [
+            [cog, func, count, share(count)]
+            for (cog, func), count in samples.most_common(50)
+            if cog != IDLE
+        ]
+        return (
+            f"Event loop stack samples since {self.started:%Y-%m-%d %H:%M:%S} UTC, "
+            f"every {self.interval}s ({self.total} samples)\n\n"
+            + tabulate(cogs, headers=["Cog", "Samples", "Share"])
+            + "\n\n"
+            + tabulate(funcs, headers=["Cog", "Function", "Samples", "Share"])
+        )
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from .sampler import Sample
+
+NET_FIELDS = ("bytes_sent", "bytes_recv", "packets_sent", "packets_recv")
+DISK_FIELDS = ("read_bytes", "write_bytes", "read_count", "write_count")
+WRAP_32 = 2**32
+
+
+def counter_delta(new: int, old: int) -> Optional[int]:
+    """How much a counter went up between two readings, ``None`` if it was reset."""
+    if new >= old:
+        return new - old
+    # some counters are 32 bit (eg on Windows) and wrap round, otherwise it must have been reset
+    if old < WRAP_32:
+        wrapped = new + WRAP_32 - old
+        if wrapped < WRAP_32 // 2:
+            return wrapped
+    return None
+
+
+class RateTracker:
+    """Per second rates for each device, from the counters of consecutive samples.
+
+    ``attr`` is the sample's ``{device: counters}`` attribute and ``fields`` the counters to
+    turn into rates. The rates of the last ``window`` samples are kept for averages. A device
+    whose counters go backwards is skipped for that sample.
+    """
+
+    def __init__(self, attr: str, fields: tuple[str, ...], window: int = 12) -> None:
+        self.attr = attr
+        self.fields = fields
+        self.window = window
+        self.current: dict[str, dict[str, float]] = {}
+        self.history: dict[str, deque[dict[str, float]]] = {}
+        self._last: Optional[tuple[float, dict[str, Any]]] = None
+
+    def add(self, sample: Sample) -> None:
+        """Sampler listener."""
+        counters = getattr(sample, self.attr) or {}
+        last, self._last = self._last, (sample.time, counters)
+        if last is None or sample.time <= last[0]:
+            return
+        elapsed = sample.time - last[0]
+
+        current = {}
+        for device, new in counters.items():
+            if (old := last[1].get(device)) is None:
+                continue
+            rates = {}
+            for field in self.fields:
+                delta = counter_delta(getattr(new, field), getattr(old, field))
+                if delta is None:
+                    break
+                rates[field] = delta / elapsed
+            else:
+                current[device] = rates
+                self.history.setdefault(device, deque(maxlen=self.window)).append(rates)
+
+        for device in set(self.history) - set(counters):  # gone, eg a container's veth
+            del self.history[device]
+        self.current = current
+
+    def average(self, device: str) -> dict[str, float]:
+        history = self.history.get(device) or ()
+        return {
+            field: sum(rates[field] for rates in history) / len(history) if history else 0.0
+            for field in self.fields
+        }
+
+    def busiest(self, count: int) -> list[str]:
+        """The devices with the most throughput on average, busiest first."""
+
+        def total(device: str) -> float:
+            average = self.average(device)
+            return average[self.fields[0]] + average[self.fields[1]]
+
+        return sorted(self.current, key=total, reverse=True)[:count]
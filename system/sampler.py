@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, NamedTuple, Optional
+
+import psutil
+
+from .probes import ProbeRunner, ProbeTimeout
+from .procfs import Limits, ProcReader
+from .vexutils import get_vex_logger
+from .vexutils.loop import VexLoop
+
+log = get_vex_logger(__name__)
+
+
+class Sample(NamedTuple):
+    """One reading of the metrics that need two measurements to be meaningful."""
+
+    time: float
+    cpu_percent: list[float]  # per core, since the last sample
+    cpu_times: Any  # psutil's scputimes or CpuTimes, their fields depend on the platform
+    cpu_freq: list  # psutil._common.scpufreq or CpuFreq, may be empty
+    red_cpu: float
+    red_mem_pc: float
+    red_mem: int
+    red_swap_pc: float
+    red_swap: int
+    net: Any  # psutil's snetio or NetIO
+    mem: Any  # psutil's svmem or Memory, their fields depend on the platform
+    swap: Any  # psutil's sswap or Swap
+    limits: Optional[Limits] = None  # cgroup limits, only from ProcReader
+    nics: Optional[dict[str, Any]] = None  # per interface net counters
+    disks: Optional[dict[str, Any]] = None  # per disk IO counters, psutil's sdiskio or DiskIO
+
+
+class MetricsSampler:
+    """Take a sample of CPU, memory, process and network metrics every ``interval`` seconds.
+
+    The last ``size`` samples are kept in a ring buffer so commands never have to wait for
+    a reading. Listeners are called with every new sample.
+
+    With a ``reader`` samples are read straight from /proc instead of through psutil, falling
+    back to psutil if that ever fails.
+    """
+
+    def __init__(
+        self,
+        probes: ProbeRunner,
+        interval: float = 5.0,
+        size: int = 120,
+        reader: Optional[ProcReader] = None,
+    ) -> None:
+        self.probes = probes
+        self.reader = reader
+        self.interval = interval
+        self.samples: deque[Sample] = deque(maxlen=size)
+        self.loop_meta = VexLoop("System sampler loop", interval)
+        self.process = psutil.Process()
+        self.listeners: list[Callable[[Sample], None]] = []
+
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # the first call of both is meaningless, it only sets the baseline for the next one
+        psutil.cpu_percent(percpu=True)
+        self.process.cpu_percent()
+        if self.reader is not None:
+            self.take()
+        self._task = asyncio.create_task(self._loop())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        if self.reader is not None:
+            self.reader.close()
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(self.interval)  # let the baseline settle
+        while True:
+            try:
+                self.loop_meta.iter_start()
+                sample = await self.probes.run(self.take, pool="sampler")
+                self.samples.append(sample)
+                for listener in self.listeners:
+                    listener(sample)
+                self.loop_meta.iter_finish()
+            except ProbeTimeout as e:  # already logged, try again next time
+                self.loop_meta.iter_error(e)
+            except Exception as e:
+                self.loop_meta.iter_error(e)
+                log.exception("Something went wrong in the sampler loop.", exc_info=e)
+
+            await self.loop_meta.sleep_until_next()
+
+    def take(self) -> Sample:
+        """Take a sample now. CPU usage is relative to the previous sample (or start)."""
+        if self.reader is not None:
+            try:
+                return self._take_procfs(self.reader)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                log.warning("Reading from /proc failed, falling back to psutil.", exc_info=e)
+                self.reader.close()
+                self.reader = None
+
+        try:
+            freq = psutil.cpu_freq(percpu=True)
+        except NotImplementedError:  # happens on WSL
+            freq = []
+        try:
+            disks = psutil.disk_io_counters(perdisk=True) or {}
+        except (RuntimeError, NotImplementedError):  # no disks it can read, eg some VMs
+            disks = {}
+
+        p = self.process
+        with p.oneshot():
+            red_cpu = p.cpu_percent()
+            red_mem_pc = p.memory_percent("rss")
+            red_mem = p.memory_info().rss
+            if psutil.LINUX:
+                red_swap_pc = p.memory_percent("swap")
+                red_swap = p.memory_full_info().swap
+            else:
+                red_swap_pc = 0.0
+                red_swap = 0
+
+        return Sample(
+            time=time.time(),
+            cpu_percent=psutil.cpu_percent(percpu=True),
+            cpu_times=psutil.cpu_times(),
+            cpu_freq=freq,
+            red_cpu=red_cpu,
+            red_mem_pc=red_mem_pc,
+            red_mem=red_mem,
+            red_swap_pc=red_swap_pc,
+            red_swap=red_swap,
+            net=psutil.net_io_counters(),
+            mem=psutil.virtual_memory(),
+            swap=psutil.swap_memory(),
+            nics=psutil.net_io_counters(pernic=True),
+            disks=disks,
+        )
+
+    def _take_procfs(self, reader: ProcReader) -> Sample:
+        cpu_percent, cpu_times = reader.cpu()
+        mem, swap = reader.mem()
+        net, nics = reader.net()
+        red_cpu, red_mem_pc, red_mem, red_swap_pc, red_swap = reader.process(mem.total)
+
+        return Sample(
+            time=time.time(),
+            cpu_percent=cpu_percent,
+            cpu_times=cpu_times,
+            cpu_freq=reader.cpu_freq(),
+            red_cpu=red_cpu,
+            red_mem_pc=red_mem_pc,
+            red_mem=red_mem,
+            red_swap_pc=red_swap_pc,
+            red_swap=red_swap,
+            net=net,
+            mem=mem,
+            swap=swap,
+            limits=reader.limits(),
+            nics=nics,
+            disks=reader.disks(),
+        )
+
+    async def latest(self) -> Sample:
+        """The latest sample, taken now if the loop hasn't produced one yet.
+
+        Raises
+        ------
+        ProbeTimeout
+            If a sample had to be taken and it timed out.
+        """
+        if not self.samples:
+            self.samples.append(await self.probes.run(self.take, pool="sampler"))
+        return self.samples[-1]
@@ -1,22 +1,29 @@
 from __future__ import annotations
 
 import datetime
+import functools
+import io
 from typing import TYPE_CHECKING
 
 import discord
 import psutil
-from redbot.core import commands
+from redbot.core import Config, commands
 from redbot.core.bot import Red
 from redbot.core.utils.chat_formatting import humanize_timedelta
 
+from system.components.live import LiveView
 from system.components.view import SystemView
 
+from .alerts import ALERT_METRICS, OPERATORS, AlertManager, describe, parse_metric, parse_threshold
 from .backend import (
     box,
     get_cpu,
     get_disk,
+    get_disk_io,
+    get_loop,
     get_mem,
     get_net,
+    get_net_rates,
     get_proc,
     get_red,
     get_sensors,
@@ -25,17 +32,42 @@ from .backend import (
     up_for,
 )
 from .command import DynamicHelp
+from .history import METRICS, MetricsHistory
+from .loopmon import CogIndex, LoopMonitor
+from .probes import ProbeRunner, ProbeTimeout
+from .processes import ProcessCache
+from .procfs import ProcReader
+from .profiler import AllocationProfiler, StackSampler
+from .rates import DISK_FIELDS, NET_FIELDS, RateTracker
+from .sampler import MetricsSampler
 from .vexutils import format_help, format_info
-
-if TYPE_CHECKING:
-    from discord.types.embed import EmbedField
+from .vexutils.chat import humanize_bytes
 
 UNAVAILABLE = "\N{CROSS MARK} This command isn't available on your system."
 ZERO_WIDTH = "\u200b"
+TIMED_OUT = "Timed out, skipped until it responds again."
+SPARK_CHARS = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
 
 # cspell:ignore psutil shwtemp tablefmt sfan suser sdiskpart sdiskusage fstype proc procs
 
 
+def probe_timeout(func):
+    """Show which probe timed out in the embed instead, for ``prep_*_msg`` methods."""
+
+    @functools.wraps(func)
+    async def wrapper(self: System, channel: discord.abc.Messageable, *args, **kwargs):
+        try:
+            return await func(self, channel, *args, **kwargs)
+        except ProbeTimeout as e:
+            embed = discord.Embed(
+                title="Timed out", colour=await self.bot.get_embed_colour(channel)
+            )
+            embed.add_field(name=str(e.args[0]), value=box(TIMED_OUT))
+            return self.finalise_embed(embed)
+
+    return wrapper
+
+
 class System(commands.Cog):
     """
     Get system metrics.
@@ -49,6 +81,44 @@ class System(commands.Cog):
 
     def __init__(self, bot: Red) -> None:
         self.bot = bot
+        self.config = Config.get_conf(self, identifier=418078199982063626, force_registration=True)
+        self.config.register_global(alert_rules={}, alert_channel=None, alert_cooldown=1800)
+
+        self.probes = ProbeRunner()
+        self.sampler = MetricsSampler(
+            self.probes, reader=ProcReader() if ProcReader.available() else None
+        )
+        self.history = MetricsHistory(bot, self.probes)
+        self.processes = ProcessCache(self.probes)
+        self.net_rates = RateTracker("nics", NET_FIELDS)
+        self.disk_rates = RateTracker("disks", DISK_FIELDS)
+        self.alerts = AlertManager(bot, self.config, self.probes)
+        self.sampler.listeners.extend(
+            [self.history.add, self.net_rates.add, self.disk_rates.add, self.alerts.add]
+        )
+        self.cogs = CogIndex(bot)
+        self.loop_monitor = LoopMonitor(self.cogs)
+        self.allocations = AllocationProfiler(self.cogs)
+        self.stack_sampler = StackSampler(self.cogs)
+        self.live_views: set[LiveView] = set()
+
+    async def cog_load(self) -> None:
+        await self.alerts.load()
+        self.cogs.refresh()
+        self.sampler.start()
+        self.history.start()
+        self.loop_monitor.start()
+
+    async def cog_unload(self) -> None:
+        for view in list(self.live_views):
+            view.close()
+        self.sampler.stop()
+        self.history.stop()
+        self.alerts.stop()
+        self.loop_monitor.stop()
+        self.allocations.stop()
+        self.stack_sampler.stop()
+        self.probes.close()
 
     def format_help_for_context(self, ctx: commands.Context) -> str:
         """Thanks Sinbad."""
@@ -58,41 +128,40 @@ class System(commands.Cog):
         """Nothing to delete"""
         return
 
+    @commands.Cog.listener()
+    async def on_cog_add(self, cog: commands.Cog) -> None:
+        self.cogs.refresh()
+
+    @commands.Cog.listener()
+    async def on_cog_remove(self, cog: commands.Cog) -> None:
+        self.cogs.refresh()
+
     @commands.command(hidden=True)
     async def systeminfo(self, ctx: commands.Context):
-        await ctx.send(await format_info(ctx, self.qualified_name, self.__version__))
+        await ctx.send(
+            await format_info(
+                ctx,
+                self.qualified_name,
+                self.__version__,
+                loops=[self.sampler.loop_meta, self.history.loop_meta],
+            )
+        )
 
     def finalise_embed(self, e: discord.Embed) -> discord.Embed:
         """Make embeds look nicer - limit to two columns and set the footer to boot time"""
         # needed because otherwise they are otherwise too squashed together so tabulate breaks
         # doesn't look great on mobile but is fully bearable, more than ugly text wrapping
 
-        # oh, don't mention the ugly code please :P
-        # it works...
-        emb = e.to_dict()
-
-        fields = emb.get("fields", [])
+        fields = e.fields
         if len(fields) > 2:  # needs multi rows
-            data: list[list[EmbedField]] = []
-            temp: list[EmbedField] = []
-            for field in fields:
-                temp.append(field)
-                if len(temp) == 2:
-                    data.append(temp)
-                    temp = []
-            if len(temp) != 0:  # clear up stragglers
-                data.append(temp)
-
-            empty_field: EmbedField = {"inline": True, "name": ZERO_WIDTH, "value": ZERO_WIDTH}
-            fields = []
-            for row in data:
-                while len(row) < 3:
-                    row.append(empty_field)
-                fields.extend(row)
-
+            e.clear_fields()
+            for i in range(0, len(fields), 2):
+                row = fields[i : i + 2]
+                for field in row:
+                    e.add_field(name=field.name, value=field.value, inline=field.inline)
+                for _ in range(3 - len(row)):  # pad out to 3 columns
+                    e.add_field(name=ZERO_WIDTH, value=ZERO_WIDTH)
         # else it's 2 or less columns so doesn't need special treatment
-        emb["fields"] = fields
-        e = discord.Embed.from_dict(emb)
 
         # and footer is just a nice touch, thanks max for the idea of uptime there
         sys_uptime = humanize_timedelta(seconds=up_for())
@@ -126,12 +195,12 @@ class System(commands.Cog):
         Note: CPU frequency is nominal and overall on Windows and Mac OS,
         on Linux it's current and per-core.
         """
-        async with ctx.typing():
-            embed = await self.prep_cpu_msg(ctx.channel)
-            await ctx.send(embed=embed, view=SystemView(ctx.author, self, "cpu"))
+        embed = await self.prep_cpu_msg(ctx.channel)
+        await ctx.send(embed=embed, view=SystemView(ctx.author, self, "cpu"))
 
+    @probe_timeout
     async def prep_cpu_msg(self, channel: discord.abc.Messageable) -> discord.Embed | str:
-        data = await get_cpu()
+        data = get_cpu(await self.sampler.latest())
         percent = data["percent"]
         time = data["time"]
         freq = data["freq"]
@@ -158,12 +227,18 @@ class System(commands.Cog):
             embed=await self.prep_mem_msg(ctx.channel), view=SystemView(ctx.author, self, "mem")
         )
 
+    @probe_timeout
     async def prep_mem_msg(self, channel: discord.abc.Messageable) -> discord.Embed | str:
-        data = get_mem()
+        sample = await self.sampler.latest()
+        data = get_mem(sample)
         physical = data["physical"]
         swap = data["swap"]
+        limited = sample.limits is not None and sample.limits.mem is not None
         embed = discord.Embed(title="Memory", colour=await self.bot.get_embed_color(channel))
-        embed.add_field(name="Physical Memory", value=box(physical))
+        embed.add_field(
+            name="Physical Memory (container limit)" if limited else "Physical Memory",
+            value=box(physical),
+        )
         embed.add_field(name="SWAP Memory", value=box(swap))
         return self.finalise_embed(embed)
 
@@ -191,10 +266,11 @@ class System(commands.Cog):
             view=SystemView(ctx.author, self, "sensors"),
         )
 
+    @probe_timeout
     async def prep_sensors_msg(
         self, channel: discord.abc.Messageable, fahrenheit: bool = False
     ) -> discord.Embed:
-        data = get_sensors(fahrenheit)
+        data = await self.probes.run(get_sensors, fahrenheit)
         temp = data["temp"]
         fans = data["fans"]
         embed = discord.Embed(title="Sensors", colour=await self.bot.get_embed_colour(channel))
@@ -218,8 +294,9 @@ class System(commands.Cog):
             view=SystemView(ctx.author, self, "users"),
         )
 
+    @probe_timeout
     async def prep_users_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
-        data = get_users()
+        data = await self.probes.run(get_users)
         embed = discord.Embed(title="Users", colour=await self.bot.get_embed_colour(channel))
         if not data:
             embed.add_field(
@@ -256,10 +333,11 @@ class System(commands.Cog):
             view=SystemView(ctx.author, self, "disk"),
         )
 
+    @probe_timeout
     async def prep_disk_msg(
         self, channel: discord.abc.Messageable, ignore_loop: bool = True
     ) -> discord.Embed:
-        pre_data = get_disk()
+        pre_data = await get_disk(self.probes)
         data: dict[str, str] = {}
 
         if ignore_loop:
@@ -288,7 +366,8 @@ class System(commands.Cog):
     )
     async def system_processes(self, ctx: commands.Context):
         """
-        Get an overview of the status of currently running processes.
+        Get an overview of the status of currently running processes, and the top ones by CPU and
+        memory usage.
 
         Platforms: Windows, Linux, Mac OS
         """
@@ -298,10 +377,13 @@ class System(commands.Cog):
                 view=SystemView(ctx.author, self, "proc"),
             )
 
+    @probe_timeout
     async def prep_proc_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
-        proc = (await get_proc())["statuses"]
+        proc = get_proc(await self.processes.get())
         embed = discord.Embed(title="Processes", colour=await self.bot.get_embed_colour(channel))
-        embed.add_field(name="Status", value=box(proc))
+        embed.add_field(name="Status", value=box(proc["statuses"]))
+        embed.add_field(name="Top CPU", value=box(proc["top_cpu"]))
+        embed.add_field(name="Top memory (RSS)", value=box(proc["top_mem"]))
         return self.finalise_embed(embed)
 
     @system.command(
@@ -309,7 +391,11 @@ class System(commands.Cog):
     )
     async def system_net(self, ctx: commands.Context):
         """
-        Get network stats. They may have overflowed and reset at some point.
+        Get network stats.
+
+        This shows the current throughput of the busiest interfaces, and their average over the
+        last minute, as well as the totals since boot. The totals may have overflowed and reset
+        at some point.
 
         Platforms: Windows, Linux, Mac OS
         """
@@ -317,13 +403,49 @@ class System(commands.Cog):
             embed=await self.prep_net_msg(ctx.channel), view=SystemView(ctx.author, self, "net")
         )
 
+    @probe_timeout
     async def prep_net_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
-        stats = (get_net())["counters"]
+        stats = get_net(await self.sampler.latest())["counters"]
+        rates = get_net_rates(self.net_rates, self._rate_window())
 
         embed = discord.Embed(title="Network", colour=await self.bot.get_embed_colour(channel))
-        embed.add_field(name="Network Stats", value=box(stats))
+        for nic, table in rates.items():
+            embed.add_field(name=nic, value=box(table))
+        embed.add_field(name="Totals since boot", value=box(stats))
         return self.finalise_embed(embed)
 
+    @system.command(name="diskio", cls=DynamicHelp, supported_sys=True)  # all systems
+    async def system_diskio(self, ctx: commands.Context):
+        """
+        Get disk throughput and IOPS.
+
+        This shows the current reads and writes of the busiest disks, and their average over the
+        last minute.
+
+        Platforms: Windows, Linux, Mac OS
+        """
+        await ctx.send(
+            embed=await self.prep_diskio_msg(ctx.channel),
+            view=SystemView(ctx.author, self, "diskio"),
+        )
+
+    async def prep_diskio_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
+        rates = get_disk_io(self.disk_rates, self._rate_window())
+
+        embed = discord.Embed(title="Disk IO", colour=await self.bot.get_embed_colour(channel))
+        for disk, table in rates.items():
+            embed.add_field(name=disk, value=box(table))
+        if not rates:
+            embed.add_field(
+                name="No disk IO yet",
+                value="There's none to show, or there haven't been two samples yet.",
+            )
+        return self.finalise_embed(embed)
+
+    def _rate_window(self) -> str:
+        seconds = round(self.sampler.interval * self.net_rates.window)
+        return f"Avg ({humanize_timedelta(seconds=seconds)})"
+
     @system.command(
         name="uptime", aliases=["up"], cls=DynamicHelp, supported_sys=True  # all systems
     )
@@ -338,8 +460,9 @@ class System(commands.Cog):
             view=SystemView(ctx.author, self, "uptime"),
         )
 
+    @probe_timeout
     async def prep_uptime_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
-        uptime = (get_uptime())["uptime"]
+        uptime = (await self.probes.run(get_uptime))["uptime"]
 
         embed = discord.Embed(title="Uptime", colour=await self.bot.get_embed_colour(channel))
         embed.add_field(name="Uptime", value=box(uptime))
@@ -354,18 +477,18 @@ class System(commands.Cog):
         Note: SWAP memory information is only available on Linux.
         """
 
-        async with ctx.typing():
-            await ctx.send(
-                embed=await self.prep_red_msg(ctx.channel),
-                view=SystemView(ctx.author, self, "red"),
-            )
+        await ctx.send(
+            embed=await self.prep_red_msg(ctx.channel),
+            view=SystemView(ctx.author, self, "red"),
+        )
 
+    @probe_timeout
     async def prep_red_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
         # i jolly hope we are logged in...
         if TYPE_CHECKING:
             assert self.bot.user is not None
 
-        red = (await get_red())["red"]
+        red = get_red(await self.sampler.latest())["red"]
 
         botname = self.bot.user.name
 
@@ -375,6 +498,147 @@ class System(commands.Cog):
         embed.add_field(name="Resource usage", value=box(red))
         return self.finalise_embed(embed)
 
+    @system.command(name="loop", aliases=["lag"], cls=DynamicHelp, supported_sys=True)
+    async def system_loop(self, ctx: commands.Context):
+        """
+        See how responsive the event loop is, and what's running on it.
+
+        Lag is how late a task woke up after sleeping, and is measured 4 times a second.
+        Tasks are sampled every 10 seconds and grouped by coroutine and the cog they are
+        waiting in, showing how many were running on average.
+
+        Blocking shows the cog functions that were running when the loop was over 100ms late,
+        the most likely culprits for slowing the bot down.
+
+        Platforms: Windows, Linux, Mac OS
+        """
+        await ctx.send(
+            embed=await self.prep_loop_msg(ctx.channel),
+            view=SystemView(ctx.author, self, "loop"),
+        )
+
+    async def prep_loop_msg(self, channel: discord.abc.Messageable) -> discord.Embed:
+        data = get_loop(self.loop_monitor)
+        embed = discord.Embed(title="Event loop", colour=await self.bot.get_embed_colour(channel))
+        embed.add_field(name="Lag (last minute)", value=box(data["lag"]))
+        embed.add_field(name="Lag histogram (all time)", value=box(data["histogram"]))
+        embed.add_field(name="Tasks", value=box(data["tasks"]), inline=False)
+        embed.add_field(name="Blocking", value=box(data["blocking"]), inline=False)
+        return embed
+
+    @system.group(name="profile")
+    async def system_profile(self, ctx: commands.Context):
+        """
+        Profile which cogs are using memory and CPU time.
+
+        Both profilers slow the bot down a little while they're on, so turn them off when you're
+        done. Use `[p]system profile report` to get the results as a file.
+        """
+
+    @system_profile.command(name="memory", aliases=["mem"])
+    async def system_profile_memory(self, ctx: commands.Context, enabled: bool):
+        """
+        Turn memory allocation tracking on or off.
+
+        Memory allocated after it's turned on is charged to the cog whose code allocated it.
+        While it's on every allocation is tracked, which uses extra memory and CPU time.
+        """
+        if not enabled:
+            self.allocations.stop()
+            await ctx.send("Memory profiling is off.")
+            return
+        if self.allocations.running:
+            await ctx.send("Memory profiling is already on.")
+            return
+        try:
+            self.allocations.start()
+        except RuntimeError as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send("Memory profiling is on, allocations from now on will be tracked.")
+
+    @system_profile.command(name="cpu")
+    async def system_profile_cpu(self, ctx: commands.Context, enabled: bool):
+        """
+        Turn the stack sampler on or off.
+
+        The event loop's stack is sampled 20 times a second and each sample is charged to the
+        cog whose code was running. Turning it on resets the previous samples.
+        """
+        if not enabled:
+            self.stack_sampler.stop()
+            await ctx.send("CPU profiling is off.")
+            return
+        if self.stack_sampler.running:
+            await ctx.send("CPU profiling is already on.")
+            return
+        self.stack_sampler.start()
+        await ctx.send("CPU profiling is on.")
+
+    @system_profile.command(name="report")
+    async def system_profile_report(self, ctx: commands.Context):
+        """Get the results of the profilers that are on, or have been on for CPU, as a file."""
+        sections = []
+        if self.stack_sampler.started is not None:
+            sections.append(self.stack_sampler.report())
+        if self.allocations.running:
+            async with ctx.typing():
+                try:
+                    sections.append(await self.probes.run(self.allocations.report, timeout=60))
+                except ProbeTimeout:
+                    sections.append("Memory: taking a snapshot timed out.")
+
+        if not sections:
+            await ctx.send(
+                f"No profiler has been turned on. See `{ctx.clean_prefix}help system profile`."
+            )
+            return
+
+        text = "\n\n\n".join(sections)
+        filename = f"profile-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.txt"
+        await ctx.send(file=discord.File(io.BytesIO(text.encode()), filename=filename))
+
+    @system.command(name="live", aliases=["dashboard"], cls=DynamicHelp, supported_sys=True)
+    async def system_live(self, ctx: commands.Context, interval: int = 10):
+        """
+        Show a dashboard that keeps updating itself, every `interval` seconds (5 to 120).
+
+        It stops after 10 minutes or when you press Stop. If Discord rate limits the edits, it
+        will update less often until they stop.
+
+        Platforms: Windows, Linux, Mac OS
+        """
+        interval = min(max(interval, 5), 120)  # the sampler only updates every 5 seconds
+        view = LiveView(ctx.author, self, interval)
+        message = await ctx.send(embed=await self.prep_live_msg(ctx.channel, interval), view=view)
+        view.start(message)
+
+    async def prep_live_msg(
+        self, channel: discord.abc.Messageable, interval: float
+    ) -> discord.Embed:
+        # i jolly hope we are logged in...
+        if TYPE_CHECKING:
+            assert self.bot.user is not None
+
+        try:
+            sample = await self.sampler.latest()
+        except ProbeTimeout:
+            sample = None
+        cpu = get_cpu(sample)["percent"] if sample else TIMED_OUT
+        mem = get_mem(sample) if sample else {"physical": TIMED_OUT, "swap": TIMED_OUT}
+        red = get_red(sample)["red"] if sample else TIMED_OUT
+        lag = get_loop(self.loop_monitor)["lag"]
+
+        embed = discord.Embed(title="Live", colour=await self.bot.get_embed_colour(channel))
+        embed.add_field(name="CPU Usage", value=box(cpu))
+        embed.add_field(name="Event loop lag", value=box(lag))
+        embed.add_field(name="Physical Memory", value=box(mem["physical"]))
+        embed.add_field(name="SWAP Memory", value=box(mem["swap"]))
+        embed.add_field(name=f"{self.bot.user.name}'s resource usage", value=box(red))
+        embed = self.finalise_embed(embed)
+        embed.set_footer(text=f"{embed.footer.text}\nUpdating every {round(interval)} seconds")
+        return embed
+
     @system.command(
         name="all", aliases=["overview", "top"], cls=DynamicHelp, supported_sys=True  # all systems
     )
@@ -399,10 +663,17 @@ class System(commands.Cog):
         if TYPE_CHECKING:
             assert self.bot.user is not None
 
-        cpu = await get_cpu()
-        mem = get_mem()
-        proc = await get_proc()
-        red = (await get_red())["red"]
+        try:
+            sample = await self.sampler.latest()
+        except ProbeTimeout:
+            sample = None
+        cpu = get_cpu(sample) if sample else {"percent": TIMED_OUT, "time": TIMED_OUT}
+        mem = get_mem(sample) if sample else {"physical": TIMED_OUT, "swap": TIMED_OUT}
+        try:
+            proc = get_proc(await self.processes.get())
+        except ProbeTimeout:
+            proc = {"statuses": TIMED_OUT}
+        red = get_red(sample)["red"] if sample else TIMED_OUT
 
         percent = cpu["percent"]
         times = cpu["time"]
@@ -419,3 +690,208 @@ class System(commands.Cog):
         embed.add_field(name="Processes", value=box(procs))
         embed.add_field(name=f"{botname}'s resource usage", value=box(red))
         return self.finalise_embed(embed)
+
+    @system.command(name="history", cls=DynamicHelp, supported_sys=True)  # all systems
+    async def system_history(
+        self,
+        ctx: commands.Context,
+        metric: str,
+        window: commands.TimedeltaConverter(
+            minimum=datetime.timedelta(minutes=5),
+            maximum=datetime.timedelta(days=365 * 5),
+            default_unit="hours",
+        ) = datetime.timedelta(hours=6),
+    ):
+        """
+        See how a metric has changed over time.
+
+        History is recorded every minute while the cog is loaded. Windows up to 12 hours use
+        minute averages, up to 30 days hourly averages and anything longer daily averages.
+
+        **Metrics:** `cpu`, `mem`, `swap`, `disk`, `net_sent`, `net_recv`, `red_cpu`, `red_mem`
+
+        **Examples:**
+            - `[p]system history mem 3d`
+            - `[p]system history red_mem 12h`
+
+        Platforms: Windows, Linux, Mac OS
+        """
+        if metric not in METRICS:
+            return await ctx.send_help()
+
+        level, series = await self.history.read(metric, window)
+        if series.empty:
+            return await ctx.send("There's no history for that window yet.")
+
+        await ctx.send(
+            embed=await self.prep_history_msg(ctx.channel, metric, window, level, series)
+        )
+
+    async def prep_history_msg(
+        self,
+        channel: discord.abc.Messageable,
+        metric: str,
+        window: datetime.timedelta,
+        level: str,
+        series,
+    ) -> discord.Embed:
+        def fmt(value: float) -> str:
+            if metric == "red_mem":
+                return humanize_bytes(value, 1)
+            if metric in ("net_sent", "net_recv"):
+                return humanize_bytes(value, 1) + "/s"
+            return f"{round(value, 1)} %"
+
+        def when(ts) -> str:
+            return ts.strftime("%b %d, %H:%M UTC")
+
+        summary = f"[Latest]  {fmt(series.iloc[-1])}\n"
+        summary += f"[Average] {fmt(series.mean())}\n"
+        summary += f"[Minimum] {fmt(series.min())} ({when(series.idxmin())})\n"
+        summary += f"[Maximum] {fmt(series.max())} ({when(series.idxmax())})\n"
+
+        # squash into at most 40 buckets for the sparkline
+        buckets = [chunk.mean() for chunk in _chunks(series, 40)]
+        low, high = min(buckets), max(buckets)
+        spread = (high - low) or 1
+        top = len(SPARK_CHARS) - 1
+        spark = "".join(SPARK_CHARS[int((v - low) / spread * top)] for v in buckets)
+
+        embed = discord.Embed(
+            title=METRICS[metric], colour=await self.bot.get_embed_colour(channel)
+        )
+        embed.add_field(name="Summary", value=box(summary), inline=False)
+        embed.add_field(
+            name=f"Trend ({level} averages)",
+            value=box(f"{spark}\n{when(series.index[0])} -> {when(series.index[-1])}"),
+            inline=False,
+        )
+        embed.set_footer(text=f"Last {humanize_timedelta(timedelta=window)}")
+        return embed
+
+    @system.group(name="alert", aliases=["alerts"])
+    async def system_alert(self, ctx: commands.Context):
+        """
+        Get alerted when a metric crosses a threshold.
+
+        Alerts are sent to the alert channel, or to the bot owners' DMs if none is set.
+        """
+
+    @system_alert.command(name="add")
+    async def system_alert_add(
+        self,
+        ctx: commands.Context,
+        metric: str,
+        op: str,
+        threshold: str,
+        duration: commands.TimedeltaConverter(
+            maximum=datetime.timedelta(days=1), default_unit="minutes"
+        ) = datetime.timedelta(),
+    ):
+        """
+        Add an alert rule.
+
+        It fires when `metric` has been over (`>`) or under (`<`) `threshold` for `duration`,
+        which defaults to straight away. It resolves once it's back past the threshold by 5%.
+
+        **Metrics:** `cpu`, `mem`, `swap`, `red_cpu` and `disk` (%), `red_mem` (bytes)
+        `disk` is the root partition, use `disk:<mount point>` for others.
+
+        **Examples:**
+        - `[p]system alert add red_mem > 2GB 5m`
+        - `[p]system alert add disk > 90%`
+        - `[p]system alert add disk:/mnt/data > 95 10m`
+        """
+        try:
+            metric = parse_metric(metric)
+        except ValueError:
+            await ctx.send(
+                f"`{metric}` isn't a metric. Choose from {', '.join(ALERT_METRICS)} or disk."
+            )
+            return
+        if op not in OPERATORS:
+            await ctx.send("The operator must be `>` or `<`.")
+            return
+        try:
+            value = parse_threshold(threshold)
+        except ValueError:
+            await ctx.send(
+                "The threshold must be a number, optionally with `%`, `KB`, `MB` or `GB`."
+            )
+            return
+
+        rule = {
+            "metric": metric,
+            "op": op,
+            "threshold": value,
+            "duration": duration.total_seconds(),
+        }
+        async with self.config.alert_rules() as rules:
+            rule_id = str(max(map(int, rules), default=0) + 1)
+            rules[rule_id] = rule
+            self.alerts.set_rules(dict(rules))
+        await ctx.send(f"Added alert rule {rule_id}: `{describe(rule)}`")
+
+    @system_alert.command(name="remove", aliases=["delete", "del"])
+    async def system_alert_remove(self, ctx: commands.Context, rule_id: int):
+        """Remove an alert rule, by its ID from `[p]system alert list`."""
+        async with self.config.alert_rules() as rules:
+            if rules.pop(str(rule_id), None) is None:
+                await ctx.send("There's no rule with that ID.")
+                return
+            self.alerts.set_rules(dict(rules))
+        await ctx.send(f"Removed alert rule {rule_id}.")
+
+    @system_alert.command(name="list")
+    async def system_alert_list(self, ctx: commands.Context):
+        """List the alert rules, and which are firing."""
+        rules = await self.config.alert_rules()
+        if not rules:
+            await ctx.send("There are no alert rules.")
+            return
+
+        lines = []
+        for rule_id, rule in rules.items():
+            state = self.alerts.states.get(rule_id)
+            firing = " (firing)" if state and state.firing else ""
+            lines.append(f"[{rule_id}] {describe(rule)}{firing}")
+
+        channel_id = await self.config.alert_channel()
+        cooldown = humanize_timedelta(seconds=await self.config.alert_cooldown())
+        destination = f"<#{channel_id}>" if channel_id else "the bot owners' DMs"
+        await ctx.send(
+            box("\n".join(lines)) + f"Alerts are sent to {destination}, at most every {cooldown}."
+        )
+
+    @system_alert.command(name="channel")
+    async def system_alert_channel(
+        self, ctx: commands.Context, channel: discord.TextChannel = None  # type:ignore
+    ):
+        """Set the channel to send alerts to. Leave it blank to send them to the owners' DMs."""
+        await self.config.alert_channel.set(channel.id if channel else None)
+        if channel:
+            await ctx.send(f"Alerts will be sent to {channel.mention}.")
+        else:
+            await ctx.send("Alerts will be sent to the bot owners' DMs.")
+
+    @system_alert.command(name="cooldown")
+    async def system_alert_cooldown(
+        self,
+        ctx: commands.Context,
+        cooldown: commands.TimedeltaConverter(
+            minimum=datetime.timedelta(minutes=1),
+            maximum=datetime.timedelta(days=7),
+            default_unit="minutes",
+        ),
+    ):
+        """Set how long a rule has to wait after firing before it can fire again."""
+        await self.config.alert_cooldown.set(cooldown.total_seconds())
+        await ctx.send(
+            f"Rules can now fire at most every {humanize_timedelta(timedelta=cooldown)}."
+        )
+
+
+def _chunks(series, count: int) -> list:
+    """Split a series into at most ``count`` roughly equal consecutive chunks."""
+    size = max(1, -(-len(series) // count))
+    return [series.iloc[i : i + size] for i in range(0, len(series), size)]
@@ -0,0 +1,13 @@
+import sys
+import types
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the cogs' __init__ modules import discord and redbot to set the cog up, the modules tested
+# here don't need either, so the packages are registered without running them.
+for name in ('Highlight', 'system'):
+    package = types.ModuleType(name)
+    package.__path__ = [str(ROOT / name)]
+    sys.modules.setdefault(name, package)
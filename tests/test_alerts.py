@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("redbot")
+
+from system import alerts  # noqa: E402
+from system.alerts import AlertManager, parse_metric, parse_threshold  # noqa: E402
+
+THRESHOLD = 2e9  # clears below 1.9e9 with 5% hysteresis
+
+
+class FakeConfig:
+    def __init__(self, cooldown: int = 1800) -> None:
+        self.cooldown = cooldown
+
+    async def alert_cooldown(self) -> int:
+        return self.cooldown
+
+    async def alert_channel(self) -> None:
+        return None
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+
+    def get_channel(self, channel_id: int) -> None:
+        return None
+
+    async def send_to_owners(self, content: str) -> None:
+        self.sent.append(content)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(alerts, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def manager(op: str = ">", duration: int = 0, cooldown: int = 1800) -> AlertManager:
+    alert = AlertManager(FakeBot(), FakeConfig(cooldown), None)  # type:ignore
+    rule = {"metric": "red_mem", "op": op, "threshold": THRESHOLD, "duration": duration}
+    alert.set_rules({"1": rule})
+    return alert
+
+
+def evaluate(alert: AlertManager, value: float) -> list[str]:
+    """Evaluate a sample and return the titles of what was sent."""
+    before = len(alert.bot.sent)
+    asyncio.run(alert.evaluate(SimpleNamespace(red_mem=value)))  # type:ignore
+    return [content.split(":")[0] for content in alert.bot.sent[before:]]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [("90", 90), ("90%", 90), ("2GB", 2e9), ("1.5 mb", 1.5e6), ("512B", 512)],
+)
+def test_parse_threshold(text, expected):
+    assert parse_threshold(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "abc", "90 GiB", "-5"])
+def test_parse_threshold_invalid(text):
+    with pytest.raises(ValueError):
+        parse_threshold(text)
+
+
+def test_parse_metric():
+    assert parse_metric("CPU") == "cpu"
+    assert parse_metric("disk:/Data") == "disk:/Data"
+    assert parse_metric("disk").startswith("disk:")
+    with pytest.raises(ValueError):
+        parse_metric("nope")
+
+
+def test_hysteresis(clock):
+    alert = manager()
+    assert evaluate(alert, 2.1e9) == ["\N{WARNING SIGN}\N{VARIATION SELECTOR-16} Alert"]
+    assert evaluate(alert, 2.2e9) == []  # still firing, not sent again
+    assert evaluate(alert, 1.95e9) == []  # under the threshold but inside the margin
+    assert evaluate(alert, 1.8e9) == ["\N{WHITE HEAVY CHECK MARK} Resolved"]
+
+
+def test_hysteresis_below(clock):
+    alert = manager("<")
+    assert len(evaluate(alert, 1.5e9)) == 1
+    assert evaluate(alert, 2.05e9) == []
+    assert len(evaluate(alert, 2.2e9)) == 1
+
+
+def test_cooldown(clock):
+    alert = manager(cooldown=600)
+    assert len(evaluate(alert, 2.1e9)) == 1
+    assert len(evaluate(alert, 1.8e9)) == 1  # resolved
+
+    clock.now += 300
+    assert evaluate(alert, 2.1e9) == []  # breached again inside the cooldown
+    clock.now += 301
+    assert len(evaluate(alert, 2.1e9)) == 1  # still breached once it's up
+
+
+def test_duration(clock):
+    alert = manager(duration=60)
+    assert evaluate(alert, 2.1e9) == []
+    clock.now += 30
+    assert evaluate(alert, 1.5e9) == []  # dipped, so the duration starts over
+    clock.now += 30
+    assert evaluate(alert, 2.1e9) == []
+    clock.now += 59
+    assert evaluate(alert, 2.1e9) == []
+    clock.now += 1
+    assert len(evaluate(alert, 2.1e9)) == 1
+
+
+def test_set_rules_keeps_state(clock):
+    alert = manager()
+    evaluate(alert, 2.1e9)
+    alert.set_rules({**alert.rules, "2": dict(alert.rules["1"], metric="red_cpu")})
+    assert alert.states["1"].firing
+    assert not alert.states["2"].firing
+    alert.set_rules({})
+    assert alert.states == {}
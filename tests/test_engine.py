@@ -0,0 +1,108 @@
+import re
+
+import pytest
+
+from Highlight import engine
+from Highlight.engine import LinearPattern, Unsupported, benchmark
+from Highlight.snapshot import highlight_source
+
+PATTERNS = [
+    ('hello', 0),
+    ('hello', re.IGNORECASE),
+    (r'\bcat\b', re.IGNORECASE),
+    (r'\Bat\B', 0),
+    (r'colou?r', 0),
+    (r'ab+c', 0),
+    (r'ab*?c', 0),
+    (r'a{2,3}', 0),
+    (r'a{2,}b', 0),
+    (r'(foo|foobar)baz', 0),
+    (r'foo|foobar', 0),
+    (r'[a-c]+\d', 0),
+    (r'[^aeiou\s]{3}', 0),
+    (r'\w+@\w+\.com', 0),
+    (r'^start', 0),
+    (r'end$', 0),
+    (r'^line$', re.MULTILINE),
+    (r'a.b', 0),
+    (r'a.b', re.DOTALL),
+    (r'(?:x|y)*z', 0),
+    (r'(a|b)*abb', 0),
+    (r'\d+(\.\d+)?', 0),
+    (r'straße', re.IGNORECASE),
+    (r'\W+', re.ASCII),
+    (r'', 0),
+]
+
+TEXTS = [
+    '',
+    'hello world',
+    'HeLLo there',
+    'the cat sat',
+    'concatenate',
+    'bat',
+    'color and colour',
+    'abbbc ac',
+    'aaaa',
+    'aab',
+    'foobarbaz',
+    'foobaz',
+    'bcc9',
+    'xyz strength',
+    'me@example.com',
+    'start of it',
+    'not the end',
+    'the end\n',
+    'first\nline\nlast',
+    'a\nb',
+    'acb',
+    'xyxyxz',
+    'babb',
+    'pi is 3.14',
+    'STRASSE',
+    '日本語 テキスト',
+    'ab' * 300 + 'abb',
+]
+
+@pytest.mark.parametrize('pattern, flags', PATTERNS)
+def test_agrees_with_re(pattern, flags):
+    linear, compiled = LinearPattern(pattern, flags), re.compile(pattern, flags)
+    for text in TEXTS:
+        match, expected = linear.search(text), compiled.search(text)
+        assert (match is None) == (expected is None), text
+        if expected:
+            assert match.span() == expected.span(), text
+            assert match.group() == expected.group(), text
+
+@pytest.mark.parametrize('text', ['hello', 'cat', 'a b', '日本'])
+@pytest.mark.parametrize('_type', ['regex', 'wildcard'])
+def test_highlight_sources_agree_with_re(text, _type):
+    source, flags = highlight_source(text, _type)
+    assert benchmark([(source, flags)], TEXTS + ['h e_l.l-o', 'c.a.t', 'a_b'])['mismatches'] == 0
+
+@pytest.mark.parametrize('pattern', [r'(a)\1', r'foo(?=bar)', r'(?<!x)y', r'(a)?(?(1)b|c)'])
+def test_unsupported(pattern):
+    with pytest.raises(Unsupported):
+        LinearPattern(pattern)
+
+def test_invalid_pattern_raises_re_error():
+    with pytest.raises(re.error):
+        LinearPattern('(')
+
+def test_no_catastrophic_backtracking():
+    # exponential for ``re``, linear here
+    pattern = LinearPattern(r'(a+)+$')
+    assert not pattern.matches('a' * 5000 + 'b')
+
+def test_correct_once_the_cache_is_full(monkeypatch):
+    monkeypatch.setattr(engine, 'MAX_STATES', 3)
+    pattern = LinearPattern(r'[a-z]*q[a-z]{3}z')
+    compiled = re.compile(pattern.pattern)
+    for text in ['abcqxyzz', 'qqqqqq', 'aqbcdz', 'no match here', 'zzzqabcz']:
+        assert pattern.matches(text) == bool(compiled.search(text)), text
+    assert len(pattern._dfa().info) <= engine.MAX_STATES + 1
+
+def test_inline_only_for_small_programs_and_texts():
+    assert LinearPattern('hello').inline('short text')
+    assert not LinearPattern('hello').inline('x' * (engine.INLINE_TEXT + 1))
+    assert not LinearPattern('a{%d}' % (engine.INLINE_PROGRAM + 1)).inline('short')
@@ -0,0 +1,79 @@
+import pytest
+
+from Highlight.prefilter import TokenPrefilter, _fold, _key, _wild, highlight_keys
+from Highlight.records import HighlightRecord
+from Highlight.snapshot import compile_highlight
+
+MESSAGES = [
+    'hello there',
+    'HELLO THERE',
+    'h.e.l.l.o',
+    'heeeelllo',
+    'h_e-l l.o',
+    'say İstanbul',
+    'nothing to see',
+    'the jazz club',
+    'Jaaazz',
+    'version 3.11 is out',
+    '',
+]
+
+HIGHLIGHTS = [
+    ('hello', 'default'),
+    ('istanbul', 'default'),
+    ('jazz', 'wildcard'),
+    ('hello', 'wildcard'),
+    (r'ver(sion)? \d+', 'regex'),
+    (r'club|pub', 'regex'),
+    (r'(?i)THERE', 'regex'),
+]
+
+def record(text: str, _type: str) -> HighlightRecord:
+    return HighlightRecord.from_dict({'highlight': text, 'type': _type})
+
+def check(content: str):
+    return {'content': content, 'clean_content': content, 'stem': '', 'embeds': ''}
+
+def test_fold_matches_ignorecase():
+    assert _fold('İSTANBUL') == 'istanbul'
+    assert _fold('ıstanbul') == 'istanbul'
+    assert _fold('Straße') == 'strasse'
+
+def test_wild_drops_separators_and_repeats():
+    assert _wild('h.e_l-l o') == 'helo'
+    assert _wild('heeelllo') == 'helo'
+
+def test_key_prefers_rare_grams():
+    assert _key('jazz') in ('jaz', 'azz')
+    assert _key('hello') in ('hel', 'ell', 'llo')
+    assert _key('ab') == 'ab'
+    assert _key('日本') is None
+
+@pytest.mark.parametrize('text, _type, expected', [
+    ('hello', 'default', 1),
+    ('foo|bar', 'regex', 2),
+    ('a*', 'regex', None),
+    ('.+', 'regex', None),
+    ('(', 'regex', None),
+])
+def test_highlight_keys(text, _type, expected):
+    keys = highlight_keys(text, _type)
+    assert (len(keys) if keys else None) == expected
+
+def test_passthrough_without_required_literal():
+    prefilter = TokenPrefilter([record('hello', 'default'), record('a*', 'regex')])
+    assert prefilter.passthrough
+    assert prefilter.might_match(check('nothing to see'))
+
+def test_skips_messages_without_keys():
+    prefilter = TokenPrefilter([record('hello', 'default')])
+    assert not prefilter.passthrough
+    assert not prefilter.might_match(check('nothing to see'))
+
+@pytest.mark.parametrize('text, _type', HIGHLIGHTS)
+@pytest.mark.parametrize('content', MESSAGES)
+def test_never_skips_a_match(text, _type, content):
+    """Whatever the highlight's pattern finds, the prefilter has to let through."""
+    prefilter = TokenPrefilter([record(text, _type)])
+    if compile_highlight(text, _type).search(content):
+        assert prefilter.might_match(check(content))
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import NamedTuple
+
+import pytest
+
+from system.rates import NET_FIELDS, WRAP_32, RateTracker, counter_delta
+
+
+class NetIO(NamedTuple):  # the fields of procfs.NetIO the tracker reads
+    bytes_sent: int
+    bytes_recv: int
+    packets_sent: int
+    packets_recv: int
+
+
+def nic(sent: int, recv: int, packets_sent: int = 0, packets_recv: int = 0) -> NetIO:
+    return NetIO(sent, recv, packets_sent, packets_recv)
+
+
+def sample(time: float, **nics: NetIO) -> SimpleNamespace:
+    return SimpleNamespace(time=time, nics=nics)
+
+
+@pytest.mark.parametrize(
+    "new, old, expected",
+    [
+        (150, 100, 50),
+        (100, 100, 0),
+        (10, WRAP_32 - 10, 20),  # 32 bit counter wrapped round
+        (5, 1000, None),  # reset, a wrap would be implausibly large
+        (10, WRAP_32 + 100, None),  # 64 bit counters don't wrap at 2**32
+    ],
+)
+def test_counter_delta(new, old, expected):
+    assert counter_delta(new, old) == expected
+
+
+def test_rates_per_second():
+    tracker = RateTracker("nics", NET_FIELDS)
+    tracker.add(sample(0, eth0=nic(0, 0)))
+    assert tracker.current == {}
+    tracker.add(sample(2, eth0=nic(1000, 4000, 10, 20)))
+    assert tracker.current["eth0"] == {
+        "bytes_sent": 500,
+        "bytes_recv": 2000,
+        "packets_sent": 5,
+        "packets_recv": 10,
+    }
+
+
+def test_wrapped_counter_keeps_its_rate():
+    tracker = RateTracker("nics", NET_FIELDS)
+    tracker.add(sample(0, eth0=nic(WRAP_32 - 100, 0)))
+    tracker.add(sample(1, eth0=nic(100, 0)))
+    assert tracker.current["eth0"]["bytes_sent"] == 200
+
+
+def test_reset_counter_skips_the_device_once():
+    tracker = RateTracker("nics", NET_FIELDS)
+    tracker.add(sample(0, eth0=nic(10**12, 0), lo=nic(0, 0)))
+    tracker.add(sample(1, eth0=nic(100, 0), lo=nic(10, 10)))
+    assert "eth0" not in tracker.current
+    assert "lo" in tracker.current
+    tracker.add(sample(2, eth0=nic(300, 0), lo=nic(20, 20)))
+    assert tracker.current["eth0"]["bytes_sent"] == 200
+
+
+def test_same_or_older_sample_is_ignored():
+    tracker = RateTracker("nics", NET_FIELDS)
+    tracker.add(sample(5, eth0=nic(0, 0)))
+    tracker.add(sample(5, eth0=nic(100, 0)))
+    assert tracker.current == {}
+
+
+def test_average_and_window():
+    tracker = RateTracker("nics", NET_FIELDS, window=2)
+    for i, sent in enumerate([0, 100, 300, 600]):
+        tracker.add(sample(i, eth0=nic(sent, 0)))
+    # only the last two rates, 200 and 300, are kept
+    assert tracker.average("eth0")["bytes_sent"] == 250
+    assert tracker.average("missing") == dict.fromkeys(NET_FIELDS, 0.0)
+
+
+def test_gone_devices_are_dropped():
+    tracker = RateTracker("nics", NET_FIELDS)
+    tracker.add(sample(0, eth0=nic(0, 0), veth=nic(0, 0)))
+    tracker.add(sample(1, eth0=nic(10, 0), veth=nic(10, 0)))
+    tracker.add(sample(2, eth0=nic(20, 0)))
+    assert set(tracker.history) == {"eth0"}
+
+
+def test_busiest():
+    tracker = RateTracker("nics", NET_FIELDS)
+    tracker.add(sample(0, a=nic(0, 0), b=nic(0, 0), c=nic(0, 0)))
+    tracker.add(sample(1, a=nic(10, 10), b=nic(500, 0), c=nic(0, 100)))
+    assert tracker.busiest(2) == ["b", "c"]
+
+
+def test_missing_attr_is_no_devices():
+    tracker = RateTracker("disks", NET_FIELDS)
+    tracker.add(SimpleNamespace(time=0, disks=None))
+    tracker.add(SimpleNamespace(time=1, disks=None))
+    assert tracker.current == {}
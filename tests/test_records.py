@@ -0,0 +1,37 @@
+from Highlight.records import HighlightRecord, MatchResult, deep_sizeof, to_records
+
+def test_round_trips_config():
+    data = {'highlight': 'hello', 'type': 'wildcard', 'settings': ['bots', 'embeds']}
+    record = HighlightRecord.from_dict(data)
+    assert record.type == 'wildcard'
+    assert record.settings == ['bots', 'embeds']
+    assert record.to_dict() == data
+
+def test_unknown_settings_are_dropped():
+    record = HighlightRecord.from_dict({'highlight': 'hello', 'type': 'default', 'settings': ['nope']})
+    assert record.settings == []
+
+def test_equal_by_text_type_and_settings():
+    assert HighlightRecord('hello') == HighlightRecord('hello')
+    assert HighlightRecord('hello') != HighlightRecord('hello', 1)
+    assert HighlightRecord('hello') != HighlightRecord('hello', 0, 1)
+    assert len({HighlightRecord('hello'), HighlightRecord('hello')}) == 1
+
+def test_text_is_interned():
+    assert HighlightRecord(''.join(['hel', 'lo'])).text is HighlightRecord('hello').text
+
+def test_pool_shares_records():
+    pool = {}
+    first = to_records([{'highlight': 'hello', 'type': 'default'}], pool)
+    second = to_records([{'highlight': 'hello', 'type': 'default'}, {'highlight': 'hello', 'type': 'regex'}], pool)
+    assert first[0] is second[0]
+    assert second[1] is not second[0]
+    assert len(pool) == 2
+
+def test_match_result_to_dict():
+    result = MatchResult('Hello', HighlightRecord('hello'))
+    assert result.to_dict() == {'match': 'Hello', 'highlight': 'hello', 'type': 'default'}
+
+def test_deep_sizeof_counts_shared_objects_once():
+    shared = list(range(100))
+    assert deep_sizeof([shared, shared]) < deep_sizeof([shared, list(range(100))])
@@ -0,0 +1,103 @@
+import pytest
+
+from Highlight.records import HighlightRecord
+from Highlight.snapshot import GuildSnapshot, _merge
+
+GUILD = 1
+CHANNEL = 10
+DEFAULT_MEMBER = {'cooldown': 60, 'blocks': [], 'bots': False}
+
+def hl(text: str, _type: str = 'default', settings = ()):
+    return {'highlight': text, 'type': _type, 'settings': list(settings)}
+
+def texts(records):
+    return [record.text for record in records]
+
+def build(guild_highlights = None, channel_highlights = None, member_configs = None, **kwargs) -> GuildSnapshot:
+    return GuildSnapshot.build(
+        GUILD, 1, guild_highlights or {}, channel_highlights or {}, member_configs or {}, DEFAULT_MEMBER, **kwargs
+    )
+
+def test_merge_adds_to_base():
+    base = {1: (HighlightRecord('hello'),)}
+    merged = _merge(base, {'1': [hl('world')], '2': [hl('hi')]}, {})
+    assert texts(merged[1]) == ['hello', 'world']
+    assert texts(merged[2]) == ['hi']
+    assert texts(base[1]) == ['hello']
+
+def test_merge_skips_duplicates_of_the_same_type():
+    base = {1: (HighlightRecord('hello'),)}
+    merged = _merge(base, {'1': [hl('hello'), hl('hello', 'wildcard'), hl('hello')]}, {})
+    assert [(record.text, record.type) for record in merged[1]] == [('hello', 'default'), ('hello', 'wildcard')]
+
+def test_merge_ignores_empty_scopes():
+    base = {1: (HighlightRecord('hello'),)}
+    assert _merge(base, {'1': [], '2': []}, {}) == base
+
+def test_channel_adds_to_guild():
+    snapshot = build({'1': [hl('hello')]}, {CHANNEL: {'1': [hl('channel')], '2': [hl('only here')]}})
+    assert texts(snapshot.highlights_for(CHANNEL)[1]) == ['hello', 'channel']
+    assert texts(snapshot.highlights_for(CHANNEL)[2]) == ['only here']
+    assert 2 not in snapshot.highlights_for(99)
+    assert texts(snapshot.highlights_for(99)[1]) == ['hello']
+
+def test_member_scopes_are_unmerged():
+    snapshot = build({'1': [hl('hello')]}, {CHANNEL: {'1': [hl('channel')], '2': []}})
+    assert {scope: texts(records) for scope, records in snapshot.member_scopes[1].items()} == {GUILD: ['hello'], CHANNEL: ['channel']}
+    assert 2 not in snapshot.member_scopes
+
+def test_blocked_by_is_the_reverse_of_blocks():
+    snapshot = build(member_configs = {1: {'blocks': [5, CHANNEL]}, 2: {'blocks': [5]}})
+    assert snapshot.member_blocks(1) == {5, CHANNEL}
+    assert snapshot.blocked_by[5] == {1, 2}
+    assert snapshot.member_blocks(3) == frozenset()
+
+def test_member_config_falls_back_to_default():
+    snapshot = build(member_configs = {1: {'cooldown': 300}})
+    assert snapshot.member_config(1)['cooldown'] == 300
+    assert snapshot.member_config(2) == DEFAULT_MEMBER
+
+def test_invalid_regex_isnt_compiled():
+    snapshot = build({'1': [hl('(', 'regex'), hl('hello')]})
+    assert len(snapshot.patterns) == 1
+    assert snapshot.highlight_count == 2
+
+def test_is_immutable():
+    snapshot = build({'1': [hl('hello')]})
+    with pytest.raises(AttributeError):
+        snapshot.version = 2
+    with pytest.raises(TypeError):
+        snapshot.guild_highlights[2] = ()
+
+CATEGORY = 20
+OTHER_CHANNEL = 11
+
+def test_category_is_between_guild_and_channel():
+    snapshot = build(
+        {'1': [hl('guild')]},
+        {CHANNEL: {'1': [hl('channel')]}},
+        category_highlights = {CATEGORY: {'1': [hl('category')]}},
+        parents = {CHANNEL: CATEGORY}
+    )
+    assert texts(snapshot.highlights_for(CHANNEL, CATEGORY)[1]) == ['guild', 'category', 'channel']
+    # a channel without its own highlights uses its category's
+    assert texts(snapshot.highlights_for(OTHER_CHANNEL, CATEGORY)[1]) == ['guild', 'category']
+    assert texts(snapshot.highlights_for(OTHER_CHANNEL)[1]) == ['guild']
+
+def test_channel_outside_the_category_doesnt_inherit():
+    snapshot = build(
+        {'1': [hl('guild')]},
+        {CHANNEL: {'1': [hl('channel')]}},
+        category_highlights = {CATEGORY: {'1': [hl('category')]}}
+    )
+    assert texts(snapshot.highlights_for(CHANNEL, CATEGORY)[1]) == ['guild', 'channel']
+
+def test_duplicates_keep_the_widest_scope():
+    snapshot = build(
+        {'1': [hl('hello')]},
+        {CHANNEL: {'1': [hl('hello'), hl('world')]}},
+        category_highlights = {CATEGORY: {'1': [hl('hello'), hl('world')]}},
+        parents = {CHANNEL: CATEGORY}
+    )
+    assert texts(snapshot.highlights_for(CHANNEL, CATEGORY)[1]) == ['hello', 'world']
+    assert set(snapshot.member_scopes[1]) == {GUILD, CATEGORY, CHANNEL}